@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Only the server starts the grader workers; management commands never do.
+from main.checkers import warm_grader_pool  # noqa: E402
+
+warm_grader_pool()
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "main.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -56,14 +57,122 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
+
+# Serve the hot read endpoints from main.async_views; only worthwhile under ASGI.
+ASYNC_READ_VIEWS = os.getenv("DJANGO_ASYNC_READ_VIEWS", "False").lower() == "true"
+
+# SQLite tuning, applied to every new connection. SQLITE_JOURNAL_MODE=WAL lets
+# readers run while a write commits; set it in deployments. The journal mode is
+# stored in the database file itself, so it is left alone unless configured and
+# the checked-in development db.sqlite3 keeps its rollback journal.
+# synchronous=NORMAL only fsyncs at checkpoints (in WAL mode), so a power loss
+# (not an app crash) can drop the last commits. IMMEDIATE transactions take the
+# write lock up front, so concurrent writers queue for up to SQLITE_BUSY_TIMEOUT
+# seconds instead of failing when a read lock cannot be upgraded.
+# SQLITE_CACHE_SIZE follows PRAGMA cache_size: negative values are KiB.
+SQLITE_OPTIONS = {
+    "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "5")),
+    "transaction_mode": os.getenv("SQLITE_TRANSACTION_MODE", "IMMEDIATE"),
+    "init_command": ";".join(
+        [
+            *([f"PRAGMA journal_mode={os.getenv('SQLITE_JOURNAL_MODE')}"] if os.getenv("SQLITE_JOURNAL_MODE") else []),
+            f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+            f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', '268435456'))}",
+            f"PRAGMA cache_size={int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))}",
+        ]
+    ),
+}
+# Seconds a connection is reused across requests (0 closes it after each request);
+# health checks replace a reused connection that has gone bad. Under ASGI every
+# sync_to_async call may land on a different thread, each holding its own
+# persistent connection, so the default drops to 0 with ASYNC_READ_VIEWS; only
+# raise it there if the thread pool is bounded.
+CONN_MAX_AGE = int(os.getenv("DJANGO_CONN_MAX_AGE", "0" if ASYNC_READ_VIEWS else "60"))
+CONN_HEALTH_CHECKS = os.getenv("DJANGO_CONN_HEALTH_CHECKS", "True").lower() == "true"
 
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": CONN_HEALTH_CHECKS,
+    }
+}
+
+# Read replicas as comma-separated SQLite paths, added as "replica1", "replica2", ...
+# Curriculum and analytics views read from them; writes and user state stay on
+# the primary (see main.replicas). ``manage.py sync_replicas`` copies the primary
+# into them. Tests mirror them onto the test database.
+replica_paths = [p.strip() for p in os.getenv("DATABASE_REPLICAS", "").split(",") if p.strip()]
+DATABASE_REPLICAS = [f"replica{index}" for index in range(1, len(replica_paths) + 1)]
+for alias, path in zip(DATABASE_REPLICAS, replica_paths):
+    DATABASES[alias] = {**DATABASES["default"], "NAME": path, "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["main.replicas.PrimaryReplicaRouter"]
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "math-edu"),
     }
 }
 
+# Shared read results (see main.singleflight) live in this cache alias for
+# SINGLE_FLIGHT_TTL seconds, serving stale while one process recomputes under a
+# lock that expires after SINGLE_FLIGHT_LOCK_TIMEOUT seconds. Use a cache shared
+# by all processes (memcached/Redis) to coalesce across them.
+SINGLE_FLIGHT_CACHE = os.getenv("SINGLE_FLIGHT_CACHE", "default")
+SINGLE_FLIGHT_TTL = int(os.getenv("SINGLE_FLIGHT_TTL", "600"))
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT", "10"))
+
+# /metrics/ is readable by staff users and by scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" (disabled when empty).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Seconds a process trusts its in-memory curriculum snapshot before re-checking
+# the content version in the database (see main.catalogue).
+CATALOGUE_CHECK_INTERVAL = float(os.getenv("CATALOGUE_CHECK_INTERVAL", "2"))
+
+# "sync" stores attempts inside the request; "write_behind" hands them to a single
+# background writer thread per process (see main.ingestion). ATTEMPT_DURABILITY
+# "commit" makes submits wait for their batch to commit, "buffered" returns at once.
+ATTEMPT_INGESTION_MODE = os.getenv("ATTEMPT_INGESTION_MODE", "sync")
+ATTEMPT_DURABILITY = os.getenv("ATTEMPT_DURABILITY", "commit")
+ATTEMPT_QUEUE_SIZE = int(os.getenv("ATTEMPT_QUEUE_SIZE", "10000"))
+ATTEMPT_BATCH_SIZE = int(os.getenv("ATTEMPT_BATCH_SIZE", "500"))
+ATTEMPT_FLUSH_INTERVAL = float(os.getenv("ATTEMPT_FLUSH_INTERVAL", "0.05"))
+ATTEMPT_ENQUEUE_TIMEOUT = float(os.getenv("ATTEMPT_ENQUEUE_TIMEOUT", "0.5"))
+
+# Seconds between pulls of point totals written by other processes into this
+# process's in-memory leaderboards (see main.leaderboard).
+LEADERBOARD_SYNC_INTERVAL = float(os.getenv("LEADERBOARD_SYNC_INTERVAL", "2"))
+
+# Problems with the "symbolic" checker are graded in a pool of spawned worker
+# processes (see main.checkers). Each check gets GRADER_CPU_SECONDS of CPU and
+# GRADER_TIMEOUT seconds of wall time; GRADER_POOL_WARM starts the workers when
+# config.wsgi or config.asgi loads, never for management commands (run gunicorn
+# without --preload so each worker gets its own pool).
+# A batch submit gets GRADER_BATCH_TIMEOUT seconds for all of its checks, then 503.
+GRADER_POOL_SIZE = int(os.getenv("GRADER_POOL_SIZE", "2"))
+GRADER_MAX_PENDING = int(os.getenv("GRADER_MAX_PENDING", "8"))
+GRADER_CPU_SECONDS = float(os.getenv("GRADER_CPU_SECONDS", "1.0"))
+GRADER_TIMEOUT = float(os.getenv("GRADER_TIMEOUT", "2.0"))
+GRADER_BATCH_TIMEOUT = float(os.getenv("GRADER_BATCH_TIMEOUT", "10.0"))
+GRADER_MEMORY_MB = int(os.getenv("GRADER_MEMORY_MB", "256"))
+GRADER_VERDICT_CACHE_SIZE = int(os.getenv("GRADER_VERDICT_CACHE_SIZE", "10000"))
+GRADER_POOL_WARM = os.getenv("GRADER_POOL_WARM", "False").lower() == "true"
+
+AUTHENTICATION_BACKENDS = ["main.backends.PooledModelBackend"]
+
+# Login and registration hash passwords in a pool of HASHER_POOL_SIZE threads
+# (see main.hashing), half the cores by default so a login burst leaves the rest
+# for other requests. Beyond HASHER_MAX_PENDING queued hashes, callers wait
+# HASHER_ACQUIRE_TIMEOUT seconds and then get a 429.
+HASHER_POOL_SIZE = int(os.getenv("HASHER_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2))))
+HASHER_MAX_PENDING = int(os.getenv("HASHER_MAX_PENDING", "16"))
+HASHER_ACQUIRE_TIMEOUT = float(os.getenv("HASHER_ACQUIRE_TIMEOUT", "0.1"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -84,7 +193,7 @@ CORS_ALLOWED_ORIGINS = [o.strip() for o in cors_origins.split(",") if o.strip()]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "main.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
@@ -96,3 +205,9 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=int(os.getenv("JWT_REFRESH_DAYS", "7"))),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+
+# Authenticated requests build the user from token claims (see main.authentication);
+# token versions, active flags and full user rows are cached per process for
+# AUTH_STATE_TTL seconds, which bounds how long a revocation takes to apply everywhere.
+AUTH_STATE_TTL = float(os.getenv("AUTH_STATE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Only the server starts the grader workers; management commands never do.
+from main.checkers import warm_grader_pool  # noqa: E402
+
+warm_grader_pool()
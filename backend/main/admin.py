@@ -1,6 +1,17 @@
 from django.contrib import admin
 
-from .models import Attempt, Course, Enrollment, Lesson, Module, Problem
+from .models import (
+    Attempt,
+    Course,
+    Enrollment,
+    Lesson,
+    LessonDailyStats,
+    Module,
+    Problem,
+    ProblemDailyStats,
+    UserCoursePoints,
+    UserLessonProgress,
+)
 
 
 @admin.register(Course)
@@ -27,8 +38,9 @@ class LessonAdmin(admin.ModelAdmin):
 
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
-    list_display = ("id", "lesson", "order", "points")
-    list_filter = ("lesson__module__course",)
+    list_display = ("id", "lesson", "order", "points", "checker", "correct_answer", "canonical_answer")
+    list_filter = ("lesson__module__course", "checker")
+    readonly_fields = ("canonical_answer",)
     ordering = ("lesson", "order")
 
 
@@ -39,8 +51,52 @@ class EnrollmentAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "course__title")
 
 
+class AttemptCourseFilter(admin.SimpleListFilter):
+    """Filter attempts by course through the course's problem ids instead of a four-table join."""
+
+    title = "course"
+    parameter_name = "course"
+
+    def lookups(self, request, model_admin):
+        return Course.objects.order_by("title").values_list("id", "title")
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(problem_id__in=Problem.objects.filter(lesson__module__course_id=self.value()).values("id"))
+
+
 @admin.register(Attempt)
 class AttemptAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "problem", "is_correct", "awarded_points", "created_at")
-    list_filter = ("is_correct", "problem__lesson__module__course")
+    list_filter = ("is_correct", AttemptCourseFilter)
+    search_fields = ("user__username",)
+    list_select_related = ("user", "problem")
+    raw_id_fields = ("user", "problem")
+
+
+@admin.register(UserLessonProgress)
+class UserLessonProgressAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "lesson", "solved_count", "completed", "updated_at")
+    list_filter = ("completed",)
     search_fields = ("user__username",)
+
+
+@admin.register(UserCoursePoints)
+class UserCoursePointsAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "course", "points", "reached_at")
+    list_filter = ("course",)
+    search_fields = ("user__username",)
+
+
+@admin.register(ProblemDailyStats)
+class ProblemDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("id", "problem", "day", "attempts", "correct_attempts", "unique_solvers", "median_attempts_to_solve")
+    list_filter = ("day",)
+    raw_id_fields = ("problem",)
+
+
+@admin.register(LessonDailyStats)
+class LessonDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("id", "lesson", "day", "attempts", "correct_attempts", "unique_solvers", "median_attempts_to_solve")
+    list_filter = ("day",)
@@ -0,0 +1,207 @@
+"""Incremental daily rollups of attempts per problem and per lesson."""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Attempt, LessonDailyStats, Problem, ProblemDailyStats, RollupWatermark
+
+WATERMARK_NAME = "daily-stats"
+STAT_FIELDS = ["attempts", "correct_attempts", "unique_solvers", "solve_histogram", "median_attempts_to_solve"]
+
+
+def histogram_median(histogram: dict) -> float | None:
+    """Median of a ``{value: count}`` histogram (keys may be strings, as stored in JSON)."""
+    counts = sorted((int(value), count) for value, count in histogram.items() if count)
+    total = sum(count for _, count in counts)
+    if not total:
+        return None
+
+    lower_index, upper_index = (total - 1) // 2, total // 2
+    lower = upper = None
+    seen = 0
+    for value, count in counts:
+        if lower is None and seen + count > lower_index:
+            lower = value
+        if seen + count > upper_index:
+            upper = value
+            break
+        seen += count
+    return (lower + upper) / 2
+
+
+def merge_histograms(histograms) -> dict:
+    merged = Counter()
+    for histogram in histograms:
+        for value, count in histogram.items():
+            merged[str(value)] += count
+    return dict(merged)
+
+
+class _Stats:
+    __slots__ = ("attempts", "correct_attempts", "unique_solvers", "histogram")
+
+    def __init__(self):
+        self.attempts = 0
+        self.correct_attempts = 0
+        self.unique_solvers = 0
+        self.histogram = Counter()
+
+
+def _history(rows, watermark):
+    """Per (user, problem) attempt counts and solved flags at or below the watermark."""
+    users = {row[1] for row in rows}
+    lessons = {row[3] for row in rows}
+    history = (
+        Attempt.objects.filter(id__lte=watermark, user_id__in=users, problem__lesson_id__in=lessons)
+        .order_by()
+        .values("user_id", "problem_id", "problem__lesson_id")
+        .annotate(tries=Count("id"), solved=Count("id", filter=Q(is_correct=True)))
+    )
+    return list(history)
+
+
+def fold_attempts(rows, watermark):
+    """Aggregate ``(id, user_id, problem_id, lesson_id, is_correct, created_at)`` rows into per-day stats."""
+    lesson_sizes = dict(
+        Problem.objects.filter(lesson_id__in={row[3] for row in rows})
+        .values("lesson_id")
+        .annotate(total=Count("id"))
+        .values_list("lesson_id", "total")
+    )
+
+    problem_tries = Counter()
+    solved_problems = set()
+    lesson_tries = Counter()
+    lesson_solved = defaultdict(set)
+    for item in _history(rows, watermark):
+        user_id, problem_id, lesson_id = item["user_id"], item["problem_id"], item["problem__lesson_id"]
+        problem_tries[user_id, problem_id] = item["tries"]
+        lesson_tries[user_id, lesson_id] += item["tries"]
+        if item["solved"]:
+            solved_problems.add((user_id, problem_id))
+            lesson_solved[user_id, lesson_id].add(problem_id)
+    completed_lessons = {key for key, solved in lesson_solved.items() if len(solved) >= lesson_sizes.get(key[1], 0)}
+
+    problem_stats = defaultdict(_Stats)
+    lesson_stats = defaultdict(_Stats)
+    for _, user_id, problem_id, lesson_id, is_correct, created_at in rows:
+        day = timezone.localdate(created_at)
+        problem_day, lesson_day = problem_stats[problem_id, day], lesson_stats[lesson_id, day]
+        problem_tries[user_id, problem_id] += 1
+        lesson_tries[user_id, lesson_id] += 1
+        for stats in (problem_day, lesson_day):
+            stats.attempts += 1
+            stats.correct_attempts += is_correct
+
+        if not is_correct or (user_id, problem_id) in solved_problems:
+            continue
+        solved_problems.add((user_id, problem_id))
+        problem_day.unique_solvers += 1
+        problem_day.histogram[problem_tries[user_id, problem_id]] += 1
+
+        solved = lesson_solved[user_id, lesson_id]
+        solved.add(problem_id)
+        if (user_id, lesson_id) not in completed_lessons and len(solved) >= lesson_sizes.get(lesson_id, 0):
+            completed_lessons.add((user_id, lesson_id))
+            lesson_day.unique_solvers += 1
+            lesson_day.histogram[lesson_tries[user_id, lesson_id]] += 1
+
+    return problem_stats, lesson_stats
+
+
+def _merge(model, key_field, stats_by_key):
+    if not stats_by_key:
+        return
+    keys = {key for key, _ in stats_by_key}
+    days = {day for _, day in stats_by_key}
+    existing = {
+        (getattr(row, f"{key_field}_id"), row.day): row
+        for row in model.objects.filter(**{f"{key_field}_id__in": keys, "day__in": days})
+    }
+
+    to_create, to_update = [], []
+    for (key, day), stats in stats_by_key.items():
+        row = existing.get((key, day))
+        if row is None:
+            row = model(**{f"{key_field}_id": key, "day": day})
+            to_create.append(row)
+        else:
+            to_update.append(row)
+        row.attempts += stats.attempts
+        row.correct_attempts += stats.correct_attempts
+        row.unique_solvers += stats.unique_solvers
+        row.solve_histogram = merge_histograms([row.solve_histogram, stats.histogram])
+        row.median_attempts_to_solve = histogram_median(row.solve_histogram)
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, STAT_FIELDS)
+
+
+def rollup_attempts(batch_size=10000, limit=None) -> int:
+    """Fold attempts newer than the watermark into the daily tables; returns how many were processed."""
+    processed = 0
+    while limit is None or processed < limit:
+        with transaction.atomic():
+            mark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            rows = list(
+                Attempt.objects.filter(id__gt=mark.last_attempt_id)
+                .order_by("id")
+                .values_list("id", "user_id", "problem_id", "problem__lesson_id", "is_correct", "created_at")[:size]
+            )
+            if not rows:
+                break
+
+            problem_stats, lesson_stats = fold_attempts(rows, mark.last_attempt_id)
+            _merge(ProblemDailyStats, "problem", problem_stats)
+            _merge(LessonDailyStats, "lesson", lesson_stats)
+            mark.last_attempt_id = rows[-1][0]
+            mark.save(update_fields=["last_attempt_id", "updated_at"])
+        processed += len(rows)
+    return processed
+
+
+def reset_rollups():
+    with transaction.atomic():
+        ProblemDailyStats.objects.all().delete()
+        LessonDailyStats.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK_NAME).delete()
+
+
+def filter_days(queryset, start=None, end=None):
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    return queryset
+
+
+def lesson_problem_summaries(lesson_id, start=None, end=None) -> list[dict]:
+    """Per-problem totals for a lesson over a day range, hardest (lowest solve rate) first."""
+    rows = filter_days(ProblemDailyStats.objects.filter(problem__lesson_id=lesson_id), start, end).values(
+        "problem_id", "problem__order", "attempts", "correct_attempts", "unique_solvers", "solve_histogram"
+    )
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(
+            row["problem_id"],
+            {
+                "problem_id": row["problem_id"],
+                "order": row["problem__order"],
+                "attempts": 0,
+                "correct_attempts": 0,
+                "unique_solvers": 0,
+                "histograms": [],
+            },
+        )
+        summary["attempts"] += row["attempts"]
+        summary["correct_attempts"] += row["correct_attempts"]
+        summary["unique_solvers"] += row["unique_solvers"]
+        summary["histograms"].append(row["solve_histogram"])
+
+    for summary in summaries.values():
+        summary["median_attempts_to_solve"] = histogram_median(merge_histograms(summary.pop("histograms")))
+        summary["solve_rate"] = summary["correct_attempts"] / summary["attempts"] if summary["attempts"] else 0.0
+    return sorted(summaries.values(), key=lambda summary: (summary["solve_rate"], summary["order"]))
@@ -0,0 +1,124 @@
+"""Canonical answer forms used for grading.
+
+Both the stored correct answer and each submission are reduced to a canonical
+string, so grading is a string comparison:
+
+* numbers, decimals (``.`` or ``,``) and fractions become a reduced fraction:
+  ``"6.0"``, ``"12/2"`` and ``"6"`` all canonicalize to ``"6"``, ``"0,5"`` to ``"1/2"``;
+  commas are read as thousands separators only when that is unambiguous, with at least
+  two groups (``"1,000,000"``) or a trailing decimal part (``"1,000.5"``), and never after
+  a leading zero: ``"1,000,000"`` -> ``"1000000"``. Otherwise a lone comma between digits
+  is a decimal comma: ``"2,500"`` -> ``"5/2"``, ``"1,000"`` -> ``"1"`` and ``"1,2"`` -> ``"6/5"``
+  (``"1, 2"`` is a list). A sign on the denominator moves to the front: ``"1/-2"`` -> ``"-1/2"``;
+* a single answer drops a leading single-letter assignment: ``"x = 6"`` -> ``"6"``;
+* lists (``";"``-separated, ``", "``-separated, ``"1,2,3"``, or a comma before an
+  assignment as in ``"x=1,y=2"``) are canonicalized per item and joined with ``";"``
+  in their original order;
+* roots of one variable (``"x = -2; x = 3"``) are a set: ``"{-2;3}"``;
+* sets are lists in braces: de-duplicated, sorted and kept in braces,
+  ``"{2; 1}"`` -> ``"{1;2}"``. When the correct answer is a set, a submitted
+  bare list is read as a set too, so ``"2, 1"`` matches;
+* items assigning more than one variable keep their ``"x=..."`` names and are
+  sorted by them, so ``"x = 1, y = 2"`` matches ``"y = 2, x = 1"`` but not ``"x = 2, y = 1"``;
+* tuples and intervals (in parentheses or square brackets) stay ordered:
+  ``"(1, 2)"`` -> ``"(1,2)"``, which does not match ``"(2,1)"``;
+* anything else is lowercased with whitespace collapsed.
+"""
+
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+_SET_BRACKETS = {"{": "}"}
+_TUPLE_BRACKETS = {"(": ")", "[": "]"}
+_ASSIGNMENT = re.compile(r"^([a-z])\s*=\s*")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+_THOUSANDS = re.compile(r"^[+-]?[1-9]\d{0,2}(?:(?:,\d{3}){2,}(?:\.\d+)?|(?:,\d{3})+\.\d+)$")
+_SPACES = re.compile(r"\s+")
+# A comma followed by whitespace or by another assignment separates items.
+_SET_SEPARATOR = re.compile(r"\s*;\s*|,\s+|,(?=[a-z]\s*=)")
+_NUMBER = re.compile(r"^[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:/[+-]?(?:\d+(?:\.\d*)?|\.\d+))?$")
+
+SET_SEPARATOR = ";"
+
+
+def _canonical_number(text: str) -> str | None:
+    if not _NUMBER.match(text):
+        return None
+    numerator, _, denominator = text.partition("/")
+    value = Fraction(numerator)
+    if denominator:
+        divisor = Fraction(denominator)
+        if not divisor:
+            return None
+        value /= divisor
+    return str(value)
+
+
+def _canonical_value(text: str) -> str:
+    text = text.strip()
+    compact = _SPACES.sub("", text)
+    if _THOUSANDS.match(compact):
+        compact = compact.replace(",", "")
+    number = _canonical_number(_DECIMAL_COMMA.sub(".", compact))
+    if number is not None:
+        return number
+    return _DECIMAL_COMMA.sub(".", _SPACES.sub(" ", text))
+
+
+def _bracketed(text: str, brackets: dict) -> bool:
+    return len(text) > 1 and brackets.get(text[0]) == text[-1]
+
+
+def _split_items(text: str, bracketed: bool) -> list[str]:
+    parts = _SET_SEPARATOR.split(text)
+    # A lone comma between digits is a decimal separator and unambiguous digit groups
+    # of three are thousands; otherwise several commas make a list.
+    if len(parts) == 1 and (bracketed or (text.count(",") > 1 and not _THOUSANDS.match(_SPACES.sub("", text)))):
+        parts = text.split(",")
+    return [part for part in parts if part.strip()]
+
+
+def _canonical_list(parts: list[str], unordered: bool) -> str:
+    assignments = [_ASSIGNMENT.match(part.strip()) for part in parts]
+    variables = {match.group(1) for match in assignments if match}
+    if len(variables) > 1:
+        # Values named by several variables pair up by name, whatever the order.
+        items = {
+            f"{match.group(1)}={_canonical_value(part.strip()[match.end():])}" if match else _canonical_value(part)
+            for part, match in zip(parts, assignments)
+        }
+        return SET_SEPARATOR.join(sorted(items))
+
+    # Roots of one variable ("x=1; x=2") are plain values, and unordered like a set.
+    items = [_canonical_value(part.strip()[match.end():] if match else part) for part, match in zip(parts, assignments)]
+    if unordered or variables:
+        return "{" + SET_SEPARATOR.join(sorted(set(items))) + "}"
+    return SET_SEPARATOR.join(items)
+
+
+@lru_cache(maxsize=8192)
+def canonicalize(value: str, unordered: bool = False) -> str:
+    """Return the canonical form of an answer string; ``unordered`` reads a bare list as a set."""
+    text = str(value).strip().lower()
+    if _bracketed(text, _TUPLE_BRACKETS):
+        parts = _split_items(text[1:-1], bracketed=True)
+        if len(parts) > 1:
+            return text[0] + ",".join(_canonical_value(part) for part in parts) + text[-1]
+
+    braced = _bracketed(text, _SET_BRACKETS)
+    parts = _split_items(text[1:-1] if braced else text, braced)
+    if len(parts) > 1:
+        return _canonical_list(parts, braced or unordered)
+    return _canonical_value(_ASSIGNMENT.sub("", (parts[0] if parts else text).strip(), count=1))
+
+
+def answers_match(canonical_answer: str, submitted: str) -> bool:
+    """Compare a submission with a stored canonical answer.
+
+    Exact canonical submissions (the common case) are matched without parsing.
+    """
+    text = str(submitted).strip()
+    if text == canonical_answer:
+        return True
+    return canonicalize(text, unordered=canonical_answer.startswith("{")) == canonical_answer
@@ -0,0 +1,154 @@
+"""Async versions of the hot read endpoints, served instead of the DRF views when ``ASYNC_READ_VIEWS`` is set.
+
+All data is loaded through the async ORM up front, so serializers never touch the database.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+
+from .authentication import aget_request_user
+from .catalogue import aget_catalogue, overlay_course_tree
+from .conditional import course_etag, course_tree_etag, lesson_etag, not_modified, revalidating, tagged
+from .fieldsets import field_selection
+from .models import Course, Lesson
+from .pagination import KeysetPaginator
+from .rendering import (
+    accepted_encodings,
+    alesson_payload,
+    course_tree_payload,
+    negotiated_not_modified,
+    payload_response,
+    render_json,
+    store_payload,
+)
+from .replicas import primary_reads, replica_reads
+from .serializers import CourseDetailSerializer, CourseListSerializer, LessonDetailSerializer
+from .services import acompleted_lesson_ids, annotate_course_counts, course_user_states
+from .views import COURSE_ORDERING, add_course_user_state, course_list_key, shared_course_list, shared_course_lists
+
+
+def json_response(data, status=200):
+    # Match DRF's JSONRenderer output: compact separators, unescaped unicode.
+    return JsonResponse(
+        data, status=status, safe=False, json_dumps_params={"ensure_ascii": False, "separators": (",", ":")}
+    )
+
+
+def not_found(model):
+    return json_response({"detail": f"No {model._meta.object_name} matches the given query."}, status=404)
+
+
+class AsyncAPIView(View):
+    """Resolves the JWT user before dispatch and renders DRF auth errors as JSON.
+
+    These are all curriculum reads, so they run inside ``replica_reads()``.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            with replica_reads():
+                request.user = await aget_request_user(request)
+                return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+            return json_response(detail, status=exc.status_code)
+
+
+class HealthView(View):
+    async def get(self, request):
+        return json_response({"status": "ok", "service": "math-edu-backend"})
+
+
+class CourseListView(AsyncAPIView):
+    paginator = KeysetPaginator(COURSE_ORDERING)
+
+    async def get(self, request):
+        selection = field_selection(request, CourseListSerializer)
+        serializer = CourseListSerializer(selection=selection)
+        version = (await aget_catalogue()).version
+        # Only a cold or stale list takes the thread hop.
+        shared = shared_course_lists.peek(course_list_key(request), version)
+        if shared is None:
+            shared = await sync_to_async(shared_course_list)(request, selection, self.paginator, version)
+        body, courses = shared
+        if request.user.is_authenticated and serializer.needs_user_state() and courses:
+            with primary_reads():
+                states = [row async for row in course_user_states(request.user, [course_id for course_id, _ in courses])]
+            body = add_course_user_state(body, serializer, courses, states)
+        return json_response(body)
+
+
+class CourseDetailView(AsyncAPIView):
+    async def get(self, request, course_ref):
+        lookup = {"id": int(course_ref)} if course_ref.isdigit() else {"slug": course_ref}
+        if revalidating(request):
+            row = await Course.objects.filter(is_published=True, **lookup).values_list("id", "content_version").afirst()
+            response = not_modified(request, course_etag(*row)) if row else None
+            if response is not None:
+                return response
+
+        queryset = annotate_course_counts(Course.objects.filter(is_published=True))
+        try:
+            course = await queryset.aget(**lookup)
+        except Course.DoesNotExist:
+            return not_found(Course)
+        return tagged(json_response(CourseDetailSerializer(course).data), course_etag(course.id, course.content_version))
+
+
+class CourseTreeView(AsyncAPIView):
+    async def get(self, request, course_id):
+        course = (await aget_catalogue()).published_course(course_id)
+        if course is None:
+            return not_found(Course)
+
+        completion = {lesson_id: False for lesson_id in course.lesson_ids}
+        if request.user.is_authenticated and course.lesson_ids:
+            for lesson_id in await acompleted_lesson_ids(request.user, course.lesson_ids):
+                completion[lesson_id] = True
+        completed = [lesson for lesson, done in completion.items() if done]
+        etag = course_tree_etag(course.id, course.content_version, completed)
+        encodings = ["identity"] if completed else accepted_encodings(request)
+        response = negotiated_not_modified(request, etag, encodings, vary=["Authorization"])
+        if response is not None:
+            return response
+
+        if not completed:
+            payload = course.payload or await sync_to_async(course_tree_payload)(course)
+            return payload_response(payload, encodings, etag, vary=["Authorization"])
+        return tagged(json_response(overlay_course_tree(course.tree, completion)), etag, vary=["Authorization"])
+
+
+class LessonDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        selection = field_selection(request, LessonDetailSerializer)
+        encodings = accepted_encodings(request) if selection is None else ["identity"]
+        if revalidating(request):
+            version = await Lesson.objects.filter(pk=pk).values_list("module__course__content_version", flat=True).afirst()
+            if version:
+                response = negotiated_not_modified(request, lesson_etag(request, pk, version), encodings)
+                if response is not None:
+                    return response
+        if selection is None:
+            payload = await alesson_payload(pk, encodings)
+            if payload is not None:
+                return payload_response(payload, encodings, lesson_etag(request, pk, payload.content_version))
+
+        serializer = LessonDetailSerializer(selection=selection)
+        queryset = serializer.prepare_queryset(Lesson.objects.all()).annotate(
+            content_version=F("module__course__content_version")
+        )
+        try:
+            lesson = serializer.instance = await queryset.aget(pk=pk)
+        except Lesson.DoesNotExist:
+            return not_found(Lesson)
+        etag = lesson_etag(request, pk, lesson.content_version)
+        if selection is None:
+            body = render_json(serializer.data)
+            payload = await sync_to_async(store_payload)(lesson.module.course_id, pk, lesson.content_version, body)
+            return payload_response(payload, encodings, etag)
+        return tagged(json_response(serializer.data), etag)
@@ -0,0 +1,228 @@
+"""JWT authentication that resolves users from token claims.
+
+Tokens issued through ``add_user_claims`` carry the username, the staff flags
+and the user's token version (``UserTokenVersion``). Authenticating one needs
+no ``User`` query: the request gets a ``User`` built from the claims with
+every other field deferred, and views that need those fields ask
+``full_user`` for a cached copy. The token version and ``is_active`` are
+checked against a per-process cache refreshed every ``AUTH_STATE_TTL``
+seconds, so a revocation reaches other processes within that time. Tokens
+without a version claim take simplejwt's per-request lookup.
+"""
+
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserTokenVersion
+
+TOKEN_VERSION_CLAIM = "token_version"
+CLAIM_FIELDS = ("username", "is_staff", "is_superuser")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU whose entries expire a given number of seconds after being stored."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# user id -> (is_active, token version), or None for a deleted user.
+_auth_states = TTLCache(settings.AUTH_CACHE_SIZE)
+# user id -> fully loaded ``User``.
+_full_users = TTLCache(settings.AUTH_CACHE_SIZE)
+
+
+def _state_query(user_id):
+    return User.objects.filter(pk=user_id).values_list("is_active", "token_version__version")
+
+
+def _remember_state(user_id, row):
+    state = (row[0], row[1] or 1) if row else None
+    _auth_states.set(user_id, state, settings.AUTH_STATE_TTL)
+    return state
+
+
+def auth_state(user_id):
+    state = _auth_states.get(user_id, _MISSING)
+    if state is _MISSING:
+        state = _remember_state(user_id, _state_query(user_id).first())
+    return state
+
+
+async def aauth_state(user_id):
+    state = _auth_states.get(user_id, _MISSING)
+    if state is _MISSING:
+        state = _remember_state(user_id, await _state_query(user_id).afirst())
+    return state
+
+
+def current_token_version(user_id) -> int:
+    # Read fresh rather than from the cache, so a new token is never minted below a revocation.
+    return UserTokenVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 1
+
+
+def add_user_claims(token, user, version=None):
+    """Embed what ``StatelessJWTAuthentication`` needs; pass ``version`` when it is already known."""
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token[TOKEN_VERSION_CLAIM] = current_token_version(user.pk) if version is None else version
+    return token
+
+
+def forget_user(user_id):
+    """Drop this process's cached state for the user."""
+    _auth_states.discard(user_id)
+    _full_users.discard(user_id)
+
+
+def revoke_user_tokens(user_id):
+    """Invalidate every token issued to the user so far; other processes follow within ``AUTH_STATE_TTL``."""
+    _, created = UserTokenVersion.objects.get_or_create(user_id=user_id, defaults={"version": 2})
+    if not created:
+        UserTokenVersion.objects.filter(user_id=user_id).update(version=F("version") + 1)
+    forget_user(user_id)
+
+
+def claims_user(validated_token, user_id) -> User:
+    """A ``User`` holding only the claim fields; the others are deferred and load on access."""
+    claims = {"id": user_id, "is_active": True, **{field: validated_token[field] for field in CLAIM_FIELDS}}
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [claims[field] for field in fields])
+
+
+def full_user(user) -> User:
+    """``user`` with every field loaded, via a short-TTL cache when it came from claims."""
+    if not user.get_deferred_fields():
+        return user
+    loaded = _full_users.get(user.pk)
+    if loaded is None:
+        loaded = User.objects.get(pk=user.pk)
+        _full_users.set(user.pk, loaded, settings.AUTH_STATE_TTL)
+    return loaded
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that builds the user from token claims instead of loading it."""
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user_id = self.token_user_id(validated_token)
+        return self.claims_user_for(validated_token, user_id, auth_state(user_id))
+
+    def token_user_id(self, validated_token) -> int:
+        """The user id claim as an int; simplejwt 5.5+ issues it as a string, but the caches are keyed on the pk."""
+        try:
+            return int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def claims_user_for(self, validated_token, user_id, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, version = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token[TOKEN_VERSION_CLAIM] != version:
+            raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+        return claims_user(validated_token, user_id)
+
+
+class AsyncJWTAuthentication(StatelessJWTAuthentication):
+    """JWT authentication usable from async views; any lookup goes through the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        if TOKEN_VERSION_CLAIM in validated_token:
+            return self.claims_user_for(validated_token, user_id, await aauth_state(user_id))
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """Accept ``Authorization: Bearer <METRICS_TOKEN>`` from metrics scrapers; other credentials fall through."""
+
+    def authenticate(self, request):
+        expected = settings.METRICS_TOKEN
+        header = get_authorization_header(request).split()
+        if not expected or len(header) != 2 or header[0].lower() != b"bearer":
+            return None
+        if not hmac.compare_digest(header[1], expected.encode()):
+            return None
+        return AnonymousUser(), None
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="metrics"'
+
+
+async def aget_request_user(request):
+    """Authenticate ``request`` from its bearer token, falling back to an anonymous user."""
+    result = await AsyncJWTAuthentication().aauthenticate(request)
+    return result[0] if result else AnonymousUser()
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import hash_password, verify_password
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """``ModelBackend`` that hashes in the bounded pool (``main.hashing``) and upgrades outdated hashes.
+
+    May raise ``LoginBusy`` when the pool is saturated.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so response time does not reveal which usernames exist.
+            hash_password(password)
+            return None
+
+        matches, must_update = verify_password(password, user.password)
+        if not matches or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hash_password(password)
+            # Same password under a newer hasher: skip save() and its signals, which would revoke the user's tokens.
+            UserModel._default_manager.filter(pk=user.pk).update(password=user.password)
+        return user
@@ -0,0 +1,424 @@
+import copy
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import add_user_claims, auth_state, forget_user
+from .catalogue import get_catalogue, invalidate_catalogue
+from .hashing import shutdown_hashing_pool
+from .leaderboard import get_leaderboards
+from .models import Course, Enrollment, Lesson, Problem
+from .rendering import course_tree_payload, render_course_payloads
+
+# Generated dataset shapes passed to ``seed_load``.
+DATASETS = {
+    "small": {"courses": 2, "modules_per_course": 2, "lessons_per_module": 2, "problems_per_lesson": 3, "users": 20, "attempts": 200},
+    "medium": {"courses": 5, "modules_per_course": 3, "lessons_per_module": 5, "problems_per_lesson": 5, "users": 200, "attempts": 5000},
+    "large": {"courses": 10, "modules_per_course": 5, "lessons_per_module": 10, "problems_per_lesson": 5, "users": 2000, "attempts": 50000},
+}
+
+# Maximum queries per request. These are absolute numbers, so the same budget
+# holding for every dataset size is what keeps endpoints O(1) in course size.
+# Endpoint counts are steady state, with the catalogue snapshot, leaderboards
+# and auth states warm. Their periodic refreshes (once per
+# CATALOGUE_CHECK_INTERVAL and LEADERBOARD_SYNC_INTERVAL per process, and per
+# user every AUTH_STATE_TTL) have their own "refresh-*" budgets. Exports run one
+# query per 2000 rows; theirs are measured for a single user's rows.
+QUERY_BUDGETS = {
+    "health": 0,
+    "auth-register": 3,
+    "auth-login": 2,
+    "auth-refresh": 0,
+    "auth-me": 1,
+    "courses-list": 1,
+    "courses-list-auth": 1,
+    "courses-list-sparse": 1,
+    "courses-detail": 1,
+    "courses-enroll": 4,
+    "courses-tree": 1,
+    "lessons-detail": 1,
+    "lessons-detail-sparse": 1,
+    "attempt-submit": 9,
+    "attempt-submit-batch": 9,
+    "me-enrollments": 2,
+    "me-attempts": 1,
+    "me-attempts-latest": 1,
+    "leaderboard": 1,
+    "leaderboard-me": 1,
+    "metrics": 0,
+    "analytics-problem-daily": 2,
+    "analytics-lesson-daily": 2,
+    "analytics-lesson-problems": 2,
+    "export-attempts": 1,
+    "export-enrollments": 1,
+    "refresh-catalogue": 1,
+    "refresh-catalogue-rebuild": 5,
+    "refresh-leaderboards": 2,
+    "refresh-auth-state": 1,
+}
+
+
+# Connection OPTIONS compared by ``run_contention``. The journal mode is stored
+# in the database file, so both profiles set it explicitly; production takes
+# WAL unless SQLITE_JOURNAL_MODE says otherwise.
+CONTENTION_PROFILES = {
+    "baseline": {"init_command": "PRAGMA journal_mode=DELETE;PRAGMA synchronous=FULL"},
+    "production": {
+        **settings.SQLITE_OPTIONS,
+        "init_command": f"PRAGMA journal_mode=WAL;{settings.SQLITE_OPTIONS['init_command']}",
+    },
+}
+
+
+class BenchmarkContext:
+    """Fixed handles into a generated dataset used to build requests."""
+
+    def __init__(self, seed=42):
+        self.rng = random.Random(seed)
+        self.course = Course.objects.filter(slug__startswith="bench-course-").order_by("id").first()
+        self.users = list(User.objects.filter(username__startswith="bench_user_").order_by("id")[:50])
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).values_list("id", flat=True))
+        self.problems = list(Problem.objects.filter(lesson__module__course=self.course).values_list("id", "correct_answer"))
+        self.staff, _ = User.objects.get_or_create(username="bench_staff", defaults={"is_staff": True})
+        self.tokens = {
+            user.id: add_user_claims(RefreshToken.for_user(user), user, version=1) for user in (*self.users, self.staff)
+        }
+        self.counter = 0
+
+    def client(self, authenticated=True, staff=False):
+        client = APIClient()
+        if authenticated:
+            user = self.staff if staff else self.rng.choice(self.users)
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens[user.id].access_token}")
+        return client
+
+    def answer(self):
+        problem_id, correct_answer = self.rng.choice(self.problems)
+        return {"problem_id": problem_id, "answer": correct_answer if self.rng.random() < 0.6 else "0"}
+
+    def unique_username(self):
+        self.counter += 1
+        return f"bench_user_new_{self.counter:06d}"
+
+
+def endpoint_requests(ctx):
+    """Map endpoint names to callables that perform one request and return the response."""
+    course_id = ctx.course.id
+    return {
+        "health": lambda: ctx.client(False).get(reverse("health")),
+        "auth-register": lambda: ctx.client(False).post(
+            reverse("auth-register"),
+            {"username": ctx.unique_username(), "email": "bench@example.com", "password": "benchpass12345"},
+            format="json",
+        ),
+        "auth-login": lambda: ctx.client(False).post(
+            reverse("auth-login"),
+            {"username": ctx.rng.choice(ctx.users).username, "password": "loadtest12345"},
+            format="json",
+        ),
+        "auth-refresh": lambda: ctx.client(False).post(
+            reverse("auth-refresh"), {"refresh": str(ctx.tokens[ctx.rng.choice(ctx.users).id])}, format="json"
+        ),
+        "auth-me": lambda: ctx.client().get(reverse("auth-me")),
+        "courses-list": lambda: ctx.client(False).get(reverse("courses-list")),
+        "courses-list-auth": lambda: ctx.client().get(reverse("courses-list")),
+        "courses-list-sparse": lambda: ctx.client().get(reverse("courses-list"), {"fields": "id,title", "page_size": 10}),
+        "courses-detail": lambda: ctx.client(False).get(reverse("courses-detail", kwargs={"course_ref": ctx.course.slug})),
+        "courses-enroll": lambda: ctx.client().post(reverse("courses-enroll", kwargs={"course_id": course_id}), format="json"),
+        "courses-tree": lambda: ctx.client().get(reverse("courses-tree", kwargs={"course_id": course_id})),
+        "lessons-detail": lambda: ctx.client(False).get(reverse("lessons-detail", kwargs={"pk": ctx.rng.choice(ctx.lessons)})),
+        "lessons-detail-sparse": lambda: ctx.client(False).get(
+            reverse("lessons-detail", kwargs={"pk": ctx.rng.choice(ctx.lessons)}), {"fields": "id,title,course_id"}
+        ),
+        "attempt-submit": lambda: ctx.client().post(reverse("attempt-submit"), ctx.answer(), format="json"),
+        "attempt-submit-batch": lambda: ctx.client().post(
+            reverse("attempt-submit-batch"), [ctx.answer() for _ in range(10)], format="json"
+        ),
+        "me-enrollments": lambda: ctx.client().get(reverse("me-enrollments")),
+        "me-attempts": lambda: ctx.client().get(reverse("me-attempts"), {"course": course_id}),
+        "me-attempts-latest": lambda: ctx.client().get(reverse("me-attempts"), {"course": course_id, "latest": "true"}),
+        "leaderboard": lambda: ctx.client().get(reverse("leaderboard"), {"course": course_id, "limit": 20}),
+        "leaderboard-me": lambda: ctx.client().get(reverse("leaderboard-me"), {"around": 5}),
+        "metrics": lambda: ctx.client(staff=True).get(reverse("metrics")),
+        "analytics-problem-daily": lambda: ctx.client(staff=True).get(
+            reverse("analytics-problem-daily", kwargs={"problem_id": ctx.rng.choice(ctx.problems)[0]})
+        ),
+        "analytics-lesson-daily": lambda: ctx.client(staff=True).get(
+            reverse("analytics-lesson-daily", kwargs={"lesson_id": ctx.rng.choice(ctx.lessons)})
+        ),
+        "analytics-lesson-problems": lambda: ctx.client(staff=True).get(
+            reverse("analytics-lesson-problems", kwargs={"lesson_id": ctx.rng.choice(ctx.lessons)})
+        ),
+        "export-attempts": lambda: ctx.client(staff=True).get(
+            reverse("export", kwargs={"kind": "attempts", "output_format": "ndjson"}),
+            {"user": ctx.rng.choice(ctx.users).id},
+        ),
+        "export-enrollments": lambda: ctx.client(staff=True).get(
+            reverse("export", kwargs={"kind": "enrollments", "output_format": "csv"}),
+            {"user": ctx.rng.choice(ctx.users).id},
+        ),
+    }
+
+
+def refresh_requests(ctx):
+    """Map the periodic refreshes left out of endpoint counts to callables running one of each."""
+    user_id = ctx.users[0].id
+
+    def catalogue_check():
+        with override_settings(CATALOGUE_CHECK_INTERVAL=0):
+            get_catalogue()
+
+    def catalogue_rebuild():
+        invalidate_catalogue()
+        get_catalogue()
+
+    def leaderboard_sync():
+        with override_settings(LEADERBOARD_SYNC_INTERVAL=0):
+            get_leaderboards()
+
+    def auth_state_refresh():
+        forget_user(user_id)
+        auth_state(user_id)
+
+    return {
+        "refresh-catalogue": catalogue_check,
+        "refresh-catalogue-rebuild": catalogue_rebuild,
+        "refresh-leaderboards": leaderboard_sync,
+        "refresh-auth-state": auth_state_refresh,
+    }
+
+
+def generate_dataset(size, seed=42):
+    cache.clear()
+    call_command("seed_load", prefix="bench", flush=True, seed=seed, stdout=StringIO(), **DATASETS[size])
+    # The analytics endpoints read the daily rollups, which the seeder's bulk inserts don't feed.
+    call_command("rollup_analytics", rebuild=True, stdout=StringIO())
+
+
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE SAVEPOINT")
+
+
+def count_queries(captured):
+    """Count captured statements, ignoring transaction control which varies by backend."""
+    return sum(1 for query in captured.captured_queries if not query["sql"].startswith(TRANSACTION_STATEMENTS))
+
+
+def measure(request, iterations):
+    """Run ``request`` repeatedly and collect query counts, timings and response sizes.
+
+    ``request`` may return ``None`` (a refresh rather than an HTTP request).
+    Streamed bodies are consumed inside the measurement, since that is when
+    their queries run.
+    """
+    timings, queries, sizes = [], [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request()
+            if response is None:
+                body = b""
+            else:
+                body = b"".join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        if response is not None and response.status_code >= 400:
+            raise AssertionError(f"{response.status_code}: {body[:200]!r}")
+        timings.append(elapsed * 1000)
+        queries.append(count_queries(captured))
+        sizes.append(len(body))
+
+    cuts = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        "iterations": iterations,
+        "queries_max": max(queries),
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "bytes": max(sizes),
+    }
+
+
+def run_benchmarks(sizes=("small",), iterations=20, endpoints=None, seed=42):
+    """Benchmark every endpoint against each generated dataset; returns ``{size: {endpoint: stats}}``."""
+    results = {}
+    for size in sizes:
+        generate_dataset(size, seed=seed)
+        ctx = BenchmarkContext(seed=seed)
+        # Enroll the sampled users so enrollment-backed endpoints have rows to serve.
+        Enrollment.objects.bulk_create(
+            [Enrollment(user=user, course=ctx.course) for user in ctx.users], ignore_conflicts=True
+        )
+        # Publishing renders these; the seeder's bulk inserts send no signals.
+        render_course_payloads(Course.objects.all())
+        # Refreshes go last: rebuilding the catalogue drops its memoized payloads.
+        requests = {**endpoint_requests(ctx), **refresh_requests(ctx)}
+        with override_settings(
+            CATALOGUE_CHECK_INTERVAL=float("inf"), LEADERBOARD_SYNC_INTERVAL=float("inf"), AUTH_STATE_TTL=float("inf")
+        ):
+            course_tree_payload(get_catalogue().published_course(ctx.course.id))
+            get_leaderboards()
+            for user in (*ctx.users, ctx.staff):
+                auth_state(user.id)
+            results[size] = {
+                name: measure(request, iterations)
+                for name, request in requests.items()
+                if endpoints is None or name in endpoints
+            }
+    return results
+
+
+def summarize_latencies(timings, seconds, errors, shed=0):
+    cuts = statistics.quantiles(timings, n=100) if len(timings) > 1 else (timings or [0.0]) * 99
+    return {
+        "requests": len(timings),
+        "per_second": len(timings) / seconds,
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+        "errors": errors,
+        "shed": shed,
+    }
+
+
+def load_worker(ctx, endpoint, deadline, collected):
+    """Issue ``endpoint`` requests until ``deadline``.
+
+    429s count as shed; other failures (including "database is locked") as errors.
+    """
+    request = endpoint_requests(ctx)[endpoint]
+    timings, errors, shed = [], 0, 0
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status_code = request().status_code
+            except OperationalError:
+                status_code = 500
+            if status_code < 400:
+                timings.append((time.perf_counter() - started) * 1000)
+            elif status_code == 429:
+                shed += 1
+            else:
+                errors += 1
+    finally:
+        connection.close()
+    collected.append((endpoint, timings, errors, shed))
+
+
+def run_load(workload, duration=5.0, size="small", seed=42):
+    """Run ``{endpoint: threads}`` concurrently for ``duration`` seconds; returns ``{endpoint: stats}``.
+
+    Needs a file-backed default database (see ``file_test_database``): each thread opens its own connection.
+    """
+    generate_dataset(size, seed=seed)
+    ctx = BenchmarkContext(seed=seed)
+    render_course_payloads(Course.objects.all())
+    with override_settings(CATALOGUE_CHECK_INTERVAL=float("inf"), LEADERBOARD_SYNC_INTERVAL=float("inf")):
+        get_catalogue()
+        get_leaderboards()
+        collected = []
+        deadline = time.perf_counter() + duration
+        endpoints = [endpoint for endpoint, threads in workload.items() for _ in range(threads)]
+        threads = []
+        for index, endpoint in enumerate(endpoints):
+            worker_ctx = copy.copy(ctx)
+            worker_ctx.rng = random.Random(seed + index)
+            threads.append(threading.Thread(target=load_worker, args=(worker_ctx, endpoint, deadline, collected)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = {}
+    for endpoint in workload:
+        runs = [run for run in collected if run[0] == endpoint]
+        timings = [value for run in runs for value in run[1]]
+        results[endpoint] = summarize_latencies(
+            timings, duration, sum(run[2] for run in runs), sum(run[3] for run in runs)
+        )
+    return results
+
+
+@contextmanager
+def file_test_database():
+    """A throwaway file-backed test database; an in-memory one is not shared the same way between threads."""
+    with tempfile.TemporaryDirectory() as directory:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Locked-database 500s and 429s are expected under load; they are counted, not logged.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            yield
+        finally:
+            request_logger.setLevel(level)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def run_contention(profiles=("baseline", "production"), writers=4, readers=4, duration=5.0, size="small", seed=42):
+    """Run concurrent submits and tree reads against each SQLite profile; returns ``{profile: {endpoint: stats}}``."""
+    original = connection.settings_dict["OPTIONS"]
+    results = {}
+    try:
+        for profile in profiles:
+            # Every thread's connection reads this same settings dict.
+            connection.close()
+            connection.settings_dict["OPTIONS"] = CONTENTION_PROFILES[profile]
+            workload = {"attempt-submit": writers, "courses-tree": readers}
+            results[profile] = run_load(workload, duration=duration, size=size, seed=seed)
+    finally:
+        connection.close()
+        connection.settings_dict["OPTIONS"] = original
+    return results
+
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_login_throughput(clients=8, pool_size=None, duration=5.0, size="small", seed=42):
+    """Hammer the login endpoint from ``clients`` threads while one thread polls ``health``.
+
+    Returns ``{endpoint: stats}``; the login entry also has ``per_core``
+    (successful logins per second per available core) and ``cores``.
+    """
+    pool_size = pool_size or settings.HASHER_POOL_SIZE
+    shutdown_hashing_pool()
+    try:
+        with override_settings(HASHER_POOL_SIZE=pool_size):
+            results = run_load({"auth-login": clients, "health": 1}, duration=duration, size=size, seed=seed)
+    finally:
+        shutdown_hashing_pool()
+    cores = available_cores()
+    results["auth-login"].update(cores=cores, pool_size=pool_size, per_core=results["auth-login"]["per_second"] / cores)
+    return results
+
+
+def budget_violations(results, budgets=QUERY_BUDGETS):
+    violations = []
+    for size, endpoints in results.items():
+        for name, stats in endpoints.items():
+            budget = budgets.get(name)
+            if budget is not None and stats["queries_max"] > budget:
+                violations.append(f"{size}/{name}: {stats['queries_max']} queries (budget {budget})")
+    return violations
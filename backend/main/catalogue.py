@@ -0,0 +1,239 @@
+"""In-process, read-only snapshot of the course -> module -> lesson -> problem graph.
+
+Curriculum changes rarely while submits are constant, so grading and tree
+rendering read static data from this snapshot instead of the database. A
+cheap version query (the sum of ``Course.content_version``, the course count
+and the highest course id; module, lesson and problem signals bump their
+course's version) decides when to rebuild. Versions are counters, so clock
+skew between processes cannot hide an edit.
+One thread rebuilds while the others keep reading the previous snapshot;
+only a process without any snapshot waits for the build.
+
+Another process's edit can take up to ``CATALOGUE_CHECK_INTERVAL`` to show
+here, so write paths only take answers and ids from the snapshot: lesson
+completion and course progress are counted from the database. The snapshot
+holds unpublished courses too; ``published_course`` and
+``published_problem`` apply the public visibility rule.
+"""
+
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from .models import Course, Problem
+from .replicas import primary_reads
+
+
+class ProblemRecord:
+    __slots__ = ("id", "lesson_id", "course_id", "correct_answer", "canonical_answer", "checker", "points")
+
+    def __init__(self, id, lesson_id, course_id, correct_answer, canonical_answer, checker, points):
+        self.id = id
+        self.lesson_id = lesson_id
+        self.course_id = course_id
+        self.correct_answer = correct_answer
+        self.canonical_answer = canonical_answer
+        self.checker = checker
+        self.points = points
+
+    def as_model(self) -> Problem:
+        """Unsaved ``Problem`` carrying just the fields grading needs."""
+        return Problem(
+            id=self.id,
+            lesson_id=self.lesson_id,
+            correct_answer=self.correct_answer,
+            canonical_answer=self.canonical_answer,
+            checker=self.checker,
+            points=self.points,
+        )
+
+
+class CourseRecord:
+    __slots__ = ("id", "is_published", "content_version", "lesson_ids", "tree", "payload")
+
+    def __init__(self, id, is_published, content_version, lesson_ids, tree):
+        self.id = id
+        self.is_published = is_published
+        self.content_version = content_version
+        self.lesson_ids = lesson_ids
+        self.tree = tree
+        # Pre-rendered progress-free tree at ``content_version``, loaded on first use.
+        self.payload = None
+
+
+class CatalogueSnapshot:
+    __slots__ = ("version", "courses", "problems", "lesson_course", "lesson_problems")
+
+    def __init__(self, version, courses, problems, lesson_course, lesson_problems):
+        self.version = version
+        self.courses = courses
+        self.problems = problems
+        self.lesson_course = lesson_course
+        self.lesson_problems = lesson_problems
+
+    def problem(self, problem_id) -> ProblemRecord | None:
+        return self.problems.get(problem_id)
+
+    def published_problem(self, problem_id) -> ProblemRecord | None:
+        problem = self.problems.get(problem_id)
+        return problem if problem is not None and self.published_course(problem.course_id) else None
+
+    def published_course(self, course_id) -> CourseRecord | None:
+        course = self.courses.get(course_id)
+        return course if course is not None and course.is_published else None
+
+    def course_lesson_ids(self, course_id) -> tuple:
+        course = self.courses.get(course_id)
+        return course.lesson_ids if course is not None else ()
+
+    def lesson_course_id(self, lesson_id):
+        return self.lesson_course.get(lesson_id)
+
+    def lesson_problem_ids(self, lesson_id) -> tuple:
+        return self.lesson_problems.get(lesson_id, ())
+
+    def course_problem_ids(self, course_id) -> list:
+        return [
+            problem_id
+            for lesson_id in self.course_lesson_ids(course_id)
+            for problem_id in self.lesson_problems.get(lesson_id, ())
+        ]
+
+
+VERSION_AGGREGATES = {"versions": Sum("content_version"), "count": Count("id"), "last_id": Max("id")}
+
+
+def catalogue_version():
+    row = Course.objects.order_by().aggregate(**VERSION_AGGREGATES)
+    return row["versions"] or 0, row["count"], row["last_id"]
+
+
+async def acatalogue_version():
+    row = await Course.objects.order_by().aaggregate(**VERSION_AGGREGATES)
+    return row["versions"] or 0, row["count"], row["last_id"]
+
+
+def build_course_tree(course, modules) -> dict:
+    """Serialize the user-independent course header and module/lesson tree from loaded rows."""
+    from .serializers import CourseDetailSerializer, ModuleTreeSerializer
+
+    course.modules_count = len(modules)
+    course.lessons_count = sum(len(module.lessons.all()) for module in modules)
+    return {
+        "course": CourseDetailSerializer(course).data,
+        "modules": ModuleTreeSerializer(modules, many=True).data,
+    }
+
+
+def build_snapshot(version) -> CatalogueSnapshot:
+    courses, problems, lesson_course, lesson_problems = {}, {}, {}, {}
+    for course in Course.objects.prefetch_related("modules__lessons__problems"):
+        modules = list(course.modules.all())
+        lesson_ids = []
+        for module in modules:
+            for lesson in module.lessons.all():
+                lesson_ids.append(lesson.id)
+                lesson_course[lesson.id] = course.id
+                lesson_problems[lesson.id] = tuple(problem.id for problem in lesson.problems.all())
+                for problem in lesson.problems.all():
+                    problems[problem.id] = ProblemRecord(
+                        problem.id,
+                        lesson.id,
+                        course.id,
+                        problem.correct_answer,
+                        problem.canonical_answer,
+                        problem.checker,
+                        problem.points,
+                    )
+        courses[course.id] = CourseRecord(
+            course.id, course.is_published, course.content_version, tuple(lesson_ids), build_course_tree(course, modules)
+        )
+    return CatalogueSnapshot(version, courses, problems, lesson_course, lesson_problems)
+
+
+_snapshot = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _fresh_snapshot(now):
+    snapshot = _snapshot
+    if snapshot is not None and now - _checked_at < settings.CATALOGUE_CHECK_INTERVAL:
+        return snapshot
+    return None
+
+
+def _current(version, now):
+    """Return the installed snapshot if it matches ``version``, recording the check time."""
+    global _checked_at
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        _checked_at = now
+        return snapshot
+    return None
+
+
+def _install(version, now, wait=True):
+    """Build and install the snapshot for ``version``; ``wait=False`` returns None if another thread is building."""
+    global _snapshot, _checked_at
+    if not _lock.acquire(blocking=wait):
+        return None
+    try:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_snapshot(version)
+        _checked_at = now
+        return _snapshot
+    finally:
+        _lock.release()
+
+
+def get_catalogue() -> CatalogueSnapshot:
+    """Return the current snapshot, re-checking the DB version at most every ``CATALOGUE_CHECK_INTERVAL`` seconds."""
+    now = time.monotonic()
+    snapshot = _fresh_snapshot(now)
+    if snapshot is None:
+        # Always from the primary: the snapshot is shared with write paths such as grading.
+        stale = _snapshot
+        with primary_reads():
+            version = catalogue_version()
+            snapshot = _current(version, now) or _install(version, now, wait=stale is None) or stale
+    return snapshot
+
+
+async def aget_catalogue() -> CatalogueSnapshot:
+    now = time.monotonic()
+    snapshot = _fresh_snapshot(now)
+    if snapshot is None:
+        stale = _snapshot
+        with primary_reads():
+            version = await acatalogue_version()
+            snapshot = _current(version, now) or await sync_to_async(_install)(version, now, stale is None) or stale
+    return snapshot
+
+
+def invalidate_catalogue():
+    """Drop this process's snapshot; other processes notice via the version check."""
+    global _snapshot
+    _snapshot = None
+
+
+def overlay_course_tree(tree: dict, completion_map: dict) -> dict:
+    modules = []
+    total = completed = 0
+    for module in tree["modules"]:
+        lessons = []
+        for lesson in module["lessons"]:
+            done = completion_map.get(lesson["id"], False)
+            lessons.append({**lesson, "lesson_completed": done})
+            total += 1
+            completed += done
+        modules.append({**module, "lessons": lessons})
+
+    return {
+        "course": tree["course"],
+        "modules": modules,
+        "course_progress": int((completed / total) * 100) if total else 0,
+    }
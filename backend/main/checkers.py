@@ -0,0 +1,231 @@
+"""Per-problem answer checkers.
+
+``Problem.checker`` selects how a submission is graded. The default
+``canonical`` checker compares canonical strings in the request thread. The
+``symbolic`` checker is too expensive to run in-request, so it goes to a
+bounded pool of spawned worker processes (``main.sandbox``) with a per-check
+CPU budget and a memory cap. Verdicts are memoized per problem and submission
+as the sandbox reads it.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import sandbox
+from .answers import answers_match
+from .models import Problem
+
+logger = logging.getLogger(__name__)
+
+
+class GraderBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The grader is busy, retry shortly."
+    default_code = "grader_busy"
+
+
+class VerdictCache:
+    """Bounded LRU of ``(problem_id, submission) -> (canonical answer, verdict)``.
+
+    The stored canonical answer guards against serving a verdict computed
+    before the problem's correct answer was edited.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, problem_id, canonical_answer, submission):
+        key = (problem_id, submission)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] != canonical_answer:
+                return None
+            self._items.move_to_end(key)
+            return entry[1]
+
+    def set(self, problem_id, canonical_answer, submission, verdict):
+        key = (problem_id, submission)
+        with self._lock:
+            self._items[key] = (canonical_answer, verdict)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class GraderPool:
+    """Bounded process pool for heavy checks.
+
+    At most ``max_workers + max_pending`` checks are in flight; callers beyond
+    that wait ``acquire_timeout`` and then get ``GraderBusy``. A check that
+    outlives ``timeout`` seconds of wall time (e.g. stuck outside the CPU
+    alarm) is graded wrong and the pool is recycled, so one bad input never
+    holds a web worker. Checks caught in someone else's recycle are retried
+    once and then get ``GraderBusy``, never a verdict.
+    """
+
+    def __init__(
+        self, max_workers=2, max_pending=8, cpu_seconds=1.0, timeout=2.0, memory_limit_mb=256, acquire_timeout=0.5
+    ):
+        self.max_workers = max_workers
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else 0
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # Never fork a multi-threaded web worker.
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=sandbox.init_worker,
+                    initargs=(self.memory_limit_bytes,),
+                )
+            return self._executor
+
+    def _recycle(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # ProcessPoolExecutor cannot cancel a running task, so stop its workers directly.
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self):
+        """Start every worker now instead of on the first heavy check."""
+        executor = self._get_executor()
+        futures = [executor.submit(sandbox.warm) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result(timeout=30)
+
+    def run(self, func, *args, deadline=None):
+        """Run ``func(*args)`` in a worker; returns ``None`` only when this check overran ``timeout``.
+
+        ``deadline`` is a ``time.monotonic()`` value shared by a batch of checks;
+        running out of it raises ``GraderBusy``.
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise GraderBusy()
+        try:
+            for retry in (False, True):
+                timeout = self.timeout
+                if deadline is not None:
+                    timeout = min(timeout, deadline - time.monotonic())
+                    if timeout <= 0:
+                        raise GraderBusy()
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(func, *args)
+                except RuntimeError:
+                    # Shut down or broken by another thread between lookup and submit.
+                    self._recycle(executor)
+                    continue
+                try:
+                    return future.result(timeout=timeout)
+                except FutureTimeoutError:
+                    # Still queued behind other checks, or cut short by the batch deadline: not this check's fault.
+                    if future.cancel() or timeout < self.timeout:
+                        raise GraderBusy()
+                    logger.warning("Grader check exceeded %.1fs, recycling the pool", self.timeout)
+                    self._recycle(executor)
+                    return None
+                except BrokenProcessPool:
+                    # Another check's overrun (or a crashed worker) took the pool down with this check in it.
+                    logger.warning("Grader pool broke under a check, %s", "giving up" if retry else "retrying")
+                    self._recycle(executor)
+            raise GraderBusy()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+verdicts = VerdictCache(settings.GRADER_VERDICT_CACHE_SIZE)
+
+
+def get_grader_pool() -> GraderPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = GraderPool(
+                    max_workers=settings.GRADER_POOL_SIZE,
+                    max_pending=settings.GRADER_MAX_PENDING,
+                    cpu_seconds=settings.GRADER_CPU_SECONDS,
+                    timeout=settings.GRADER_TIMEOUT,
+                    memory_limit_mb=settings.GRADER_MEMORY_MB,
+                )
+                atexit.register(shutdown_grader_pool)
+    return _pool
+
+
+def warm_grader_pool() -> None:
+    """Start the grader workers if GRADER_POOL_WARM is set; called from the server entry points only."""
+    if settings.GRADER_POOL_WARM:
+        get_grader_pool().warm()
+
+
+def shutdown_grader_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def check_canonical(problem, canonical_answer, answer, deadline=None) -> bool:
+    return answers_match(canonical_answer, answer)
+
+
+def check_symbolic(problem, canonical_answer, answer, deadline=None) -> bool:
+    if answers_match(canonical_answer, answer):
+        return True
+
+    # The sandbox parses the submission as written, so the memo is keyed on that text:
+    # canonical forms can merge answers it reads differently ("1,000,000" and "1000000").
+    submission = str(answer).strip()
+    verdict = verdicts.get(problem.id, canonical_answer, submission)
+    if verdict is None:
+        pool = get_grader_pool()
+        verdict = pool.run(
+            sandbox.check_symbolic, problem.correct_answer, str(answer), pool.cpu_seconds, deadline=deadline
+        )
+        # Timeouts are graded wrong but not memoized: they may pass on a quieter worker.
+        if verdict is None:
+            return False
+        verdicts.set(problem.id, canonical_answer, submission, verdict)
+    return verdict
+
+
+CHECKERS = {
+    Problem.Checker.CANONICAL: check_canonical,
+    Problem.Checker.SYMBOLIC: check_symbolic,
+}
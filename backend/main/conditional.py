@@ -0,0 +1,63 @@
+"""Strong ETags for curriculum responses.
+
+Tags are derived from ``Course.content_version`` (plus whatever else shapes
+the body, such as the selected fields or the user's completed lessons), never
+from the rendered bytes, so a revalidation is answered from one version
+lookup without loading or serializing the body. A body must always carry the
+tag of the version it was built from, or an older one: a tag newer than its
+body would keep a stale copy alive through 304s.
+"""
+
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+
+def content_etag(*parts) -> str:
+    return '"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def course_etag(course_id, version, output_format="json") -> str:
+    return content_etag("course", course_id, version, output_format)
+
+
+def course_tree_etag(course_id, version, completed_lesson_ids, output_format="json") -> str:
+    return content_etag("course-tree", course_id, version, tuple(sorted(completed_lesson_ids)), output_format)
+
+
+def lesson_etag(request, lesson_id, version, output_format="json") -> str:
+    fields = (request.GET.get("fields", ""), request.GET.get("expand", ""))
+    return content_etag("lesson", lesson_id, version, fields, output_format)
+
+
+def encoded_etag(etag, encoding) -> str:
+    """Tag for ``etag``'s representation under a content coding; each coding is a distinct strong tag."""
+    return etag if encoding == "identity" else f'{etag[:-1]}-{encoding}"'
+
+
+def revalidating(request) -> bool:
+    """Whether the request carries a validator worth a version lookup."""
+    return "HTTP_IF_NONE_MATCH" in request.META
+
+
+def not_modified(request, *etags):
+    """A 304 response if ``If-None-Match`` matches any of ``etags`` (weak comparison), else ``None``."""
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header or request.method not in ("GET", "HEAD"):
+        return None
+    client_tags = {tag.removeprefix("W/") for tag in parse_etags(header)}
+    for etag in etags:
+        if etag in client_tags or "*" in client_tags:
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+    return None
+
+
+def tagged(response, etag, vary=()):
+    response["ETag"] = etag
+    if vary:
+        patch_vary_headers(response, vary)
+    return response
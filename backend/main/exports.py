@@ -0,0 +1,132 @@
+"""Streaming exports of attempts and enrollments."""
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Attempt, Enrollment
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+CONTENT_TYPES = {FORMAT_NDJSON: "application/x-ndjson", FORMAT_CSV: "text/csv"}
+
+
+class ExportSpec:
+    def __init__(self, model, columns, course_field):
+        self.model = model
+        self.headers = [header for header, _ in columns]
+        self.fields = [field for _, field in columns]
+        self.course_field = course_field
+
+
+EXPORTS = {
+    "attempts": ExportSpec(
+        Attempt,
+        [
+            ("id", "id"),
+            ("created_at", "created_at"),
+            ("user_id", "user_id"),
+            ("problem_id", "problem_id"),
+            ("lesson_id", "problem__lesson_id"),
+            ("course_id", "problem__lesson__module__course_id"),
+            ("is_correct", "is_correct"),
+            ("awarded_points", "awarded_points"),
+            ("submitted_answer", "submitted_answer"),
+        ],
+        course_field="problem__lesson__module__course_id",
+    ),
+    "enrollments": ExportSpec(
+        Enrollment,
+        [
+            ("id", "id"),
+            ("created_at", "created_at"),
+            ("user_id", "user_id"),
+            ("course_id", "course_id"),
+            ("progress_percent", "progress_percent"),
+        ],
+        course_field="course_id",
+    ),
+}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(spec: ExportSpec, course_id=None, user_id=None, start=None, end=None):
+    """Filtered queryset for an export; ``start``/``end`` are inclusive dates."""
+    queryset = spec.model.objects.all()
+    if course_id is not None:
+        queryset = queryset.filter(**{spec.course_field: course_id})
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    # Compare against day boundaries rather than created_at__date so the (created_at, id) index is usable.
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=_day_start(start))
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=_day_start(end + timedelta(days=1)))
+    return queryset.order_by("created_at", "id")
+
+
+def export_rows(kind, course_id=None, user_id=None, start=None, end=None, chunk_size=2000):
+    """Yield export rows as tuples in ``(created_at, id)`` order, one keyset page at a time."""
+    spec = EXPORTS[kind]
+    queryset = export_queryset(spec, course_id=course_id, user_id=user_id, start=start, end=end)
+    created_index, id_index = spec.fields.index("created_at"), spec.fields.index("id")
+
+    cursor = None
+    while True:
+        page = queryset
+        if cursor is not None:
+            page = page.filter(Q(created_at__gt=cursor[0]) | Q(created_at=cursor[0], id__gt=cursor[1]))
+        count = 0
+        for row in page.values_list(*spec.fields)[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            cursor = (row[created_index], row[id_index])
+            yield row
+        if count < chunk_size:
+            return
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for streaming ``csv.writer`` output."""
+
+    def write(self, value):
+        return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def render_ndjson(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, map(_json_value, row))), ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+# Spreadsheets run cells starting with these as formulas; student answers must stay text.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_value(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return _json_value(value)
+
+
+def render_csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+RENDERERS = {FORMAT_NDJSON: render_ndjson, FORMAT_CSV: render_csv}
+
+
+def stream_export(kind, output_format, **filters):
+    """Yield encoded chunks of an export in ``output_format``."""
+    return RENDERERS[output_format](EXPORTS[kind].headers, export_rows(kind, **filters))
@@ -0,0 +1,137 @@
+"""Sparse fieldsets: ``?fields=`` and ``?expand=`` for response serializers.
+
+``fields`` is a comma-separated list of field names; dotted names such as
+``course.title`` select fields of a nested object. ``expand`` names nested
+relations to render in full. When ``fields`` is given, a selected relation
+that is neither expanded nor dotted into is rendered as its primary key(s).
+Without ``fields`` serializers render everything, as before.
+
+Serializers using ``SparseFieldsMixin`` prune their fields to the selection
+and report the model columns they still need, so views can pass them to
+``.only()`` and skip annotations and prefetches nobody asked for.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def _split(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+class FieldSelection:
+    """The part of a parsed ``fields``/``expand`` query that applies to one serializer."""
+
+    def __init__(self, tree=None, expand=frozenset()):
+        # ``tree`` maps field names to a subtree dict (dotted selection) or None; None means "all fields".
+        self.tree = tree
+        self.expand = frozenset(expand)
+
+    @classmethod
+    def parse(cls, fields, expand):
+        tree = None
+        if _split(fields):
+            tree = {}
+            for path in _split(fields):
+                node = tree
+                *parents, leaf = path.split(".")
+                for part in parents:
+                    child = node.get(part)
+                    if not isinstance(child, dict):
+                        child = node[part] = {}
+                    node = child
+                node.setdefault(leaf, None)
+        return cls(tree, _split(expand))
+
+    def includes(self, name) -> bool:
+        return self.tree is None or name in self.tree
+
+    def expanded(self, name) -> bool:
+        return self.tree is None or isinstance(self.tree.get(name), dict) or name in self.expand
+
+    def child(self, name) -> "FieldSelection":
+        prefix = f"{name}."
+        subtree = self.tree.get(name) if self.tree is not None else None
+        return FieldSelection(
+            subtree if isinstance(subtree, dict) else None,
+            {path[len(prefix) :] for path in self.expand if path.startswith(prefix)},
+        )
+
+    def unknown_fields(self, serializer, prefix="") -> list:
+        """Dotted names in the selection that ``serializer`` (unpruned) cannot satisfy."""
+        fields = serializer.fields
+        names = set(self.tree or ()) | {path.split(".")[0] for path in self.expand}
+        unknown = []
+        for name in sorted(names):
+            field = fields.get(name)
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            child = self.child(name)
+            if field is None or (
+                (name in self.expand or child.tree or child.expand) and not isinstance(nested, serializers.BaseSerializer)
+            ):
+                unknown.append(prefix + name)
+            elif child.tree or child.expand:
+                unknown.extend(child.unknown_fields(nested, prefix=f"{prefix}{name}."))
+        return unknown
+
+
+def field_selection(request, serializer_class) -> FieldSelection | None:
+    """Parse and validate the request's ``fields``/``expand``; ``None`` when neither is given."""
+    fields, expand = request.GET.get("fields"), request.GET.get("expand")
+    if not fields and not expand:
+        return None
+    selection = FieldSelection.parse(fields, expand)
+    unknown = selection.unknown_fields(serializer_class())
+    if unknown:
+        raise ValidationError({"fields": f"Unknown or non-expandable fields: {', '.join(unknown)}."})
+    return selection
+
+
+class SparseFieldsMixin:
+    """Serializer mixin that prunes its fields to a ``FieldSelection`` passed as ``selection``."""
+
+    def __init__(self, *args, selection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.selection = selection
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        if selection is None:
+            return fields
+
+        pruned = {}
+        for name, field in fields.items():
+            if not selection.includes(name):
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if isinstance(nested, serializers.BaseSerializer):
+                if not selection.expanded(name):
+                    source = {"source": field.source} if field.source not in (None, name) else {}
+                    field = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **source)
+                elif isinstance(nested, SparseFieldsMixin):
+                    nested.selection = selection.child(name)
+            pruned[name] = field
+        return pruned
+
+    def model_columns(self, *extra) -> list:
+        """Concrete model fields the selected serializer fields read, plus the pk and ``extra``."""
+        opts = self.Meta.model._meta
+        columns = [opts.pk.name, *extra]
+        for field in self.fields.values():
+            try:
+                model_field = opts.get_field(field.source.split(".")[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and model_field.name not in columns:
+                columns.append(model_field.name)
+        return columns
+
+    def nested(self, name):
+        """The expanded nested serializer for ``name`` (unwrapping ``many``), or ``None``."""
+        field = self.fields.get(name)
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        return field if isinstance(field, serializers.BaseSerializer) else None
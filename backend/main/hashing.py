@@ -0,0 +1,86 @@
+"""Password hashing in a bounded pool, away from the request thread's CPU share.
+
+Login and registration spend nearly all their time in the password hasher.
+hashlib's PBKDF2 releases the GIL, so a small thread pool hashes in parallel
+while capping how many cores hashing can take at once: a login burst queues
+for the pool instead of starving every other request. At most
+``max_workers + max_pending`` hashes are in flight; callers beyond that wait
+``acquire_timeout`` and then get ``LoginBusy`` (429 with ``Retry-After``).
+"""
+
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class LoginBusy(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = "Too many sign-ins in progress, retry shortly."
+    default_code = "login_busy"
+    wait = 1  # Sent as Retry-After by DRF's exception handler.
+
+
+class HashingPool:
+    """Bounded thread pool for password hashing; see the module docstring."""
+
+    def __init__(self, max_workers=2, max_pending=8, acquire_timeout=0.1):
+        self.max_workers = max_workers
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+
+    def run(self, func, *args):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise LoginBusy()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool() -> HashingPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    max_workers=settings.HASHER_POOL_SIZE,
+                    max_pending=settings.HASHER_MAX_PENDING,
+                    acquire_timeout=settings.HASHER_ACQUIRE_TIMEOUT,
+                )
+                atexit.register(shutdown_hashing_pool)
+    return _pool
+
+
+def shutdown_hashing_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _verify(password, encoded):
+    outdated = []
+    return check_password(password, encoded, setter=outdated.append), bool(outdated)
+
+
+def verify_password(password, encoded) -> tuple:
+    """``(matches, must_update)``: whether ``encoded`` should be re-hashed with the preferred hasher."""
+    return get_hashing_pool().run(_verify, password, encoded)
+
+
+def hash_password(password) -> str:
+    return get_hashing_pool().run(make_password, password)
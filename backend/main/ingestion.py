@@ -0,0 +1,221 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_COMMIT = "commit"
+DURABILITY_BUFFERED = "buffered"
+
+
+class AttemptQueueFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many submissions in flight, retry shortly."
+    default_code = "attempt_queue_full"
+
+
+class AttemptWriteFailed(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The submission could not be stored, retry shortly."
+    default_code = "attempt_write_failed"
+
+
+class _Pending:
+    __slots__ = ("attempts", "done", "error", "claimed", "cancelled")
+
+    def __init__(self, attempts, wait):
+        self.attempts = attempts
+        self.done = threading.Event() if wait else None
+        self.error = None
+        self.claimed = False
+        self.cancelled = False
+
+
+class AttemptWriter:
+    """Buffers graded attempts and persists them from one dedicated writer thread."""
+
+    def __init__(
+        self,
+        store,
+        queue_size=10000,
+        batch_size=500,
+        flush_interval=0.05,
+        enqueue_timeout=0.5,
+        durability=DURABILITY_COMMIT,
+        commit_timeout=5.0,
+        retries=3,
+    ):
+        if durability not in (DURABILITY_COMMIT, DURABILITY_BUFFERED):
+            raise ValueError(f"Unknown attempt durability: {durability!r}")
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.durability = durability
+        self.commit_timeout = commit_timeout
+        self.retries = retries
+        self.failed_attempts = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._claim_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, attempts):
+        if self._stopping.is_set():
+            raise AttemptWriteFailed()
+
+        pending = _Pending(attempts, wait=self.durability == DURABILITY_COMMIT)
+        try:
+            self._queue.put(pending, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise AttemptQueueFull()
+        # stop() may have begun since the check above; the writer thread could exit without seeing this item.
+        if self._stopping.is_set() and self._withdraw(pending):
+            raise AttemptWriteFailed()
+
+        if pending.done is not None:
+            if not pending.done.wait(self.commit_timeout):
+                if self._withdraw(pending):
+                    raise AttemptWriteFailed()
+                # Already being written: answer like buffered durability, accepted without an id.
+                return
+            if pending.error is not None:
+                raise AttemptWriteFailed() from pending.error
+
+    def _withdraw(self, pending):
+        """Cancel ``pending`` unless the writer thread has already taken it; returns whether it was cancelled."""
+        with self._claim_lock:
+            if not pending.claimed:
+                pending.cancelled = True
+            return pending.cancelled
+
+    def stop(self, timeout=10.0):
+        """Stop accepting work, flush everything still queued and wait for the thread."""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+                elif self._stopping.is_set():
+                    break
+        finally:
+            connections.close_all()
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        size = len(first.attempts)
+        deadline = time.monotonic() + self.flush_interval
+        while size < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item.attempts)
+        return batch
+
+    def _flush(self, batch):
+        with self._claim_lock:
+            batch = [pending for pending in batch if not pending.cancelled]
+            for pending in batch:
+                pending.claimed = True
+
+        by_user = defaultdict(list)
+        for pending in batch:
+            for attempt in pending.attempts:
+                by_user[attempt.user_id].append(attempt)
+
+        failed = self._write(by_user)
+        for user_id, error in failed.items():
+            self.failed_attempts += len(by_user[user_id])
+            logger.error("Failed to persist %d attempts of user %s", len(by_user[user_id]), user_id, exc_info=error)
+        for pending in batch:
+            pending.error = next((failed[a.user_id] for a in pending.attempts if a.user_id in failed), None)
+            if pending.done is not None:
+                pending.done.set()
+
+    def _write(self, by_user):
+        """Store the batch in one transaction with a savepoint per user; returns ``{user_id: error}`` for failures."""
+        error = None
+        for attempt_number in range(self.retries):
+            failed = {}
+            try:
+                with transaction.atomic():
+                    for user_id, attempts in by_user.items():
+                        try:
+                            with transaction.atomic():
+                                self.store(user_id, attempts)
+                        except OperationalError:
+                            raise
+                        except Exception as exc:
+                            failed[user_id] = exc
+                return failed
+            except OperationalError as exc:
+                # Typically "database is locked" from a writer outside this process.
+                error = exc
+                time.sleep(0.05 * (attempt_number + 1))
+            except Exception as exc:
+                if len(by_user) == 1:
+                    return dict.fromkeys(by_user, exc)
+                failed = {}
+                for user_id, attempts in by_user.items():
+                    failed.update(self._write({user_id: attempts}))
+                return failed
+        return dict.fromkeys(by_user, error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_attempt_writer():
+    """Return the process-wide writer when write-behind ingestion is enabled, else ``None``."""
+    global _writer
+    if settings.ATTEMPT_INGESTION_MODE != "write_behind":
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from .services import store_attempts
+
+                _writer = AttemptWriter(
+                    store_attempts,
+                    queue_size=settings.ATTEMPT_QUEUE_SIZE,
+                    batch_size=settings.ATTEMPT_BATCH_SIZE,
+                    flush_interval=settings.ATTEMPT_FLUSH_INTERVAL,
+                    enqueue_timeout=settings.ATTEMPT_ENQUEUE_TIMEOUT,
+                    durability=settings.ATTEMPT_DURABILITY,
+                )
+                atexit.register(shutdown_attempt_writer)
+    return _writer
+
+
+def shutdown_attempt_writer():
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
@@ -0,0 +1,294 @@
+"""In-memory course and global leaderboards.
+
+``UserCoursePoints`` holds each user's first-time points per course and is
+the source of truth. Every process keeps the rankings in an indexable skip
+list ordered by (points desc, reached_at asc, user id), so top-K, rank lookup
+and "rank +/- N" windows are O(log n + k). A process builds the boards from
+the table on first use, applies its own writes after commit, and pulls rows
+changed by other processes at most every ``LEADERBOARD_SYNC_INTERVAL`` seconds.
+Only courses published in the catalogue snapshot count. Deleted rows or a
+change in which courses are published rebuild the boards; readers keep the
+current boards meanwhile.
+"""
+
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+
+from .catalogue import get_catalogue
+from .models import UserCoursePoints
+
+MAX_LEVELS = 24
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class RankIndex:
+    """Indexable skip list of unique, comparable keys with O(log n) rank and positional access."""
+
+    def __init__(self, seed=None):
+        self._head = _Node(None, MAX_LEVELS)
+        self._rng = random.Random(seed)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _chain(self, key):
+        chain = [None] * MAX_LEVELS
+        steps = [0] * MAX_LEVELS
+        node = self._head
+        position = 0
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+            steps[level] = position
+        return chain, steps
+
+    def insert(self, key):
+        chain, steps = self._chain(key)
+        levels = 1
+        while levels < MAX_LEVELS and self._rng.random() < 0.5:
+            levels += 1
+
+        node = _Node(key, levels)
+        position = steps[0] + 1
+        for level in range(levels):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            node.width[level] = prev.width[level] - (position - steps[level]) + 1
+            prev.width[level] = position - steps[level]
+        for level in range(levels, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = chain[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> int:
+        """Zero-based position of ``key``; raises ``KeyError`` if it is absent."""
+        chain, steps = self._chain(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return steps[0]
+
+    def slice(self, start, stop) -> list:
+        start, stop = max(start, 0), min(stop, self.size)
+        if start >= stop:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Board:
+    def __init__(self):
+        self.index = RankIndex()
+        self.keys = {}
+
+    def set(self, user_id, points, reached_at):
+        old = self.keys.pop(user_id, None)
+        if old is not None:
+            self.index.remove(old)
+        if points > 0:
+            key = (-points, reached_at, user_id)
+            self.keys[user_id] = key
+            self.index.insert(key)
+
+    def entries(self, start, stop):
+        return [
+            {"rank": rank, "user_id": key[2], "points": -key[0]}
+            for rank, key in enumerate(self.index.slice(start, stop), start=start + 1)
+        ]
+
+    def top(self, limit):
+        return self.entries(0, limit)
+
+    def around(self, user_id, distance):
+        """Return ``(rank, entries)`` for the user and ``distance`` neighbours each side."""
+        key = self.keys.get(user_id)
+        if key is None:
+            return None, []
+        position = self.index.rank(key)
+        return position + 1, self.entries(position - distance, position + distance + 1)
+
+
+class Leaderboards:
+    """Per-course boards plus a global board over each user's total points."""
+
+    def __init__(self, published=frozenset()):
+        self.courses = {}
+        self.global_board = Board()
+        self.user_courses = {}
+        self.published = published
+        self.watermark = None
+        # Rows in the table and the highest row id at the last build or sync: a count
+        # that falls short of ``row_count`` plus the newer rows means some were deleted.
+        self.row_count = 0
+        self.last_id = 0
+        self.synced_at = 0.0
+        self.lock = threading.RLock()
+
+    def board(self, course_id=None) -> Board:
+        if course_id is None:
+            return self.global_board
+        return self.courses.get(course_id) or Board()
+
+    def top(self, course_id, limit):
+        """Return ``(ranked users, entries)`` for the first ``limit`` places."""
+        with self.lock:
+            board = self.board(course_id)
+            return len(board.index), board.top(limit)
+
+    def around(self, course_id, user_id, distance):
+        """Return ``(ranked users, rank, entries)`` for the user's neighbourhood; rank is ``None`` if unranked."""
+        with self.lock:
+            board = self.board(course_id)
+            rank, entries = board.around(user_id, distance)
+            return len(board.index), rank, entries
+
+    def apply(self, user_id, course_id, points, reached_at):
+        if course_id not in self.published:
+            return
+        timestamp = reached_at.timestamp()
+        with self.lock:
+            course_board = self.courses.get(course_id)
+            if course_board is None:
+                course_board = self.courses[course_id] = Board()
+            course_board.set(user_id, points, timestamp)
+
+            totals = self.user_courses.setdefault(user_id, {})
+            totals[course_id] = (points, timestamp)
+            self.global_board.set(
+                user_id,
+                sum(value for value, _ in totals.values()),
+                max(reached for _, reached in totals.values()),
+            )
+
+    def load(self, rows):
+        with self.lock:
+            for row in rows:
+                self.apply(row["user_id"], row["course_id"], row["points"], row["reached_at"])
+                if self.watermark is None or row["updated_at"] > self.watermark:
+                    self.watermark = row["updated_at"]
+
+
+ROW_FIELDS = ("user_id", "course_id", "points", "reached_at", "updated_at")
+# Rows are re-read this far behind the watermark, so a transaction that commits
+# after a later one already advanced it is still picked up.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+_boards = None
+_boards_lock = threading.Lock()
+_sync_lock = threading.Lock()
+
+
+def published_course_ids() -> frozenset:
+    return frozenset(course.id for course in get_catalogue().courses.values() if course.is_published)
+
+
+def build_leaderboards() -> Leaderboards:
+    boards = Leaderboards(published_course_ids())
+
+    def published_rows():
+        # Count every row for the deletion check, but rank only published courses.
+        for row in UserCoursePoints.objects.values("id", *ROW_FIELDS).iterator(chunk_size=5000):
+            boards.row_count += 1
+            boards.last_id = max(boards.last_id, row["id"])
+            if row["course_id"] in boards.published:
+                yield row
+
+    boards.load(published_rows())
+    boards.synced_at = time.monotonic()
+    return boards
+
+
+def sync_leaderboards(boards: Leaderboards) -> Leaderboards:
+    """Apply rows changed since the last sync; rebuild if rows were deleted or publication changed."""
+    table = UserCoursePoints.objects.aggregate(
+        count=Count("id"), added=Count("id", filter=Q(id__gt=boards.last_id)), last_id=Max("id")
+    )
+    if table["count"] != boards.row_count + table["added"] or published_course_ids() != boards.published:
+        return build_leaderboards()
+
+    rows = UserCoursePoints.objects.filter(course_id__in=boards.published)
+    if boards.watermark is not None:
+        rows = rows.filter(updated_at__gte=boards.watermark - SYNC_OVERLAP)
+    boards.load(list(rows.values(*ROW_FIELDS)))
+    boards.row_count, boards.last_id = table["count"], table["last_id"] or 0
+    boards.synced_at = time.monotonic()
+    return boards
+
+
+def get_leaderboards() -> Leaderboards:
+    """Return this process's boards, syncing them at most every ``LEADERBOARD_SYNC_INTERVAL`` seconds.
+
+    One thread syncs outside ``_boards_lock`` while the others keep reading the
+    current boards; only a process without boards waits for the build.
+    """
+    global _boards
+    boards = _boards
+    if boards is not None and time.monotonic() - boards.synced_at < settings.LEADERBOARD_SYNC_INTERVAL:
+        return boards
+    if not _sync_lock.acquire(blocking=boards is None):
+        return boards
+    try:
+        boards = _boards
+        if boards is None:
+            boards = build_leaderboards()
+        elif time.monotonic() - boards.synced_at >= settings.LEADERBOARD_SYNC_INTERVAL:
+            boards = sync_leaderboards(boards)
+        with _boards_lock:
+            _boards = boards
+        return boards
+    finally:
+        _sync_lock.release()
+
+
+def publish_points(rows):
+    """Apply committed ``UserCoursePoints`` rows to this process's boards, if they are loaded."""
+    boards = _boards
+    if boards is None:
+        return
+    with boards.lock:
+        for row in rows:
+            boards.apply(row["user_id"], row["course_id"], row["points"], row["reached_at"])
+
+
+def reset_leaderboards():
+    global _boards
+    with _boards_lock:
+        _boards = None
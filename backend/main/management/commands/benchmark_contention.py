@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.benchmarks import CONTENTION_PROFILES, DATASETS, file_test_database, run_contention
+
+
+class Command(BaseCommand):
+    help = "Compare SQLite connection profiles under concurrent attempt submits and course tree reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", nargs="+", choices=sorted(CONTENTION_PROFILES), default=["baseline", "production"])
+        parser.add_argument("--writers", type=int, default=4, help="Threads submitting attempts")
+        parser.add_argument("--readers", type=int, default=4, help="Threads reading the course tree")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per profile")
+        parser.add_argument("--size", choices=sorted(DATASETS), default="small")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The contention benchmark compares SQLite profiles.")
+
+        with file_test_database():
+            results = run_contention(
+                profiles=options["profiles"],
+                writers=options["writers"],
+                readers=options["readers"],
+                duration=options["duration"],
+                size=options["size"],
+                seed=options["seed"],
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        header = f"{'endpoint':<18}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+        for profile, endpoints in results.items():
+            self.stdout.write(f"\n[{profile}]")
+            self.stdout.write(header)
+            for name, stats in endpoints.items():
+                self.stdout.write(
+                    f"{name:<18}{stats['per_second']:>9.1f}{stats['p50_ms']:>9.2f}"
+                    f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['errors']:>8}"
+                )
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from main.benchmarks import DATASETS, budget_violations, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API endpoint against generated datasets in a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", choices=sorted(DATASETS), default=["small", "medium", "large"])
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--endpoint", action="append", dest="endpoints", help="Only run this endpoint (repeatable)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(
+                sizes=options["sizes"],
+                iterations=options["iterations"],
+                endpoints=options["endpoints"],
+                seed=options["seed"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self._print_table(results)
+
+        violations = budget_violations(results)
+        if violations:
+            raise CommandError("Query budget exceeded:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("All endpoints within query budget."))
+
+    def _print_table(self, results):
+        header = f"{'endpoint':<22}{'queries':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>9}"
+        for size, endpoints in results.items():
+            self.stdout.write(f"\n[{size}]")
+            self.stdout.write(header)
+            for name, stats in endpoints.items():
+                self.stdout.write(
+                    f"{name:<22}{stats['queries_max']:>8}{stats['p50_ms']:>9.2f}"
+                    f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['bytes']:>9}"
+                )
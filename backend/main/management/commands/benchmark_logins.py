@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.benchmarks import DATASETS, file_test_database, run_login_throughput
+
+
+class Command(BaseCommand):
+    help = "Measure logins per second per core under a login burst, and health latency alongside it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8, help="Threads posting logins")
+        parser.add_argument("--pool-size", type=int, help="Hashing threads (default: HASHER_POOL_SIZE)")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds to run")
+        parser.add_argument("--size", choices=sorted(DATASETS), default="small")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The login benchmark runs against a throwaway SQLite database.")
+
+        with file_test_database():
+            results = run_login_throughput(
+                clients=options["clients"],
+                pool_size=options["pool_size"],
+                duration=options["duration"],
+                size=options["size"],
+                seed=options["seed"],
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        login = results["auth-login"]
+        self.stdout.write(
+            f"logins/s {login['per_second']:.1f} on {login['cores']} cores "
+            f"({login['per_core']:.1f}/core, {login['pool_size']} hashing threads)"
+        )
+        header = f"{'endpoint':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'shed':>7}{'errors':>8}"
+        self.stdout.write(header)
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<12}{stats['per_second']:>9.1f}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+                f"{stats['p99_ms']:>9.2f}{stats['shed']:>7}{stats['errors']:>8}"
+            )
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from main.exports import EXPORTS, RENDERERS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream attempts or enrollments as NDJSON or CSV without loading them into memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--format", dest="output_format", choices=sorted(RENDERERS), default="ndjson")
+        parser.add_argument("--course", type=int, dest="course_id")
+        parser.add_argument("--user", type=int, dest="user_id")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day to include (YYYY-MM-DD)")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last day to include (YYYY-MM-DD)")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--output", help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        chunks = stream_export(
+            options["kind"],
+            options["output_format"],
+            course_id=options["course_id"],
+            user_id=options["user_id"],
+            start=options["start"],
+            end=options["end"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as handle:
+                handle.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Course, RenderedPayload
+from main.rendering import render_course_payloads
+
+
+class Command(BaseCommand):
+    help = "Pre-render the lesson and course tree payloads of published courses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, action="append", dest="courses", help="Only this course (repeatable)")
+        parser.add_argument("--force", action="store_true", help="Drop stored payloads and render them again")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options["courses"]:
+            courses = courses.filter(pk__in=options["courses"])
+        if options["force"]:
+            RenderedPayload.objects.filter(course__in=courses).delete()
+        rendered = render_course_payloads(courses)
+        self.stdout.write(self.style.SUCCESS(f"Rendered payloads for {rendered} courses."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.analytics import reset_rollups, rollup_attempts
+
+
+class Command(BaseCommand):
+    help = "Fold attempts newer than the last watermark into the daily problem and lesson rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--limit", type=int, help="Stop after this many attempts")
+        parser.add_argument("--rebuild", action="store_true", help="Drop the rollups and reprocess every attempt")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            reset_rollups()
+        processed = rollup_attempts(batch_size=options["batch_size"], limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} attempts."))
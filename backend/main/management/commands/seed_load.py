@@ -0,0 +1,230 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from main.catalogue import invalidate_catalogue
+from main.leaderboard import reset_leaderboards
+from main.models import Attempt, Course, Enrollment, Lesson, Module, Problem, UserCoursePoints, UserLessonProgress
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic, production-sized synthetic data for profiling and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=10)
+        parser.add_argument("--modules-per-course", type=int, default=5)
+        parser.add_argument("--lessons-per-module", type=int, default=4)
+        parser.add_argument("--problems-per-lesson", type=int, default=5)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--attempts", type=int, default=50000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--days", type=int, default=90, help="Spread attempt timestamps over this many days")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="load", help="Slug/username prefix marking generated rows")
+        parser.add_argument("--flush", action="store_true", help="Delete previously generated rows with this prefix first")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        prefix = options["prefix"]
+
+        if options["flush"]:
+            self._flush(prefix)
+        elif Course.objects.filter(slug__startswith=f"{prefix}-course-").exists():
+            raise CommandError(f"Data with prefix '{prefix}' already exists; pass --flush to regenerate it.")
+
+        courses = self._create_curriculum(prefix, options)
+        # Bulk inserts send no signals, so drop this process's catalogue snapshot by hand.
+        invalidate_catalogue()
+        self.stdout.write(f"Created {len(courses)} courses.")
+
+        attempts = self._create_activity(prefix, courses, options)
+        reset_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f"Load data seeded: {options['users']} users, {attempts} attempts."))
+
+    def _flush(self, prefix):
+        with transaction.atomic():
+            User.objects.filter(username__startswith=f"{prefix}_user_").delete()
+            Course.objects.filter(slug__startswith=f"{prefix}-course-").delete()
+
+    def _create_curriculum(self, prefix, options):
+        """Create courses bottom-up with bulk inserts; returns per-course lesson/problem layouts."""
+        with transaction.atomic():
+            courses = Course.objects.bulk_create(
+                Course(
+                    title=f"Load course {idx:03d}",
+                    slug=f"{prefix}-course-{idx:03d}",
+                    description="Synthetic course for load testing.",
+                )
+                for idx in range(options["courses"])
+            )
+            modules = Module.objects.bulk_create(
+                Module(course=course, title=f"Module {order}", order=order)
+                for course in courses
+                for order in range(1, options["modules_per_course"] + 1)
+            )
+            lessons = Lesson.objects.bulk_create(
+                Lesson(module=module, title=f"Lesson {order}", order=order, content="Synthetic lesson content.")
+                for module in modules
+                for order in range(1, options["lessons_per_module"] + 1)
+            )
+            problems = Problem.objects.bulk_create(
+                (
+                    Problem(
+                        lesson=lesson,
+                        order=order,
+                        prompt=f"{order} + {lesson.order} = ?",
+                        correct_answer=str(order + lesson.order),
+                        canonical_answer=str(order + lesson.order),
+                        points=self.rng.choice((1, 1, 1, 2, 3)),
+                    )
+                    for lesson in lessons
+                    for order in range(1, options["problems_per_lesson"] + 1)
+                ),
+                batch_size=self.batch_size,
+            )
+
+        problems_by_lesson = {}
+        for problem in problems:
+            problems_by_lesson.setdefault(problem.lesson_id, []).append((problem.id, problem.points, problem.correct_answer))
+
+        layout = []
+        lessons_by_course = {}
+        module_course = {module.id: module.course_id for module in modules}
+        for lesson in lessons:
+            lessons_by_course.setdefault(module_course[lesson.module_id], []).append(lesson.id)
+        for course in courses:
+            course_lessons = lessons_by_course.get(course.id, [])
+            layout.append(
+                {
+                    "id": course.id,
+                    "lessons": [(lesson_id, problems_by_lesson.get(lesson_id, [])) for lesson_id in course_lessons],
+                    # Per-course difficulty: probability a single try is correct.
+                    "skill": self.rng.uniform(0.35, 0.8),
+                }
+            )
+        return layout
+
+    def _create_activity(self, prefix, courses, options):
+        """Stream users, enrollments, attempts and progress rows to the database in bounded batches."""
+        rng = self.rng
+        user_count = options["users"]
+        attempt_budget = options["attempts"]
+        if not courses or user_count == 0:
+            return 0
+
+        # Zipf-like popularity so a few courses hold most of the enrollments.
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(len(courses))]
+        password = make_password("loadtest12345")
+        start = timezone.now() - timedelta(days=options["days"])
+        span_seconds = self.span_seconds = options["days"] * 86400
+
+        buffers = {"attempts": [], "enrollments": [], "progress": [], "points": []}
+        created_attempts = 0
+
+        for chunk_start in range(0, user_count, self.batch_size):
+            chunk = range(chunk_start, min(chunk_start + self.batch_size, user_count))
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    User(username=f"{prefix}_user_{idx:07d}", email=f"{prefix}_user_{idx:07d}@example.com", password=password)
+                    for idx in chunk
+                )
+                for index, user in zip(chunk, users):
+                    remaining = attempt_budget - created_attempts
+                    # Budgets follow the remaining average so unused attempts roll over to later users;
+                    # Pareto(1.5) has mean 3, so most students are light users and a few are very active.
+                    mean_budget = remaining / (user_count - index)
+                    budget = min(int(rng.paretovariate(1.5) * mean_budget / 3 + 0.5), remaining)
+                    enrolled = set()
+                    for _ in range(rng.choice((1, 1, 1, 2, 2, 3))):
+                        enrolled.add(rng.choices(range(len(courses)), weights)[0])
+
+                    clock = rng.uniform(0, span_seconds)
+                    for course_index in sorted(enrolled):
+                        used, clock = self._walk_course(user.id, courses[course_index], budget, clock, start, buffers)
+                        budget -= used
+                        created_attempts += used
+                    self._flush_buffers(buffers, force=False)
+                self._flush_buffers(buffers, force=True)
+            self.stdout.write(f"  users {chunk.stop}/{user_count}, attempts {created_attempts}")
+
+        return created_attempts
+
+    def _walk_course(self, user_id, course, budget, clock, start, buffers):
+        """Simulate one student working through a course until they give up or run out of budget."""
+        rng = self.rng
+        used = 0
+        completed_lessons = 0
+        earned = 0
+        enrolled_at = start + timedelta(seconds=min(clock, self.span_seconds))
+        for lesson_id, problems in course["lessons"]:
+            if used >= budget or not problems:
+                break
+            solved = 0
+            for problem_id, points, correct_answer in problems:
+                if used >= budget:
+                    break
+                while used < budget:
+                    clock += rng.expovariate(1 / 90)
+                    is_correct = rng.random() < course["skill"]
+                    buffers["attempts"].append(
+                        Attempt(
+                            user_id=user_id,
+                            problem_id=problem_id,
+                            submitted_answer=correct_answer if is_correct else str(rng.randint(0, 99)),
+                            is_correct=is_correct,
+                            awarded_points=points if is_correct else 0,
+                            created_at=start + timedelta(seconds=min(clock, self.span_seconds)),
+                        )
+                    )
+                    used += 1
+                    if is_correct:
+                        solved += 1
+                        earned += points
+                        break
+            if solved:
+                done = solved == len(problems)
+                completed_lessons += done
+                buffers["progress"].append(
+                    UserLessonProgress(user_id=user_id, lesson_id=lesson_id, solved_count=solved, completed=done)
+                )
+            if rng.random() < 0.15:
+                break
+
+        if earned:
+            buffers["points"].append(
+                UserCoursePoints(
+                    user_id=user_id,
+                    course_id=course["id"],
+                    points=earned,
+                    reached_at=start + timedelta(seconds=min(clock, self.span_seconds)),
+                )
+            )
+        total_lessons = len(course["lessons"])
+        buffers["enrollments"].append(
+            Enrollment(
+                user_id=user_id,
+                course_id=course["id"],
+                progress_percent=int((completed_lessons / total_lessons) * 100) if total_lessons else 0,
+                created_at=enrolled_at,
+            )
+        )
+        return used, clock
+
+    def _flush_buffers(self, buffers, force):
+        models = {
+            "attempts": Attempt,
+            "enrollments": Enrollment,
+            "progress": UserLessonProgress,
+            "points": UserCoursePoints,
+        }
+        for name, model in models.items():
+            rows = buffers[name]
+            if rows and (force or len(rows) >= self.batch_size):
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+                buffers[name] = []
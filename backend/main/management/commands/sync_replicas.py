@@ -0,0 +1,18 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from main.replicas import sync_replicas
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary database into the configured SQLite read replicas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="Replica aliases to sync (default: all)")
+
+    def handle(self, *args, **options):
+        try:
+            synced = sync_replicas(options["aliases"] or None)
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Synced {len(synced)} replicas."))
@@ -0,0 +1,145 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][idx] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [
+                (labels, dict(series, counts=list(series["counts"])))
+                for labels, series in sorted(self._series.items(), key=lambda item: item[0])
+            ]
+        for labels, series in series_items:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = f"{label_text}," if label_text else ""
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Total request handling time.", ("route", "method", "status"), DURATION_BUCKETS
+)
+VIEW_DURATION = Histogram("http_view_duration_seconds", "Time spent in the view.", ("route", "method"), DURATION_BUCKETS)
+RENDER_DURATION = Histogram(
+    "http_render_duration_seconds", "Time spent serializing and rendering the response.", ("route", "method"), DURATION_BUCKETS
+)
+DB_DURATION = Histogram("http_db_duration_seconds", "Database time per request.", ("route", "method"), DURATION_BUCKETS)
+DB_QUERIES = Histogram("http_db_queries", "Database queries per request.", ("route", "method"), QUERY_BUCKETS)
+RESPONSE_BYTES = Histogram("http_response_bytes", "Response body size.", ("route", "method"), SIZE_BUCKETS)
+SPAN_DURATION = Histogram("app_span_duration_seconds", "Named service timing spans.", ("span",), DURATION_BUCKETS)
+
+REGISTRY = (REQUEST_DURATION, VIEW_DURATION, RENDER_DURATION, DB_DURATION, DB_QUERIES, RESPONSE_BYTES, SPAN_DURATION)
+
+
+class RequestTimings:
+    """Per-request accumulator filled by the middleware, DB wrapper and spans."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.view_started = None
+        self.view_seconds = 0.0
+        self.render_started = None
+        self.spans = {}
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection ``execute_wrapper`` adding each query to the current request's timings.
+
+    Installed on every connection as it opens, in whichever thread opens it:
+    under ASGI the ORM runs on ``sync_to_async`` threads, which inherit the
+    request's context but not wrappers set up on the event loop thread.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_DURATION.observe((name,), elapsed)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_span(name, elapsed)
+
+
+def timed(name):
+    """Decorator recording every call of the wrapped function as a named span."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.reset()
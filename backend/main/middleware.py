@@ -0,0 +1,119 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import (
+    DB_DURATION,
+    DB_QUERIES,
+    RENDER_DURATION,
+    REQUEST_DURATION,
+    RESPONSE_BYTES,
+    VIEW_DURATION,
+    RequestTimings,
+    current_timings,
+)
+
+
+class RequestMetricsMiddleware:
+    """Record DB, view and render timings per request.
+
+    Timings are emitted as a ``Server-Timing`` header and aggregated into the
+    per-route histograms served by ``MetricsView``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Async hooks, so the handler does not adapt them with sync_to_async.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        self._finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        # Queries are counted by ``metrics.record_query`` on whichever thread runs them.
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        self._finish(request, response, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started()
+
+    def process_template_response(self, request, response):
+        self._render_started()
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started()
+
+    async def aprocess_template_response(self, request, response):
+        self._render_started()
+        return response
+
+    @staticmethod
+    def _view_started():
+        timings = current_timings.get()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    @staticmethod
+    def _render_started():
+        timings = current_timings.get()
+        if timings is None:
+            return
+        now = time.perf_counter()
+        if timings.view_started is not None:
+            timings.view_seconds = now - timings.view_started
+        timings.render_started = now
+
+    def _finish(self, request, response, timings):
+        now = time.perf_counter()
+        total = now - timings.started
+        if timings.render_started is not None:
+            render = now - timings.render_started
+        else:
+            render = 0.0
+            if timings.view_started is not None:
+                timings.view_seconds = now - timings.view_started
+
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        labels = (route, request.method)
+        REQUEST_DURATION.observe((route, request.method, str(response.status_code)), total)
+        VIEW_DURATION.observe(labels, timings.view_seconds)
+        RENDER_DURATION.observe(labels, render)
+        DB_DURATION.observe(labels, timings.db_seconds)
+        DB_QUERIES.observe(labels, timings.db_queries)
+        if not response.streaming:
+            RESPONSE_BYTES.observe(labels, len(response.content))
+
+        entries = [
+            f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.db_queries} queries"',
+            f"view;dur={timings.view_seconds * 1000:.2f}",
+            f"render;dur={render * 1000:.2f}",
+        ]
+        entries.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.spans.items())
+        entries.append(f"total;dur={total * 1000:.2f}")
+        response["Server-Timing"] = ", ".join(entries)
@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_lesson_progress(apps, schema_editor):
+    Attempt = apps.get_model("main", "Attempt")
+    Problem = apps.get_model("main", "Problem")
+    UserLessonProgress = apps.get_model("main", "UserLessonProgress")
+
+    totals = dict(Problem.objects.values("lesson_id").annotate(total=Count("id")).values_list("lesson_id", "total"))
+    solved_rows = (
+        Attempt.objects.filter(is_correct=True)
+        .values("user_id", "problem__lesson_id")
+        .annotate(solved=Count("problem", distinct=True))
+        .order_by()
+    )
+
+    batch = []
+    for row in solved_rows.iterator():
+        lesson_id = row["problem__lesson_id"]
+        total = totals.get(lesson_id, 0)
+        batch.append(
+            UserLessonProgress(
+                user_id=row["user_id"],
+                lesson_id=lesson_id,
+                solved_count=row["solved"],
+                completed=total > 0 and row["solved"] >= total,
+            )
+        )
+        if len(batch) >= 1000:
+            UserLessonProgress.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        UserLessonProgress.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserLessonProgress",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("solved_count", models.PositiveIntegerField(default=0)),
+                ("completed", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("lesson", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="user_progress", to="main.lesson")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lesson_progress",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="userlessonprogress",
+            constraint=models.UniqueConstraint(fields=("user", "lesson"), name="unique_progress_per_user_lesson"),
+        ),
+        migrations.RunPython(backfill_lesson_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+import re
+from fractions import Fraction
+
+from django.db import migrations, models
+
+# A frozen copy of main.answers.canonicalize as this migration shipped it, so later
+# changes to the answer engine do not change what the migration does.
+_SET_BRACKETS = {"{": "}"}
+_TUPLE_BRACKETS = {"(": ")", "[": "]"}
+_ASSIGNMENT = re.compile(r"^([a-z])\s*=\s*")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+_THOUSANDS = re.compile(r"^[+-]?[1-9]\d{0,2}(?:(?:,\d{3}){2,}(?:\.\d+)?|(?:,\d{3})+\.\d+)$")
+_SPACES = re.compile(r"\s+")
+_SET_SEPARATOR = re.compile(r"\s*;\s*|,\s+|,(?=[a-z]\s*=)")
+_NUMBER = re.compile(r"^[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:/[+-]?(?:\d+(?:\.\d*)?|\.\d+))?$")
+
+
+def _canonical_number(text):
+    if not _NUMBER.match(text):
+        return None
+    numerator, _, denominator = text.partition("/")
+    value = Fraction(numerator)
+    if denominator:
+        divisor = Fraction(denominator)
+        if not divisor:
+            return None
+        value /= divisor
+    return str(value)
+
+
+def _canonical_value(text):
+    text = text.strip()
+    compact = _SPACES.sub("", text)
+    if _THOUSANDS.match(compact):
+        compact = compact.replace(",", "")
+    number = _canonical_number(_DECIMAL_COMMA.sub(".", compact))
+    if number is not None:
+        return number
+    return _DECIMAL_COMMA.sub(".", _SPACES.sub(" ", text))
+
+
+def _bracketed(text, brackets):
+    return len(text) > 1 and brackets.get(text[0]) == text[-1]
+
+
+def _split_items(text, bracketed):
+    parts = _SET_SEPARATOR.split(text)
+    if len(parts) == 1 and (bracketed or (text.count(",") > 1 and not _THOUSANDS.match(_SPACES.sub("", text)))):
+        parts = text.split(",")
+    return [part for part in parts if part.strip()]
+
+
+def _canonical_list(parts, unordered):
+    assignments = [_ASSIGNMENT.match(part.strip()) for part in parts]
+    variables = {match.group(1) for match in assignments if match}
+    if len(variables) > 1:
+        items = {
+            f"{match.group(1)}={_canonical_value(part.strip()[match.end():])}" if match else _canonical_value(part)
+            for part, match in zip(parts, assignments)
+        }
+        return ";".join(sorted(items))
+
+    items = [_canonical_value(part.strip()[match.end():] if match else part) for part, match in zip(parts, assignments)]
+    if unordered or variables:
+        return "{" + ";".join(sorted(set(items))) + "}"
+    return ";".join(items)
+
+
+def canonicalize(value):
+    text = str(value).strip().lower()
+    if _bracketed(text, _TUPLE_BRACKETS):
+        parts = _split_items(text[1:-1], bracketed=True)
+        if len(parts) > 1:
+            return text[0] + ",".join(_canonical_value(part) for part in parts) + text[-1]
+
+    braced = _bracketed(text, _SET_BRACKETS)
+    parts = _split_items(text[1:-1] if braced else text, braced)
+    if len(parts) > 1:
+        return _canonical_list(parts, braced)
+    return _canonical_value(_ASSIGNMENT.sub("", (parts[0] if parts else text).strip(), count=1))
+
+
+def backfill_canonical_answers(apps, schema_editor):
+    Problem = apps.get_model("main", "Problem")
+
+    batch = []
+    for problem in Problem.objects.only("id", "correct_answer").iterator():
+        problem.canonical_answer = canonicalize(problem.correct_answer)
+        batch.append(problem)
+        if len(batch) >= 1000:
+            Problem.objects.bulk_update(batch, ["canonical_answer"])
+            batch = []
+    if batch:
+        Problem.objects.bulk_update(batch, ["canonical_answer"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0002_userlessonprogress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="canonical_answer",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_canonical_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0003_problem_canonical_answer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="checker",
+            field=models.CharField(
+                choices=[("canonical", "Canonical answer"), ("symbolic", "Symbolic expression")],
+                default="canonical",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def backfill_course_points(apps, schema_editor):
+    Attempt = apps.get_model("main", "Attempt")
+    UserCoursePoints = apps.get_model("main", "UserCoursePoints")
+
+    # First correct attempt per (user, problem); later repeats earn nothing.
+    first_solves = (
+        Attempt.objects.filter(is_correct=True)
+        .values("user_id", "problem_id", "problem__points", "problem__lesson__module__course_id")
+        .annotate(solved_at=Min("created_at"))
+        .order_by("user_id")
+    )
+
+    totals = {}
+    for row in first_solves.iterator():
+        key = (row["user_id"], row["problem__lesson__module__course_id"])
+        points, reached_at = totals.get(key, (0, row["solved_at"]))
+        totals[key] = (points + row["problem__points"], max(reached_at, row["solved_at"]))
+
+    batch = []
+    for (user_id, course_id), (points, reached_at) in totals.items():
+        batch.append(UserCoursePoints(user_id=user_id, course_id=course_id, points=points, reached_at=reached_at))
+        if len(batch) >= 1000:
+            UserCoursePoints.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        UserCoursePoints.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0004_problem_checker"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserCoursePoints",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("points", models.PositiveIntegerField(default=0)),
+                ("reached_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+                ("course", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="user_points", to="main.course")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="course_points",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="usercoursepoints",
+            constraint=models.UniqueConstraint(fields=("user", "course"), name="unique_points_per_user_course"),
+        ),
+        migrations.RunPython(backfill_course_points, migrations.RunPython.noop),
+    ]
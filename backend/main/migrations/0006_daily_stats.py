@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0005_usercoursepoints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_attempt_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LessonDailyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("correct_attempts", models.PositiveIntegerField(default=0)),
+                ("unique_solvers", models.PositiveIntegerField(default=0)),
+                ("solve_histogram", models.JSONField(default=dict)),
+                ("median_attempts_to_solve", models.FloatField(null=True)),
+                ("lesson", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="daily_stats", to="main.lesson")),
+            ],
+            options={
+                "ordering": ["lesson", "day"],
+                "constraints": [models.UniqueConstraint(fields=("lesson", "day"), name="unique_lesson_stats_per_day")],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProblemDailyStats",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("correct_attempts", models.PositiveIntegerField(default=0)),
+                ("unique_solvers", models.PositiveIntegerField(default=0)),
+                ("solve_histogram", models.JSONField(default=dict)),
+                ("median_attempts_to_solve", models.FloatField(null=True)),
+                ("problem", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="daily_stats", to="main.problem")),
+            ],
+            options={
+                "ordering": ["problem", "day"],
+                "constraints": [models.UniqueConstraint(fields=("problem", "day"), name="unique_problem_stats_per_day")],
+            },
+        ),
+    ]
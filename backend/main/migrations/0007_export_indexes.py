@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0006_daily_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["created_at", "id"], name="attempt_created_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="enrollment",
+            index=models.Index(fields=["created_at", "id"], name="enrollment_created_id_idx"),
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0007_export_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["user", "-created_at", "id"], name="attempt_usr_cr_id_idx"),
+        ),
+    ]
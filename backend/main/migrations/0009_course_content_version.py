@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0008_attempt_history_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="content_version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main", "0009_course_content_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RenderedPayload",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("content_version", models.PositiveIntegerField()),
+                ("body", models.BinaryField()),
+                ("gzip", models.BinaryField()),
+                ("brotli", models.BinaryField(null=True)),
+                ("rendered_at", models.DateTimeField(auto_now=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="rendered_payloads", to="main.course"
+                    ),
+                ),
+                (
+                    "lesson",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rendered_payloads",
+                        to="main.lesson",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("lesson__isnull", True)), fields=("course",), name="unique_tree_payload"
+                    ),
+                    models.UniqueConstraint(fields=("lesson",), name="unique_lesson_payload"),
+                ],
+            },
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 from django.utils import timezone
 from django.utils.text import slugify
 
+from .answers import canonicalize
+
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(default=timezone.now, editable=False)
@@ -19,6 +21,8 @@ class Course(TimeStampedModel):
     description = models.TextField(blank=True)
     cover_image = models.URLField(blank=True)
     is_published = models.BooleanField(default=True)
+    # Bumped whenever the course or anything in its module/lesson/problem subtree changes.
+    content_version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["title"]
@@ -32,6 +36,13 @@ class Course(TimeStampedModel):
                 counter += 1
                 slug = f"{base_slug}-{counter}"
             self.slug = slug
+        if not self._state.adding and not kwargs.get("force_insert"):
+            # content_version only moves in the database (services.touch_course); writing the
+            # in-memory value back would undo bumps made since this instance was loaded.
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs["update_fields"] = [name for name in update_fields if name != "content_version"]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -75,10 +86,16 @@ class Lesson(models.Model):
 
 
 class Problem(models.Model):
+    class Checker(models.TextChoices):
+        CANONICAL = "canonical", "Canonical answer"
+        SYMBOLIC = "symbolic", "Symbolic expression"
+
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="problems")
     order = models.PositiveIntegerField(default=1)
     prompt = models.TextField()
     correct_answer = models.CharField(max_length=255)
+    canonical_answer = models.CharField(max_length=255, blank=True, editable=False)
+    checker = models.CharField(max_length=20, choices=Checker.choices, default=Checker.CANONICAL)
     explanation = models.TextField(blank=True)
     points = models.PositiveSmallIntegerField(default=1)
 
@@ -88,6 +105,13 @@ class Problem(models.Model):
             models.UniqueConstraint(fields=["lesson", "order"], name="unique_problem_order_per_lesson"),
         ]
 
+    def save(self, *args, **kwargs):
+        self.canonical_answer = canonicalize(self.correct_answer)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "correct_answer" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "canonical_answer"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Problem {self.id} ({self.lesson.title})"
 
@@ -104,6 +128,9 @@ class Enrollment(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["user", "course"], name="unique_enrollment_per_user_course"),
         ]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="enrollment_created_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.course.title}"
@@ -121,7 +148,136 @@ class Attempt(models.Model):
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["user", "problem", "-created_at"], name="attempt_usr_prob_cr_idx"),
+            models.Index(fields=["user", "-created_at", "id"], name="attempt_usr_cr_id_idx"),
+            models.Index(fields=["created_at", "id"], name="attempt_created_id_idx"),
         ]
 
     def __str__(self):
         return f"{self.user.username} / problem {self.problem_id}"
+
+
+class UserLessonProgress(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="lesson_progress")
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="user_progress")
+    solved_count = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "lesson"], name="unique_progress_per_user_lesson"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} / lesson {self.lesson_id}: {self.solved_count}"
+
+
+class UserCoursePoints(models.Model):
+    """Points a user earned in a course, counting each problem's first correct answer once."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="course_points")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="user_points")
+    points = models.PositiveIntegerField(default=0)
+    reached_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "course"], name="unique_points_per_user_course"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} / course {self.course_id}: {self.points}"
+
+
+class ProblemDailyStats(models.Model):
+    """Per-problem, per-day attempt rollup maintained by ``rollup_analytics``.
+
+    ``unique_solvers`` counts users whose first correct answer fell on ``day``;
+    ``solve_histogram`` maps attempts-to-solve to solver counts so days and
+    batches can be merged without re-reading attempts.
+    """
+
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)
+    correct_attempts = models.PositiveIntegerField(default=0)
+    unique_solvers = models.PositiveIntegerField(default=0)
+    solve_histogram = models.JSONField(default=dict)
+    median_attempts_to_solve = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ["problem", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["problem", "day"], name="unique_problem_stats_per_day"),
+        ]
+
+    def __str__(self):
+        return f"Problem {self.problem_id} on {self.day}"
+
+
+class LessonDailyStats(models.Model):
+    """Per-lesson, per-day rollup; a solver is a user who completed every problem in the lesson that day."""
+
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    attempts = models.PositiveIntegerField(default=0)
+    correct_attempts = models.PositiveIntegerField(default=0)
+    unique_solvers = models.PositiveIntegerField(default=0)
+    solve_histogram = models.JSONField(default=dict)
+    median_attempts_to_solve = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ["lesson", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["lesson", "day"], name="unique_lesson_stats_per_day"),
+        ]
+
+    def __str__(self):
+        return f"Lesson {self.lesson_id} on {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """Highest ``Attempt.id`` already folded into a rollup."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_attempt_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_attempt_id}"
+
+
+class RenderedPayload(models.Model):
+    """Pre-rendered public JSON, with compressed variants, for a lesson or (``lesson`` null) a course tree."""
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="rendered_payloads")
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name="rendered_payloads")
+    content_version = models.PositiveIntegerField()
+    body = models.BinaryField()
+    gzip = models.BinaryField()
+    brotli = models.BinaryField(null=True)
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["course"], condition=models.Q(lesson__isnull=True), name="unique_tree_payload"),
+            models.UniqueConstraint(fields=["lesson"], name="unique_lesson_payload"),
+        ]
+
+    def __str__(self):
+        target = f"lesson {self.lesson_id}" if self.lesson_id else f"course {self.course_id} tree"
+        return f"{target} v{self.content_version}"
+
+
+class UserTokenVersion(models.Model):
+    """Version embedded in a user's access tokens; bumping it revokes every token issued before.
+
+    Users without a row are at version 1.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="token_version")
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.user_id} v{self.version}"
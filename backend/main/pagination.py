@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination.
+
+Pages are selected with a ``WHERE`` on the last row's ordering values rather
+than ``OFFSET``, so with a matching index page N costs the same as page 1.
+The cursor is an opaque base64 token holding those values.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginator:
+    """Paginate a queryset on ``ordering`` (e.g. ``("-created_at", "id")``), which must end in a unique field."""
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, ordering, page_size=20, max_page_size=100):
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def encode_cursor(self, row) -> str:
+        values = [getattr(row, field) if not isinstance(row, dict) else row[field] for field in self.fields]
+        payload = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, model, token):
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            if not isinstance(raw, list) or len(raw) != len(self.fields):
+                raise ValueError(token)
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, raw)]
+        except (ValueError, TypeError, DjangoValidationError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+    def after(self, values) -> Q:
+        """Filter selecting rows strictly after ``values`` in the pagination order."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = self.fields[index]
+            lookup = f"{field}__lt" if name.startswith("-") else f"{field}__gt"
+            step = Q(**{lookup: values[index]})
+            for previous, value in zip(self.fields[:index], values[:index]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def requested(self, request) -> bool:
+        """Whether the client asked for a page; lists that predate pagination stay whole otherwise."""
+        return self.cursor_query_param in request.GET or self.page_size_query_param in request.GET
+
+    def get_page_size(self, request) -> int:
+        raw = request.GET.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            size = int(raw)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "A valid integer is required."})
+        return max(1, min(size, self.max_page_size))
+
+    def page_queryset(self, queryset, request):
+        """Return ``(queryset, size)``; the queryset holds one row more than the page to detect a next page."""
+        size = self.get_page_size(request)
+        token = request.GET.get(self.cursor_query_param)
+        queryset = queryset.order_by(*self.ordering)
+        if token:
+            queryset = queryset.filter(self.after(self.decode_cursor(queryset.model, token)))
+        return queryset[: size + 1], size
+
+    def finish(self, rows, size, request):
+        next_url = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(rows[-1])
+            )
+        return rows, next_url
+
+    def paginate(self, queryset, request):
+        """Return ``(rows, next_url)`` for the page selected by the request's cursor."""
+        queryset, size = self.page_queryset(queryset, request)
+        return self.finish(list(queryset), size, request)
+
+    async def apaginate(self, queryset, request):
+        queryset, size = self.page_queryset(queryset, request)
+        return self.finish([row async for row in queryset], size, request)
@@ -1,8 +1,19 @@
 from rest_framework.permissions import BasePermission
 
+from .authentication import MetricsTokenAuthentication
+
 
 class IsSelfEnrollment(BasePermission):
     """Ensures users only access their own enrollment collections."""
 
     def has_object_permission(self, request, view, obj):
         return request.user.is_authenticated and obj.user_id == request.user.id
+
+
+class CanReadMetrics(BasePermission):
+    """Staff users, or a scraper presenting ``METRICS_TOKEN``."""
+
+    def has_permission(self, request, view):
+        if isinstance(request.successful_authenticator, MetricsTokenAuthentication):
+            return True
+        return bool(request.user and request.user.is_staff)
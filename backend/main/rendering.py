@@ -0,0 +1,215 @@
+"""Pre-rendered, precompressed lesson and course tree payloads."""
+
+import gzip
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from .catalogue import build_course_tree, overlay_course_tree
+from .conditional import encoded_etag, not_modified, tagged
+from .models import Course, Lesson, RenderedPayload
+from .replicas import primary_reads
+from .singleflight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - listed in requirements.txt; gzip still works without it
+    brotli = None
+
+ENCODING_COLUMNS = {"br": "brotli", "gzip": "gzip", "identity": "body"}
+
+
+def accepted_encodings(request) -> list:
+    """Codings we can serve that the request accepts, best first; ``identity`` unless explicitly refused."""
+    weights = {}
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    default = weights.get("*")
+    available = [coding for coding in ENCODING_COLUMNS if coding != "br" or brotli is not None]
+    ranked = [
+        coding
+        for coding in available
+        if weights.get(coding, default if default is not None else float(coding == "identity")) > 0
+    ]
+    ranked.sort(key=lambda coding: -weights.get(coding, default or 0.0))
+    return ranked or ["identity"]
+
+
+def render_json(data) -> bytes:
+    # The same bytes DRF's JSONRenderer would send for this data.
+    return JSONRenderer().render(data)
+
+
+def compress(body: bytes, best=False) -> dict:
+    return {
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=9 if best else 6, mtime=0),
+        "brotli": brotli.compress(body, quality=11 if best else 5) if brotli is not None else None,
+    }
+
+
+def store_payload(course_id, lesson_id, version, body: bytes, best=False) -> RenderedPayload:
+    """Save rendered bytes for ``version`` unless it or a newer version is already stored; returns the row to serve."""
+    existing = RenderedPayload.objects.filter(lesson_id=lesson_id)
+    if lesson_id is None:
+        existing = existing.filter(course_id=course_id)
+    with primary_reads():
+        stored = existing.filter(course_id=course_id, content_version=version).first()
+    if stored is not None:
+        return stored
+
+    payload = RenderedPayload(course_id=course_id, lesson_id=lesson_id, content_version=version, **compress(body, best))
+    updated = existing.filter(Q(content_version__lt=version) | ~Q(course_id=course_id)).update(
+        course_id=course_id,
+        content_version=version,
+        body=payload.body,
+        gzip=payload.gzip,
+        brotli=payload.brotli,
+        rendered_at=timezone.now(),
+    )
+    if not updated and not existing.exists():
+        try:
+            with transaction.atomic():
+                payload.save(force_insert=True)
+        except IntegrityError:
+            pass  # A concurrent request stored it first.
+    return payload
+
+
+def _lesson_lookup(lesson_id, encodings):
+    return (
+        RenderedPayload.objects.filter(
+            lesson_id=lesson_id,
+            course_id=F("lesson__module__course_id"),
+            content_version=F("course__content_version"),
+        )
+        .only("content_version", *(ENCODING_COLUMNS[coding] for coding in encodings))
+        .order_by()
+    )
+
+
+def _missed_on_replica() -> bool:
+    return router.db_for_read(RenderedPayload) != DEFAULT_DB_ALIAS
+
+
+def lesson_payload(lesson_id, encodings) -> RenderedPayload | None:
+    """The lesson's payload if it matches the course's current version."""
+    payload = _lesson_lookup(lesson_id, encodings).first()
+    if payload is None and _missed_on_replica():
+        with primary_reads():
+            payload = _lesson_lookup(lesson_id, encodings).first()
+    return payload
+
+
+async def alesson_payload(lesson_id, encodings) -> RenderedPayload | None:
+    payload = await _lesson_lookup(lesson_id, encodings).afirst()
+    if payload is None and _missed_on_replica():
+        with primary_reads():
+            payload = await _lesson_lookup(lesson_id, encodings).afirst()
+    return payload
+
+
+_tree_renders = SingleFlight()
+
+
+def _load_course_tree_payload(course) -> RenderedPayload:
+    payload = RenderedPayload.objects.filter(
+        course_id=course.id, lesson__isnull=True, content_version=course.content_version
+    ).first()
+    if payload is None:
+        body = render_json(overlay_course_tree(course.tree, {}))
+        payload = store_payload(course.id, None, course.content_version, body)
+    return payload
+
+
+def course_tree_payload(course) -> RenderedPayload:
+    """The progress-free tree payload for a catalogue ``CourseRecord``, memoized on the record."""
+    payload = course.payload
+    if payload is None:
+        payload = _tree_renders.do((course.id, course.content_version), lambda: _load_course_tree_payload(course))
+        course.payload = payload
+    return payload
+
+
+def negotiated_not_modified(request, etag, encodings, vary=()):
+    """``not_modified`` for any coding of ``etag`` we might serve this request."""
+    response = not_modified(request, *(encoded_etag(etag, encoding) for encoding in encodings))
+    if response is not None:
+        patch_vary_headers(response, ["Accept-Encoding", *vary])
+    return response
+
+
+def payload_response(payload, encodings, etag, vary=()) -> HttpResponse:
+    """Serve the first stored variant among ``encodings``, tagged per coding."""
+    for encoding in encodings:
+        content = getattr(payload, ENCODING_COLUMNS[encoding])
+        if content is not None:
+            break
+    else:
+        encoding, content = "identity", payload.body
+
+    response = HttpResponse(bytes(content), content_type="application/json")
+    if encoding != "identity":
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return tagged(response, encoded_etag(etag, encoding), vary=vary)
+
+
+def _render_lessons(course, lessons, best) -> int:
+    from .serializers import LessonDetailSerializer
+
+    lessons = LessonDetailSerializer().prepare_queryset(lessons.filter(module__course_id=course.id))
+    rendered = 0
+    for lesson in lessons:
+        body = render_json(LessonDetailSerializer(lesson).data)
+        store_payload(course.id, lesson.id, course.content_version, body, best)
+        rendered += 1
+    return rendered
+
+
+def _render_tree(course, best):
+    tree = overlay_course_tree(build_course_tree(course, list(course.modules.all())), {})
+    store_payload(course.id, None, course.content_version, render_json(tree), best)
+
+
+def render_course_payloads(courses) -> int:
+    """Render the published ``courses``' payloads missing at the current version; returns how many courses had any."""
+    rendered = 0
+    for course in courses.filter(is_published=True).prefetch_related("modules__lessons"):
+        current = RenderedPayload.objects.filter(course_id=course.id, content_version=course.content_version)
+        missing = Lesson.objects.exclude(pk__in=current.filter(lesson__isnull=False).values("lesson_id"))
+        count = _render_lessons(course, missing, best=True)
+        if not current.filter(lesson__isnull=True).exists():
+            _render_tree(course, best=True)
+            count += 1
+        rendered += bool(count)
+    return rendered
+
+
+def render_changed_payloads(course_lookup, lesson_ids=()):
+    """Re-render the matching published courses' trees and, of their lessons, only ``lesson_ids``."""
+    for course in Course.objects.filter(is_published=True, **course_lookup).prefetch_related("modules__lessons"):
+        _render_lessons(course, Lesson.objects.filter(pk__in=lesson_ids), best=False)
+        _render_tree(course, best=False)
+
+
+def schedule_render(lesson_ids=(), **course_lookup):
+    """Re-render the matching courses' trees and the lessons ``lesson_ids`` once the current transaction commits."""
+    transaction.on_commit(lambda: render_changed_payloads(course_lookup, lesson_ids))
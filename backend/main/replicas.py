@@ -0,0 +1,120 @@
+"""Primary/replica routing for read-heavy endpoints.
+
+Everything goes to the ``default`` (primary) database unless a view opts in
+with ``replica_reads()``. Inside that scope, reads of curriculum and
+analytics models go to one replica from ``DATABASE_REPLICAS``, picked once
+per scope so a request never mixes replicas lagging by different amounts.
+User state (enrollments, progress, attempts, auth) is always read from the
+primary. The first write in a scope, or an open transaction on the primary,
+pins the rest of the scope to the primary so it reads its own writes.
+
+``sync_replicas`` copies a SQLite primary into SQLite replicas and stands in
+for replication in development and tests.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models whose reads may be served from a replica.
+REPLICA_MODELS = frozenset(
+    {
+        "main.course",
+        "main.module",
+        "main.lesson",
+        "main.problem",
+        "main.renderedpayload",
+        "main.problemdailystats",
+        "main.lessondailystats",
+    }
+)
+
+
+class ReadScope:
+    # Mutable so a pin made in a ``sync_to_async`` thread is seen by the caller's copy of the context.
+    __slots__ = ("replica",)
+
+    def __init__(self, replica):
+        self.replica = replica
+
+
+_scope = ContextVar("read_scope", default=None)
+
+
+@contextmanager
+def replica_reads():
+    """Serve eligible reads in this block from a replica, if any are configured."""
+    replicas = settings.DATABASE_REPLICAS
+    token = _scope.set(ReadScope(random.choice(replicas) if replicas else None))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read everything in this block from the primary, even inside ``replica_reads``."""
+    token = _scope.set(ReadScope(None))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def pin_to_primary():
+    """Send the rest of the current scope's reads to the primary."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.replica = None
+
+
+class ReplicaReadsMixin:
+    """View mixin running the whole request inside ``replica_reads()``."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope is None or scope.replica is None or model._meta.label_lower not in REPLICA_MODELS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            pin_to_primary()
+            return DEFAULT_DB_ALIAS
+        return scope.replica
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving an instance loaded from a replica still writes to the primary.
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema along with the data.
+        return db not in settings.DATABASE_REPLICAS
+
+
+def sync_replicas(aliases=None) -> list:
+    """Copy the SQLite primary into each SQLite replica in ``aliases`` (default: all); returns the aliases synced."""
+    primary = connections[DEFAULT_DB_ALIAS]
+    aliases = list(settings.DATABASE_REPLICAS if aliases is None else aliases)
+    for alias in (DEFAULT_DB_ALIAS, *aliases):
+        if connections[alias].vendor != "sqlite":
+            raise ImproperlyConfigured(f"Database '{alias}' is not SQLite; replicate it with the database's own tools.")
+
+    primary.ensure_connection()
+    for alias in aliases:
+        replica = connections[alias]
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+    return aliases
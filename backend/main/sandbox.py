@@ -0,0 +1,187 @@
+"""Answer checks that run inside grader pool worker processes.
+
+Nothing here imports Django: the module is loaded by freshly spawned workers
+and must stay cheap to import. Each check runs under a CPU-time alarm and the
+worker's address space is capped in ``init_worker``, so a pathological
+expression costs at most one check's budget.
+"""
+
+import ast
+import math
+import random
+import re
+import signal
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+SAMPLE_POINTS = 7
+MAX_EXPONENT = 64
+MAX_EXPRESSION_LENGTH = 500
+REL_TOLERANCE = 1e-9
+
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Call,
+)
+FUNCTIONS = {
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "tg": math.tan,
+    "cot": lambda value: 1 / math.tan(value),
+    "ctg": lambda value: 1 / math.tan(value),
+    "arcsin": math.asin,
+    "arccos": math.acos,
+    "arctan": math.atan,
+    "arctg": math.atan,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "ln": math.log,
+    "log": math.log,
+    "lg": math.log10,
+    "abs": abs,
+}
+# Function names are upper-cased while products are inserted, so their letters are not split apart.
+_FUNCTION_CALL = re.compile(r"(?:%s)(?=\s*\()" % "|".join(sorted(FUNCTIONS, key=len, reverse=True)))
+_IMPLICIT_PRODUCT = re.compile(r"(?<=[\d.a-z)])\s*(?=[a-zA-Z(])|(?<=\))\s*(?=[\d.])")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+_ASSIGNMENT = re.compile(r"^\s*[a-z]\s*=(?!=)")
+
+
+class CheckTimeout(Exception):
+    pass
+
+
+class CheckError(Exception):
+    """The submission is not an expression the checker understands."""
+
+
+def init_worker(memory_limit_bytes):
+    if resource is not None and memory_limit_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+
+def warm():
+    """No-op task used to force a worker to start and finish importing."""
+    return True
+
+
+def _on_alarm(signum, frame):
+    raise CheckTimeout()
+
+
+def parse_expression(text: str) -> ast.Expression:
+    text = str(text).strip().lower()
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise CheckError("Expression too long")
+    text = _ASSIGNMENT.sub("", text, count=1).strip()
+    text = _DECIMAL_COMMA.sub(".", text).replace("^", "**").replace("×", "*").replace("·", "*").replace(":", "/")
+    text = _FUNCTION_CALL.sub(lambda match: match.group().upper(), text)
+    text = _IMPLICIT_PRODUCT.sub("*", text).lower()
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as exc:
+        raise CheckError(str(exc)) from exc
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise CheckError(f"Unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Call):
+            name = node.func.id if isinstance(node.func, ast.Name) else None
+            if name not in FUNCTIONS or len(node.args) != 1 or node.keywords:
+                raise CheckError("Unsupported function call")
+        elif isinstance(node, ast.Name) and len(node.id) != 1 and node.id not in FUNCTIONS:
+            raise CheckError(f"Unknown name: {node.id}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise CheckError("Unsupported constant")
+    return tree
+
+
+def variables(tree) -> set:
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id not in FUNCTIONS}
+
+
+def evaluate(node, values):
+    if isinstance(node, ast.Expression):
+        return evaluate(node.body, values)
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        return values[node.id]
+    if isinstance(node, ast.Call):
+        return FUNCTIONS[node.func.id](evaluate(node.args[0], values))
+    if isinstance(node, ast.UnaryOp):
+        operand = evaluate(node.operand, values)
+        return -operand if isinstance(node.op, ast.USub) else operand
+
+    left = evaluate(node.left, values)
+    right = evaluate(node.right, values)
+    if isinstance(node.op, ast.Add):
+        return left + right
+    if isinstance(node.op, ast.Sub):
+        return left - right
+    if isinstance(node.op, ast.Mult):
+        return left * right
+    if isinstance(node.op, ast.Div):
+        return left / right
+    if abs(right) > MAX_EXPONENT:
+        raise OverflowError("Exponent too large")
+    return left**right
+
+
+def _close(a, b):
+    if isinstance(a, complex) or isinstance(b, complex):
+        return abs(a - b) <= REL_TOLERANCE * max(abs(a), abs(b), 1.0)
+    return math.isclose(a, b, rel_tol=REL_TOLERANCE, abs_tol=REL_TOLERANCE)
+
+
+def expressions_equivalent(expected: str, submitted: str, seed=0) -> bool:
+    """Probabilistic identity test: both expressions agree at random sample points."""
+    try:
+        left, right = parse_expression(expected), parse_expression(submitted)
+    except CheckError:
+        return False
+
+    names = sorted(variables(left) | variables(right))
+    rng = random.Random(seed)
+    compared = 0
+    for _ in range(SAMPLE_POINTS * 3):
+        values = {name: rng.uniform(-3.0, 3.0) for name in names}
+        try:
+            a, b = evaluate(left, values), evaluate(right, values)
+        except (ZeroDivisionError, OverflowError, ValueError, TypeError):
+            # Outside the domain (sqrt(-1), ln(0), a complex argument): try another point.
+            continue
+        if not _close(a, b):
+            return False
+        compared += 1
+        if compared >= SAMPLE_POINTS or not names:
+            return True
+    return False
+
+
+def check_symbolic(expected: str, submitted: str, cpu_seconds: float):
+    """Worker entry point; returns ``True``/``False``, or ``None`` when the CPU budget ran out."""
+    previous = signal.signal(signal.SIGPROF, _on_alarm)
+    signal.setitimer(signal.ITIMER_PROF, cpu_seconds)
+    try:
+        return expressions_equivalent(expected, submitted)
+    except (CheckTimeout, MemoryError, RecursionError):
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from .models import Course, Enrollment, Lesson, Module, Problem
-from .services import compute_course_progress, lesson_completion_map
+from .fieldsets import SparseFieldsMixin
+from .hashing import hash_password
+from .models import Course, Enrollment, Lesson, LessonDailyStats, Module, Problem, ProblemDailyStats
+from .services import annotate_course_counts, annotate_course_user_state, compute_course_progress
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -30,14 +33,28 @@ class RegisterSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        return User.objects.create_user(
-            username=validated_data["username"],
-            email=validated_data.get("email", ""),
-            password=validated_data["password"],
+        # What ``create_user`` does, with the hashing in the bounded pool.
+        user = User(
+            username=User.normalize_username(validated_data["username"]),
+            email=User.objects.normalize_email(validated_data.get("email", "")),
+            password=hash_password(validated_data["password"]),
         )
+        user.save()
+        return user
 
 
-class CourseListSerializer(serializers.ModelSerializer):
+COURSE_COUNT_FIELDS = {"modules_count", "lessons_count", "progress_percent"}
+COURSE_USER_FIELDS = {"enrolled", "progress_percent"}
+
+
+def progress_percent(enrollment_progress, completed_lessons, lessons_count) -> int:
+    """The stored enrollment progress, or the share of completed lessons when not enrolled."""
+    if enrollment_progress is not None:
+        return enrollment_progress
+    return int((completed_lessons / lessons_count) * 100) if lessons_count else 0
+
+
+class CourseListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     modules_count = serializers.SerializerMethodField()
     lessons_count = serializers.SerializerMethodField()
     enrolled = serializers.SerializerMethodField()
@@ -61,23 +78,61 @@ class CourseListSerializer(serializers.ModelSerializer):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return False
+        if hasattr(obj, "enrollment_progress"):
+            return obj.enrollment_progress is not None
         return Enrollment.objects.filter(user=request.user, course=obj).exists()
 
     def get_modules_count(self, obj):
-        return getattr(obj, "modules_count", obj.modules.count())
+        if hasattr(obj, "modules_count"):
+            return obj.modules_count
+        return obj.modules.count()
 
     def get_lessons_count(self, obj):
-        return getattr(obj, "lessons_count", Lesson.objects.filter(module__course=obj).count())
+        if hasattr(obj, "lessons_count"):
+            return obj.lessons_count
+        return Lesson.objects.filter(module__course=obj).count()
 
     def get_progress_percent(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return 0
+        if hasattr(obj, "enrollment_progress"):
+            return progress_percent(obj.enrollment_progress, obj.completed_lessons_count, self.get_lessons_count(obj))
         enrollment = Enrollment.objects.filter(user=request.user, course=obj).first()
         if enrollment:
             return enrollment.progress_percent
         return compute_course_progress(request.user, obj)
 
+    def needs_user_state(self) -> bool:
+        return not COURSE_USER_FIELDS.isdisjoint(self.fields)
+
+    def add_user_state(self, rows, courses, states) -> list:
+        """Fill the selected user fields into rows rendered without a user.
+
+        ``courses`` holds each row's ``(id, lessons_count)`` and ``states`` the
+        user's ``course_user_states`` rows.
+        """
+        states = {course_id: (progress, completed) for course_id, progress, completed in states}
+        filled = []
+        for row, (course_id, lessons_count) in zip(rows, courses):
+            enrollment_progress, completed = states.get(course_id, (None, 0))
+            row = dict(row)
+            if "enrolled" in self.fields:
+                row["enrolled"] = enrollment_progress is not None
+            if "progress_percent" in self.fields:
+                row["progress_percent"] = progress_percent(enrollment_progress, completed, lessons_count)
+            filled.append(row)
+        return filled
+
+    def prepare_queryset(self, queryset, user, *extra_columns):
+        """Load only the selected columns and annotate counts and user state only when they are shown."""
+        queryset = queryset.only(*self.model_columns(*extra_columns))
+        if not COURSE_COUNT_FIELDS.isdisjoint(self.fields):
+            queryset = annotate_course_counts(queryset)
+        if user is not None and user.is_authenticated and self.needs_user_state():
+            queryset = annotate_course_user_state(queryset, user)
+        return queryset
+
 
 class CourseDetailSerializer(serializers.ModelSerializer):
     modules_count = serializers.SerializerMethodField()
@@ -97,9 +152,13 @@ class CourseDetailSerializer(serializers.ModelSerializer):
         )
 
     def get_modules_count(self, obj):
+        if hasattr(obj, "modules_count"):
+            return obj.modules_count
         return obj.modules.count()
 
     def get_lessons_count(self, obj):
+        if hasattr(obj, "lessons_count"):
+            return obj.lessons_count
         return Lesson.objects.filter(module__course=obj).count()
 
 
@@ -125,21 +184,21 @@ class ModuleTreeSerializer(serializers.ModelSerializer):
     def get_lessons(self, obj):
         completion_map = self.context.get("completion_map", {})
         return LessonTreeSerializer(
-            obj.lessons.all().order_by("order", "id"),
+            obj.lessons.all(),
             many=True,
             context={"completion_map": completion_map},
         ).data
 
 
-class ProblemPublicSerializer(serializers.ModelSerializer):
+class ProblemPublicSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Problem
         fields = ("id", "order", "prompt", "explanation", "points")
 
 
-class LessonDetailSerializer(serializers.ModelSerializer):
-    module_id = serializers.IntegerField(source="module.id", read_only=True)
-    course_id = serializers.IntegerField(source="module.course.id", read_only=True)
+class LessonDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    module_id = serializers.IntegerField(read_only=True)
+    course_id = serializers.IntegerField(source="module.course_id", read_only=True)
     problems = ProblemPublicSerializer(many=True, read_only=True)
 
     class Meta:
@@ -156,14 +215,45 @@ class LessonDetailSerializer(serializers.ModelSerializer):
             "problems",
         )
 
+    def prepare_queryset(self, queryset):
+        columns = self.model_columns()
+        if "course_id" in self.fields:
+            queryset = queryset.select_related("module")
+            columns.append("module__course")
+        queryset = queryset.only(*columns)
+
+        if "problems" in self.fields:
+            problems = self.nested("problems")
+            problem_columns = problems.model_columns("lesson") if problems is not None else ["id", "lesson"]
+            queryset = queryset.prefetch_related(Prefetch("problems", queryset=Problem.objects.only(*problem_columns)))
+        return queryset
+
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     course = CourseListSerializer(read_only=True)
 
     class Meta:
         model = Enrollment
         fields = ("id", "course", "progress_percent", "created_at")
 
+    def needs_progress(self) -> bool:
+        """Whether stored progress must be refreshed before rendering."""
+        course = self.nested("course")
+        return "progress_percent" in self.fields or (course is not None and course.needs_user_state())
+
+    def prepare_queryset(self, queryset, user, *extra_columns):
+        columns = self.model_columns(*extra_columns)
+        course = self.nested("course")
+        if self.needs_progress():
+            # Refreshing progress reads the course counts and user state, whatever was selected.
+            courses = annotate_course_user_state(annotate_course_counts(Course.objects.all()), user)
+            courses = courses.only(*(course.model_columns() if course is not None else ["id"]))
+            queryset = queryset.prefetch_related(Prefetch("course", queryset=courses))
+            columns += ["course", "progress_percent"]
+        elif course is not None:
+            queryset = queryset.prefetch_related(Prefetch("course", queryset=course.prepare_queryset(Course.objects.all(), user)))
+        return queryset.only(*columns)
+
 
 class EnrollResponseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -176,8 +266,18 @@ class AttemptSubmitSerializer(serializers.Serializer):
     answer = serializers.CharField(max_length=255)
 
 
+class AttemptBatchSubmitSerializer(serializers.ListSerializer):
+    child = AttemptSubmitSerializer()
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("allow_empty", False)
+        kwargs.setdefault("max_length", 200)
+        super().__init__(*args, **kwargs)
+
+
 class AttemptResultSerializer(serializers.Serializer):
-    attempt_id = serializers.IntegerField()
+    # Null when write-behind ingestion has queued the attempt but not stored it yet.
+    attempt_id = serializers.IntegerField(allow_null=True)
     is_correct = serializers.BooleanField()
     awarded_points = serializers.IntegerField()
     lesson_progress = serializers.IntegerField()
@@ -185,13 +285,104 @@ class AttemptResultSerializer(serializers.Serializer):
     correct_answer_if_wrong = serializers.CharField(allow_null=True)
 
 
-class CourseTreeSerializer(serializers.Serializer):
-    course = CourseDetailSerializer()
-    modules = serializers.SerializerMethodField()
-    course_progress = serializers.IntegerField()
+class AttemptHistoryQuerySerializer(serializers.Serializer):
+    course = serializers.IntegerField(required=False, min_value=1)
+    lesson = serializers.IntegerField(required=False, min_value=1)
+    problem = serializers.IntegerField(required=False, min_value=1)
+    latest = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        # Latest mode costs one lookup per candidate problem, so the candidates must be bounded.
+        if attrs["latest"] and not {"course", "lesson", "problem"} & set(attrs):
+            raise serializers.ValidationError({"latest": "Latest mode needs a course, lesson or problem."})
+        return attrs
+
+
+class AttemptHistorySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    problem = serializers.IntegerField(source="problem_id")
+    lesson = serializers.IntegerField(allow_null=True)
+    course = serializers.IntegerField(allow_null=True)
+    submitted_answer = serializers.CharField()
+    is_correct = serializers.BooleanField()
+    awarded_points = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+
+
+class AttemptHistoryPageSerializer(serializers.Serializer):
+    next = serializers.CharField(allow_null=True)
+    results = AttemptHistorySerializer(many=True)
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    course = serializers.IntegerField(required=False, min_value=1)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+    around = serializers.IntegerField(required=False, default=5, min_value=0, max_value=50)
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    user_id = serializers.IntegerField()
+    username = serializers.CharField()
+    points = serializers.IntegerField()
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    course = serializers.IntegerField(allow_null=True)
+    ranked_users = serializers.IntegerField()
+    rank = serializers.IntegerField(allow_null=True, required=False)
+    results = LeaderboardEntrySerializer(many=True)
+
+
+class AnalyticsRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get("start") and attrs.get("end") and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class ProblemDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProblemDailyStats
+        fields = (
+            "problem",
+            "day",
+            "attempts",
+            "correct_attempts",
+            "unique_solvers",
+            "median_attempts_to_solve",
+            "solve_histogram",
+        )
+
+
+class LessonDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonDailyStats
+        fields = (
+            "lesson",
+            "day",
+            "attempts",
+            "correct_attempts",
+            "unique_solvers",
+            "median_attempts_to_solve",
+            "solve_histogram",
+        )
+
+
+class ProblemSummarySerializer(serializers.Serializer):
+    problem_id = serializers.IntegerField()
+    order = serializers.IntegerField()
+    attempts = serializers.IntegerField()
+    correct_attempts = serializers.IntegerField()
+    unique_solvers = serializers.IntegerField()
+    median_attempts_to_solve = serializers.FloatField(allow_null=True)
+    solve_rate = serializers.FloatField()
+
+
+class ExportQuerySerializer(AnalyticsRangeSerializer):
+    course = serializers.IntegerField(required=False, min_value=1)
+    user = serializers.IntegerField(required=False, min_value=1)
 
-    def get_modules(self, obj):
-        request = self.context.get("request")
-        completion = lesson_completion_map(obj, request.user if request else None)
-        modules = obj.modules.prefetch_related("lessons").all().order_by("order", "id")
-        return ModuleTreeSerializer(modules, many=True, context={"completion_map": completion}).data
@@ -1,77 +1,362 @@
-from django.db.models import Count, Q
+import time
+from collections import Counter
 
-from .models import Attempt, Course, Enrollment, Lesson, Problem
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
 
+from .answers import canonicalize
+from .catalogue import get_catalogue
+from .checkers import CHECKERS
+from .ingestion import get_attempt_writer
+from .leaderboard import ROW_FIELDS, publish_points
+from .metrics import timed
+from .models import Attempt, Course, Enrollment, Lesson, Problem, UserCoursePoints, UserLessonProgress
 
-def normalize_answer(value):
-    return str(value).strip().lower().replace(",", ".")
 
+def record_first_solve(user, problem: Problem) -> bool:
+    """Bump the user's lesson progress if this is their first correct answer to ``problem``."""
+    progress, _ = UserLessonProgress.objects.select_for_update().get_or_create(user=user, lesson_id=problem.lesson_id)
+    if Attempt.objects.filter(user=user, problem=problem, is_correct=True).exists():
+        return False
 
-def grade_attempt(user, problem: Problem, answer: str) -> Attempt:
-    normalized_submitted = normalize_answer(answer)
-    normalized_correct = normalize_answer(problem.correct_answer)
-    is_correct = normalized_submitted == normalized_correct
-    awarded_points = problem.points if is_correct else 0
+    progress.solved_count += 1
+    progress.completed = lesson_completed(problem.lesson_id, progress.solved_count)
+    progress.save(update_fields=["solved_count", "completed", "updated_at"])
+    award_points(user.id, {get_catalogue().lesson_course_id(problem.lesson_id): problem.points})
+    return True
+
+
+def lesson_completed(lesson_id, solved_count):
+    """``completed`` as an expression: the statement storing it counts the lesson's problems live."""
+    total = Problem.objects.filter(lesson_id=lesson_id).order_by().values("lesson_id").annotate(total=Count("id"))
+    return GreaterThanOrEqual(
+        Value(solved_count), Coalesce(Subquery(total.values("total"), output_field=IntegerField()), Value(0))
+    )
+
+
+def award_points(user_id, points_by_course: dict) -> None:
+    """Add first-time points to the user's per-course totals."""
+    points_by_course = {course_id: points for course_id, points in points_by_course.items() if course_id and points}
+    if not points_by_course:
+        return
+
+    now = timezone.now()
+    totals, updated = [], []
+    for course_id, points in points_by_course.items():
+        rows = UserCoursePoints.objects.filter(user_id=user_id, course_id=course_id)
+        if rows.update(points=F("points") + points, reached_at=now, updated_at=now):
+            updated.append(course_id)
+            continue
+        # The update found no row, so insert directly; a concurrent insert falls back to the update.
+        try:
+            with transaction.atomic():
+                row = UserCoursePoints.objects.create(
+                    user_id=user_id, course_id=course_id, points=points, reached_at=now
+                )
+        except IntegrityError:
+            rows.update(points=F("points") + points, reached_at=now, updated_at=now)
+            updated.append(course_id)
+        else:
+            totals.append({field: getattr(row, field) for field in ROW_FIELDS})
 
-    return Attempt.objects.create(
+    if updated:
+        totals += UserCoursePoints.objects.filter(user_id=user_id, course_id__in=updated).values(*ROW_FIELDS)
+    transaction.on_commit(lambda: publish_points(totals))
+
+
+def check_answer(problem: Problem, answer: str, deadline=None) -> bool:
+    canonical_answer = problem.canonical_answer or canonicalize(problem.correct_answer)
+    return CHECKERS[problem.checker](problem, canonical_answer, answer, deadline=deadline)
+
+
+def build_attempt(user, problem: Problem, answer: str, deadline=None) -> Attempt:
+    """Grade ``answer`` in memory and return the unsaved attempt."""
+    is_correct = check_answer(problem, answer, deadline)
+    return Attempt(
         user=user,
         problem=problem,
         submitted_answer=str(answer).strip(),
         is_correct=is_correct,
-        awarded_points=awarded_points,
+        awarded_points=problem.points if is_correct else 0,
     )
 
 
-def compute_lesson_completion(user, lesson: Lesson) -> bool:
-    total = lesson.problems.count()
-    if total == 0:
-        return False
+@timed("grade_attempt")
+def grade_attempt(user, problem: Problem, answer: str) -> Attempt:
+    attempt = build_attempt(user, problem, answer)
+
+    writer = get_attempt_writer()
+    if writer is not None:
+        writer.submit([attempt])
+        return attempt
+
+    with transaction.atomic():
+        if attempt.is_correct:
+            record_first_solve(user, problem)
+        attempt.save()
+    return attempt
+
+
+def grade_attempts(user, submissions) -> list[Attempt]:
+    """Grade ``(problem, answer)`` pairs and store them with a single bulk insert."""
+    # One wall-clock budget for the whole batch, so symbolic checks cannot hold the worker for minutes.
+    deadline = time.monotonic() + settings.GRADER_BATCH_TIMEOUT
+    attempts = [build_attempt(user, problem, answer, deadline) for problem, answer in submissions]
+
+    writer = get_attempt_writer()
+    if writer is not None:
+        writer.submit(attempts)
+        return attempts
+
+    with transaction.atomic():
+        return store_attempts(user.id, attempts)
+
+
+def store_attempts(user_id, attempts: list[Attempt]) -> list[Attempt]:
+    """Bulk insert one user's graded attempts, folding first-time solves into lesson progress."""
+    correct = {attempt.problem_id: attempt for attempt in attempts if attempt.is_correct}
+    if correct:
+        progress_rows = {
+            row.lesson_id: row
+            for row in UserLessonProgress.objects.select_for_update().filter(
+                user_id=user_id, lesson_id__in={attempt.problem.lesson_id for attempt in correct.values()}
+            )
+        }
+        already_solved = set(
+            Attempt.objects.filter(user_id=user_id, problem_id__in=correct, is_correct=True).values_list(
+                "problem_id", flat=True
+            )
+        )
+        first_solves = [attempt for problem_id, attempt in correct.items() if problem_id not in already_solved]
+        gained = Counter(attempt.problem.lesson_id for attempt in first_solves)
+        catalogue = get_catalogue()
+        points = Counter()
+        for attempt in first_solves:
+            points[catalogue.lesson_course_id(attempt.problem.lesson_id)] += attempt.awarded_points
+
+        to_create, to_update = [], []
+        for lesson_id, count in gained.items():
+            row = progress_rows.get(lesson_id)
+            if row is None:
+                row = UserLessonProgress(user_id=user_id, lesson_id=lesson_id)
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.solved_count += count
+            row.completed = lesson_completed(lesson_id, row.solved_count)
+            row.updated_at = timezone.now()
+        if to_create:
+            UserLessonProgress.objects.bulk_create(to_create)
+        if to_update:
+            UserLessonProgress.objects.bulk_update(to_update, ["solved_count", "completed", "updated_at"])
+        award_points(user_id, points)
+
+    return Attempt.objects.bulk_create(attempts)
+
+
+def completed_lesson_ids(user, lesson_ids) -> set:
+    return set(
+        UserLessonProgress.objects.filter(user=user, lesson_id__in=lesson_ids, completed=True).values_list(
+            "lesson_id", flat=True
+        )
+    )
+
+
+ATTEMPT_HISTORY_FIELDS = ("id", "problem_id", "submitted_answer", "is_correct", "awarded_points", "created_at")
+
+
+def attempt_history(user, problem_ids=None, latest=False):
+    """The user's attempts as value rows, optionally limited to ``problem_ids`` or to the latest per problem.
 
+    Latest mode needs ``problem_ids``: each one costs an index seek, however long the user's history is.
+    """
+    queryset = Attempt.objects.filter(user=user)
+    if latest:
+        if problem_ids is None:
+            raise ValueError("attempt_history(latest=True) needs problem_ids")
+        newest = Attempt.objects.filter(user=user, problem=OuterRef("pk")).order_by("-created_at", "-id").values("id")[:1]
+        problems = Problem.objects.filter(id__in=problem_ids)
+        newest_ids = problems.order_by().annotate(latest=Subquery(newest)).values("latest")
+        # Already the user's own attempts; filtering on user again would walk their history instead.
+        queryset = Attempt.objects.filter(id__in=newest_ids)
+    elif problem_ids is not None:
+        queryset = queryset.filter(problem_id__in=problem_ids)
+    return queryset.values(*ATTEMPT_HISTORY_FIELDS)
+
+
+async def acompleted_lesson_ids(user, lesson_ids) -> set:
+    queryset = UserLessonProgress.objects.filter(user=user, lesson_id__in=lesson_ids, completed=True)
+    return {lesson_id async for lesson_id in queryset.values_list("lesson_id", flat=True)}
+
+
+def refresh_lesson_progress(lesson_id) -> None:
+    """Recompute every user's progress row for a lesson after its problem set changed."""
+    total = Problem.objects.filter(lesson_id=lesson_id).count()
     solved = (
-        Attempt.objects.filter(user=user, problem__lesson=lesson, is_correct=True)
-        .values("problem_id")
+        Attempt.objects.filter(user_id=OuterRef("user_id"), problem__lesson_id=lesson_id, is_correct=True)
+        .order_by()
+        .values("user_id")
+        .annotate(solved=Count("problem", distinct=True))
+        .values("solved")
+    )
+    # A problem moved in may bring solves from users with no row for this lesson yet.
+    newcomers = (
+        Attempt.objects.filter(problem__lesson_id=lesson_id, is_correct=True)
+        .exclude(user__lesson_progress__lesson_id=lesson_id)
+        .order_by()
+        .values_list("user_id", flat=True)
         .distinct()
-        .count()
     )
-    return solved >= total
+    UserLessonProgress.objects.bulk_create(
+        [UserLessonProgress(user_id=user_id, lesson_id=lesson_id) for user_id in newcomers], ignore_conflicts=True
+    )
+    rows = UserLessonProgress.objects.filter(lesson_id=lesson_id)
+    rows.update(solved_count=Coalesce(Subquery(solved, output_field=IntegerField()), Value(0)))
+    if total == 0:
+        rows.update(completed=False)
+    else:
+        rows.update(completed=ExpressionWrapper(Q(solved_count__gte=total), output_field=BooleanField()))
+
+
+def refresh_course_progress(course_id) -> None:
+    """Recompute every enrollment's progress in a course after its lesson set changed."""
+    total = Lesson.objects.filter(module__course_id=course_id).count()
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    if total == 0:
+        enrollments.update(progress_percent=0)
+        return
+    completed = (
+        UserLessonProgress.objects.filter(
+            user_id=OuterRef("user_id"), completed=True, lesson__module__course_id=course_id
+        )
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    completed_count = Coalesce(Subquery(completed, output_field=IntegerField()), Value(0))
+    enrollments.update(progress_percent=completed_count * 100 / total)
+
+
+def touch_course(course_id) -> None:
+    """Bump the course's ``content_version`` and ``updated_at`` so caches and ETags keyed on them change."""
+    Course.objects.filter(pk=course_id).update(updated_at=timezone.now(), content_version=F("content_version") + 1)
+
+
+def compute_lesson_completion(user, lesson) -> bool:
+    return UserLessonProgress.objects.filter(user=user, lesson=lesson, completed=True).exists()
 
 
-def compute_course_progress(user, course: Course) -> int:
-    lessons = Lesson.objects.filter(module__course=course).only("id")
-    total_lessons = lessons.count()
-    if total_lessons == 0:
-        return 0
+def compute_course_progress(user, course) -> int:
+    """Percent of the course's lessons the user completed; ``course`` may be a model or an id."""
+    return course_progress(user, course)[0]
 
-    completed = sum(1 for lesson in lessons if compute_lesson_completion(user, lesson))
-    return int((completed / total_lessons) * 100)
+
+@timed("compute_course_progress")
+def course_progress(user, course, lesson_ids=()) -> tuple[int, set]:
+    """The course percent plus which of the course's ``lesson_ids`` the user completed, in one query."""
+    completed = Exists(UserLessonProgress.objects.filter(user=user, lesson=OuterRef("pk"), completed=True))
+    lessons = {f"lesson_{lesson_id}": lesson_id for lesson_id in lesson_ids}
+    counts = Lesson.objects.filter(module__course_id=getattr(course, "pk", course)).aggregate(
+        total=Count("id"),
+        completed=Count("id", filter=completed),
+        **{key: Count("id", filter=completed & Q(pk=lesson_id)) for key, lesson_id in lessons.items()},
+    )
+    done = {lesson_id for key, lesson_id in lessons.items() if counts[key]}
+    if not counts["total"]:
+        return 0, done
+    return int((counts["completed"] / counts["total"]) * 100), done
 
 
-def lesson_completion_map(course: Course, user=None):
-    lesson_ids = list(Lesson.objects.filter(module__course=course).values_list("id", flat=True))
+@timed("lesson_completion_map")
+def lesson_completion_map(course, user=None, lesson_ids=None):
+    if lesson_ids is None:
+        lesson_ids = get_catalogue().course_lesson_ids(getattr(course, "pk", course))
     completion = {lesson_id: False for lesson_id in lesson_ids}
 
     if not user or not user.is_authenticated or not lesson_ids:
         return completion
 
-    solved_counts = (
-        Attempt.objects.filter(user=user, problem__lesson_id__in=lesson_ids, is_correct=True)
-        .values("problem__lesson_id")
-        .annotate(solved=Count("problem", distinct=True))
+    for lesson_id in completed_lesson_ids(user, lesson_ids):
+        completion[lesson_id] = True
+
+    return completion
+
+
+def annotate_course_counts(queryset):
+    return queryset.annotate(
+        modules_count=Count("modules", distinct=True),
+        lessons_count=Count("modules__lessons", distinct=True),
+    )
+
+
+def annotate_course_user_state(queryset, user):
+    """Annotate courses with the user's enrollment progress and completed lesson count.
+
+    ``enrollment_progress`` is null for courses the user is not enrolled in.
+    """
+    enrollment = Enrollment.objects.filter(user=user, course=OuterRef("pk"))
+    completed = (
+        UserLessonProgress.objects.filter(user=user, completed=True, lesson__module__course=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values("count")
     )
-    total_counts = (
-        Problem.objects.filter(lesson_id__in=lesson_ids)
-        .values("lesson_id")
-        .annotate(total=Count("id"))
+    return queryset.annotate(
+        enrollment_progress=Subquery(enrollment.values("progress_percent")[:1]),
+        completed_lessons_count=Coalesce(Subquery(completed, output_field=IntegerField()), Value(0)),
     )
 
-    solved_map = {row["problem__lesson_id"]: row["solved"] for row in solved_counts}
-    total_map = {row["lesson_id"]: row["total"] for row in total_counts}
 
-    for lesson_id in lesson_ids:
-        total = total_map.get(lesson_id, 0)
-        completion[lesson_id] = total > 0 and solved_map.get(lesson_id, 0) >= total
+def course_user_states(user, course_ids):
+    """``(course_id, enrollment_progress, completed_lessons_count)`` for the user on ``course_ids``, in one query."""
+    queryset = Course.objects.filter(pk__in=course_ids).order_by()
+    return annotate_course_user_state(queryset, user).values_list("id", "enrollment_progress", "completed_lessons_count")
 
-    return completion
+
+def refresh_enrollments_progress(user, enrollments=None) -> list[Enrollment]:
+    """Persist stale progress of the user's enrollments in one bulk update.
+
+    ``enrollments`` defaults to all of them; when given, their courses must be
+    prefetched with ``annotate_course_counts`` and ``annotate_course_user_state``.
+    """
+    if enrollments is None:
+        courses = annotate_course_user_state(annotate_course_counts(Course.objects.all()), user)
+        enrollments = list(
+            Enrollment.objects.filter(user=user)
+            .prefetch_related(Prefetch("course", queryset=courses))
+            .order_by("created_at", "id")
+        )
+
+    stale = []
+    for enrollment in enrollments:
+        course = enrollment.course
+        latest = int((course.completed_lessons_count / course.lessons_count) * 100) if course.lessons_count else 0
+        course.enrollment_progress = latest
+        if enrollment.progress_percent != latest:
+            enrollment.progress_percent = latest
+            stale.append(enrollment)
+
+    if stale:
+        Enrollment.objects.bulk_update(stale, ["progress_percent"])
+    return enrollments
 
 
 def upsert_enrollment_progress(user, course: Course) -> Enrollment:
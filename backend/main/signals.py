@@ -0,0 +1,161 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import forget_user, revoke_user_tokens
+from .catalogue import invalidate_catalogue
+from .metrics import record_query
+from .models import Course, Lesson, Module, Problem
+from .rendering import schedule_render
+from .services import refresh_course_progress, refresh_lesson_progress, touch_course
+
+
+@receiver(pre_save, sender=Problem)
+def problem_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_lesson_id = None
+    if raw or instance._state.adding or (update_fields is not None and "lesson" not in update_fields):
+        return
+    instance._previous_lesson_id = Problem.objects.filter(pk=instance.pk).values_list("lesson_id", flat=True).first()
+
+
+def lesson_course_id(lesson_id):
+    return Module.objects.filter(lessons=lesson_id).values_list("course_id", flat=True).first()
+
+
+@receiver(post_save, sender=Problem)
+def problem_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_lesson_id = getattr(instance, "_previous_lesson_id", None)
+    # Moving a problem changes the problem set of both lessons.
+    lesson_ids = [instance.lesson_id]
+    if previous_lesson_id not in (None, instance.lesson_id):
+        lesson_ids.append(previous_lesson_id)
+    changed = created or len(lesson_ids) > 1
+    course_ids = set()
+    for lesson_id in lesson_ids:
+        course_id = lesson_course_id(lesson_id)
+        course_ids.add(course_id)
+        if changed:
+            refresh_lesson_progress(lesson_id)
+        touch_course(course_id)
+        schedule_render(lesson_ids=[lesson_id], pk=course_id)
+    if changed:
+        # Lessons may have gained or lost completion, which moves the stored course percent.
+        for course_id in course_ids - {None}:
+            refresh_course_progress(course_id)
+    invalidate_catalogue()
+
+
+@receiver(post_delete, sender=Problem)
+def problem_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting the lesson or course cascades here; its own handler covers the course.
+    if not (isinstance(origin, Problem) or getattr(origin, "model", None) is Problem):
+        return
+    course_id = lesson_course_id(instance.lesson_id)
+    refresh_lesson_progress(instance.lesson_id)
+    refresh_course_progress(course_id)
+    touch_course(course_id)
+    invalidate_catalogue()
+    schedule_render(lesson_ids=[instance.lesson_id], pk=course_id)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created:
+        touch_course(instance.pk)
+        instance.refresh_from_db(fields=["content_version"])
+    invalidate_catalogue()
+    schedule_render(pk=instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    invalidate_catalogue()
+
+
+@receiver(pre_save, sender=Module)
+def module_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_course_id = None
+    if raw or instance._state.adding or (update_fields is not None and "course" not in update_fields):
+        return
+    instance._previous_course_id = Module.objects.filter(pk=instance.pk).values_list("course_id", flat=True).first()
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def module_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_course_id = instance.__dict__.pop("_previous_course_id", None)
+    if previous_course_id in (None, instance.course_id):
+        touch_course(instance.course_id)
+        schedule_render(pk=instance.course_id)
+    else:
+        # Moving a module changes the lesson set, and the lessons' payloads, of both courses.
+        lesson_ids = list(instance.lessons.values_list("id", flat=True))
+        for course_id in (instance.course_id, previous_course_id):
+            touch_course(course_id)
+            refresh_course_progress(course_id)
+            schedule_render(lesson_ids=lesson_ids, pk=course_id)
+    invalidate_catalogue()
+
+
+@receiver(pre_save, sender=Lesson)
+def lesson_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_course_id = None
+    if raw or instance._state.adding or (update_fields is not None and "module" not in update_fields):
+        return
+    instance._previous_course_id = lesson_course_id(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, raw=False, signal=None, created=False, **kwargs):
+    if raw:
+        return
+    course_id = Module.objects.filter(pk=instance.module_id).values_list("course_id", flat=True).first()
+    previous_course_id = instance.__dict__.pop("_previous_course_id", None)
+    # Gone when the lesson is deleted along with its course.
+    course_ids = {course_id, previous_course_id} - {None}
+    for changed_course_id in course_ids:
+        touch_course(changed_course_id)
+        # Adding, removing or moving a lesson changes the course's lesson count.
+        if created or signal is post_delete or len(course_ids) > 1:
+            refresh_course_progress(changed_course_id)
+        schedule_render(lesson_ids=[instance.pk], pk=changed_course_id)
+    invalidate_catalogue()
+
+
+# Changing any of these revokes the user's tokens, whose claims may carry the old values.
+TOKEN_REVOKING_FIELDS = ("password", "is_active", "is_staff", "is_superuser")
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fields = [field for field in TOKEN_REVOKING_FIELDS if update_fields is None or field in update_fields]
+    previous = User.objects.filter(pk=instance.pk).values(*fields).first() if fields else None
+    instance._revoke_tokens = previous is not None and any(previous[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if getattr(instance, "_revoke_tokens", False):
+        revoke_user_tokens(instance.pk)
+    forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,156 @@
+"""Request coalescing for expensive shared reads.
+
+``SingleFlight`` makes concurrent callers in one process that ask for the
+same key wait for a single computation and share its result.
+``CachedFlight`` adds a cross-process layer on a Django cache
+(``SINGLE_FLIGHT_CACHE``). Results are stored with the version they were
+computed for. On a version change, one process takes a lock (``cache.add``)
+and recomputes while everyone else keeps serving the stale result
+(stale-while-revalidate). On a cold miss, the other processes wait for the
+lock holder's result instead of computing their own. Each process also keeps
+the current results it has seen, so ``peek`` answers hits without any I/O,
+which lets async views skip the thread hop. The lock is only as
+atomic as the backend's ``add``: atomic on memcached, Redis and locmem, and
+best effort on the file-based cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+PENDING = object()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """One in-flight computation per key in this process; concurrent callers share its result or exception."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, wait=True):
+        """Run ``func``, or join the call in flight for ``key`` (``wait=False``: return ``PENDING`` instead)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not wait:
+                return PENDING
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class CachedFlight:
+    """Versioned, cross-process coalescing of ``compute()`` through a Django cache; see the module docstring."""
+
+    def __init__(self, prefix, poll_interval=0.02, local_size=256):
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.local_size = local_size
+        self._flight = SingleFlight()
+        self._local = OrderedDict()
+        self._local_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.SINGLE_FLIGHT_CACHE]
+
+    def peek(self, key, version):
+        """The value for ``key`` at ``version`` if this process already holds it, else ``None``; does no I/O."""
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, key, version, value):
+        with self._local_lock:
+            self._local[key] = (version, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def forget(self):
+        """Drop this process's copies; the shared cache is left alone."""
+        with self._local_lock:
+            self._local.clear()
+
+    def get(self, key, version, compute):
+        """``(value, value_version)`` for ``key``; ``value_version`` is older than ``version`` while a refresh runs."""
+        value = self.peek(key, version)
+        if value is not None:
+            return value, version
+        result = self._get(key, version, compute)
+        if result[1] == version:
+            self._remember(key, version, result[0])
+        return result
+
+    def _get(self, key, version, compute):
+        cache_key = f"{self.prefix}:{key}"
+        entry = self.cache.get(cache_key)
+        if entry is not None and entry[0] == version:
+            return entry[1], entry[0]
+
+        def refresh():
+            return self._refresh(cache_key, version, compute, stale=entry)
+
+        if entry is None:
+            return self._flight.do((cache_key, version), refresh)
+        result = self._flight.do((cache_key, version), refresh, wait=False)
+        return (entry[1], entry[0]) if result is PENDING else result
+
+    def _store(self, cache_key, version, compute):
+        value = compute()
+        self.cache.set(cache_key, (version, value), settings.SINGLE_FLIGHT_TTL)
+        return value, version
+
+    def _refresh(self, cache_key, version, compute, stale):
+        cache = self.cache
+        lock_key = f"{cache_key}:lock"
+        timeout = settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+        if cache.add(lock_key, True, timeout):
+            try:
+                return self._store(cache_key, version, compute)
+            finally:
+                cache.delete(lock_key)
+        if stale is not None:
+            return stale[1], stale[0]
+
+        # Cold miss while another process computes: wait for its result rather than repeat the work.
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = cache.get(cache_key)
+            if entry is not None and entry[0] == version:
+                return entry[1], entry[0]
+            if lock_key not in cache:
+                break
+        return self._store(cache_key, version, compute)
@@ -1,10 +1,79 @@
+import ast
+import csv
+import gzip
+import importlib
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
 from django.core.management import call_command
-from django.test import TestCase
+from django.db import connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-from .models import Course, Enrollment, Lesson, Module, Problem
+from . import async_views, catalogue, sandbox, urls
+from .analytics import histogram_median, rollup_attempts
+from .answers import answers_match, canonicalize
+from .authentication import forget_user, revoke_user_tokens
+from .benchmarks import QUERY_BUDGETS, budget_violations, generate_dataset, run_benchmarks
+from .catalogue import aget_catalogue, get_catalogue
+from .checkers import GraderBusy, GraderPool, shutdown_grader_pool, verdicts, warm_grader_pool
+from .exports import EXPORTS, export_rows, render_csv
+from .hashing import HashingPool, LoginBusy
+from .ingestion import AttemptQueueFull, AttemptWriteFailed, AttemptWriter, shutdown_attempt_writer
+from .leaderboard import RankIndex, get_leaderboards, reset_leaderboards
+from .metrics import reset_metrics
+from .middleware import RequestMetricsMiddleware
+from .models import (
+    Attempt,
+    Course,
+    Enrollment,
+    Lesson,
+    LessonDailyStats,
+    Module,
+    Problem,
+    ProblemDailyStats,
+    RenderedPayload,
+    UserCoursePoints,
+    UserLessonProgress,
+)
+from .rendering import brotli, store_payload
+from .replicas import replica_reads, sync_replicas
+from .services import (
+    annotate_course_counts,
+    attempt_history,
+    build_attempt,
+    compute_course_progress,
+    compute_lesson_completion,
+    course_progress,
+    grade_attempt,
+    grade_attempts,
+    store_attempts,
+    touch_course,
+)
+from .singleflight import CachedFlight, SingleFlight
+from .views import shared_course_lists
 
 
 class APITests(TestCase):
@@ -101,14 +170,14 @@ class APITests(TestCase):
     def test_course_tree_structure(self):
         response = self.client.get(reverse("courses-tree", kwargs={"course_id": self.course.id}))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data["modules"]), 1)
-        self.assertEqual(len(response.data["modules"][0]["lessons"]), 1)
+        self.assertEqual(len(response.json()["modules"]), 1)
+        self.assertEqual(len(response.json()["modules"][0]["lessons"]), 1)
 
     def test_lesson_detail_hides_correct_answer(self):
         response = self.client.get(reverse("lessons-detail", kwargs={"pk": self.lesson.id}))
         self.assertEqual(response.status_code, 200)
-        self.assertIn("problems", response.data)
-        self.assertNotIn("correct_answer", response.data["problems"][0])
+        self.assertIn("problems", response.json())
+        self.assertNotIn("correct_answer", response.json()["problems"][0])
 
     def test_attempt_submit_and_progress(self):
         access, _ = self._login_and_get_access()
@@ -134,6 +203,16 @@ class APITests(TestCase):
         self.assertTrue(correct.data["is_correct"])
         self.assertEqual(correct.data["course_progress"], 100)
 
+    def test_attempt_submit_accepts_equivalent_forms(self):
+        access, _ = self._login_and_get_access()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        for answer in ("x = 8/2", "4,0", " 4. "):
+            with self.subTest(answer=answer):
+                response = self.client.post(
+                    reverse("attempt-submit"), data={"problem_id": self.problem.id, "answer": answer}, format="json"
+                )
+                self.assertTrue(response.data["is_correct"])
+
     def test_seed_command(self):
         Course.objects.filter(slug="podgotovka-k-nish-i-rfmsh").delete()
         call_command("seed_demo")
@@ -142,3 +221,1853 @@ class APITests(TestCase):
         self.assertEqual(Module.objects.filter(course=seeded).count(), 2)
         self.assertEqual(Lesson.objects.filter(module__course=seeded).count(), 2)
         self.assertEqual(Problem.objects.filter(lesson__module__course=seeded).count(), 6)
+
+    def test_seed_load_command(self):
+        options = {"courses": 3, "users": 40, "attempts": 600, "batch_size": 25, "stdout": StringIO()}
+        call_command("seed_load", **options)
+        first_run = list(Attempt.objects.order_by("id").values_list("problem__order", "is_correct", "submitted_answer"))
+        self.assertEqual(Course.objects.filter(slug__startswith="load-course-").count(), 3)
+        self.assertEqual(User.objects.filter(username__startswith="load_user_").count(), 40)
+        self.assertTrue(0 < len(first_run) <= 600)
+
+        for progress in UserLessonProgress.objects.all():
+            solved = (
+                Attempt.objects.filter(user=progress.user, problem__lesson=progress.lesson, is_correct=True)
+                .values("problem")
+                .distinct()
+                .count()
+            )
+            self.assertEqual(progress.solved_count, solved)
+
+        call_command("seed_load", flush=True, **options)
+        second_run = list(Attempt.objects.order_by("id").values_list("problem__order", "is_correct", "submitted_answer"))
+        self.assertEqual(first_run, second_run)
+
+
+@override_settings(CATALOGUE_CHECK_INTERVAL=60)
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="claims", password="strongpass123", email="c@example.com")
+        self.addCleanup(forget_user, self.user.id)
+        get_catalogue()
+
+    def login(self):
+        response = self.client.post(
+            reverse("auth-login"), {"username": "claims", "password": "strongpass123"}, format="json"
+        )
+        return response.data["access"]
+
+    def me(self, access):
+        return self.client.get(reverse("auth-me"), HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_user_built_from_claims_without_queries(self):
+        access = self.login()
+        self.assertEqual(self.me(access).data["email"], "c@example.com")
+        url = reverse("me-attempts")
+        with self.assertNumQueries(1):  # the attempts page only
+            response = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me(access).data["username"], "claims")
+
+    def test_revocation_and_deactivation_reject_issued_tokens(self):
+        access = self.login()
+        self.assertEqual(self.me(access).status_code, 200)
+        revoke_user_tokens(self.user.id)
+        self.assertEqual(self.me(access).status_code, 401)
+
+        access = self.login()
+        self.assertEqual(self.me(access).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me(access).status_code, 401)
+
+    def test_password_change_revokes_but_profile_edit_does_not(self):
+        access = self.login()
+        self.user.email = "new@example.com"
+        self.user.save()
+        self.assertEqual(self.me(access).data["email"], "new@example.com")
+
+        self.user.set_password("anotherpass456")
+        self.user.save()
+        self.assertEqual(self.me(access).status_code, 401)
+
+    def test_string_user_id_claims_are_revoked_and_forgotten(self):
+        # simplejwt 5.5+ issues the user id claim as a string.
+        access = AccessToken(self.login())
+        access[api_settings.USER_ID_CLAIM] = str(self.user.id)
+        self.assertEqual(self.me(str(access)).status_code, 200)
+        revoke_user_tokens(self.user.id)
+        self.assertEqual(self.me(str(access)).status_code, 401)
+
+        access[api_settings.USER_ID_CLAIM] = "not-a-number"
+        self.assertEqual(self.me(str(access)).status_code, 401)
+
+    def test_tokens_without_version_claim_still_accepted(self):
+        access = RefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.me(access).data["username"], "claims")
+
+
+class LoginHashingTests(TestCase):
+    def test_pool_sheds_when_full(self):
+        pool = HashingPool(max_workers=1, max_pending=0, acquire_timeout=0)
+        self.addCleanup(pool.shutdown)
+        started, release = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=pool.run, args=(hold,))
+        holder.start()
+        started.wait(5)
+        with self.assertRaises(LoginBusy):
+            pool.run(len, "x")
+        release.set()
+        holder.join()
+        self.assertEqual(pool.run(len, "x"), 1)
+
+    def test_login_returns_429_when_hashing_is_saturated(self):
+        User.objects.create_user(username="burst", password="strongpass123")
+        with mock.patch("main.backends.verify_password", side_effect=LoginBusy):
+            response = APIClient().post(
+                reverse("auth-login"), {"username": "burst", "password": "strongpass123"}, format="json"
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ]
+    )
+    def test_login_upgrades_outdated_hash_without_revoking_tokens(self):
+        user = User.objects.create(username="legacy", password=make_password("strongpass123", hasher="md5"))
+        self.addCleanup(forget_user, user.id)
+        client = APIClient()
+        credentials = {"username": "legacy", "password": "strongpass123"}
+        access = client.post(reverse("auth-login"), credentials, format="json").data["access"]
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        self.assertTrue(user.check_password("strongpass123"))
+        response = client.get(reverse("auth-me"), HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.post(reverse("auth-login"), credentials, format="json").status_code, 200)
+
+
+class AnswerEngineTests(TestCase):
+    def test_equivalent_forms_match(self):
+        cases = [
+            ("6", ["6", "6.0", "6,0", "12/2", "x = 6", "X=6", " 6. "]),
+            ("0.5", ["1/2", "0,5", ".5", "2/4"]),
+            ("-3/4", ["-0.75", "-0,75", "y=-6/8"]),
+            ("{1; 2}", ["2; 1", "1, 2", "{2,1}", "x=1; x=2", "1;2;2"]),
+            ("(1, 2)", ["(1,2)", "( 1 , 2 )", "(1; 2)", "(2/2, 2.0)"]),
+            ("x = 1, y = 2", ["y = 2, x = 1", "x=1; y=2", "{y=2, x=1}"]),
+            ("1, 2, 3", ["1;2;3", "1,2,3"]),
+            # A comma before another assignment separates, with or without a space.
+            ("x=1,y=2", ["x = 1, y = 2", "y=2,x=1", "y = 2; x = 1"]),
+            # Roots of one variable are a set.
+            ("x=-2; x=3", ["x=3; x=-2", "x = 3, x = -2", "{3; -2}", "-2, 3"]),
+            ("-1/2", ["1/-2", "-0,5"]),
+            ("10000", ["10 000", "10000.0", "10,000.0"]),
+            ("1,000,000", ["1000000", "1,000,000.00"]),
+            ("{1,000,000, 2}", ["2; 1000000", "2, 1,000,000"]),
+            # A single comma group is a decimal comma.
+            ("0,125", ["0.125", "1/8", "x = 0,125"]),
+            ("2,500", ["2.5", "5/2"]),
+            ("-0,250", ["-0.25", "-1/4"]),
+            ("10,000", ["10", "10.0"]),
+            # A lone comma between digits is a decimal comma.
+            ("1,2", ["1.2", "6/5"]),
+            ("1,000", ["1", "1.0"]),
+            ("Треугольник", ["треугольник", "  ТРЕУГОЛЬНИК "]),
+        ]
+        for correct, submissions in cases:
+            canonical = canonicalize(correct)
+            for submitted in submissions:
+                with self.subTest(correct=correct, submitted=submitted):
+                    self.assertTrue(answers_match(canonical, submitted))
+
+    def test_different_answers_do_not_match(self):
+        cases = [("6", "7"), ("6", "x=7"), ("1/2", "2"), ("3,5", "3;5"), ("{1; 2}", "1"), ("1/0", "0")]
+        # Ordered tuples and intervals, and answers assigning several variables.
+        cases += [
+            ("(1, 2)", "(2, 1)"),
+            ("(3, -1)", "(-1, 3)"),
+            ("[0, 5]", "[5, 0]"),
+            ("(1, 2)", "{1; 2}"),
+            ("x = 1, y = 2", "x = 2, y = 1"),
+            ("x = 1; y = 2", "1; 2"),
+            # Lists keep their order unless the correct answer is a braced set.
+            ("1, 2, 3", "3, 2, 1"),
+            ("1; 2", "{2; 1}"),
+            ("10,000", "10000"),
+            ("0,125", "125"),
+            ("2,500", "2500"),
+            ("1,000,000", "1"),
+            ("1,2", "1, 2"),
+            ("1, 2", "1,2"),
+            ("1,000", "1000"),
+            ("x=1,y=2", "x=2,y=1"),
+            ("1, 2, 3", "x=1; x=2; x=3"),
+        ]
+        for correct, submitted in cases:
+            with self.subTest(correct=correct, submitted=submitted):
+                self.assertFalse(answers_match(canonicalize(correct), submitted))
+
+    def test_backfill_migration_matches_the_engine(self):
+        backfill = importlib.import_module("main.migrations.0003_problem_canonical_answer")
+        for answer in ("x=1,y=2", "y=2,x=1", "1,2", "1, 2", "1,000", "1,000,000", "x=-2; x=3", "1/-2", "(1, 2)", "{2; 1}"):
+            with self.subTest(answer=answer):
+                self.assertEqual(backfill.canonicalize(answer), canonicalize(answer))
+
+    def test_canonical_answer_stored_on_save(self):
+        course = Course.objects.create(title="Answers", slug="answers")
+        module = Module.objects.create(course=course, title="M", order=1)
+        lesson = Lesson.objects.create(module=module, title="L", order=1)
+        problem = Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="12/2")
+        self.assertEqual(problem.canonical_answer, "6")
+
+        problem.correct_answer = "0,25"
+        problem.save(update_fields=["correct_answer"])
+        problem.refresh_from_db()
+        self.assertEqual(problem.canonical_answer, "1/4")
+
+
+class SymbolicCheckerTests(TestCase):
+    def setUp(self):
+        verdicts.clear()
+        self.addCleanup(shutdown_grader_pool)
+        self.user = User.objects.create_user(username="algebra", password="strongpass123")
+        course = Course.objects.create(title="Algebra", slug="algebra")
+        module = Module.objects.create(course=course, title="M", order=1)
+        lesson = Lesson.objects.create(module=module, title="L", order=1)
+        self.problem = Problem.objects.create(
+            lesson=lesson, order=1, prompt="Expand", correct_answer="2(x+1)", checker=Problem.Checker.SYMBOLIC
+        )
+
+    def test_expression_equivalence(self):
+        self.assertTrue(sandbox.expressions_equivalent("2(x+1)", "2x+2"))
+        self.assertTrue(sandbox.expressions_equivalent("(a+b)^2", "a^2 + 2ab + b^2"))
+        self.assertTrue(sandbox.expressions_equivalent("x/2", "y = 0,5x"))
+        self.assertFalse(sandbox.expressions_equivalent("2(x+1)", "2x+1"))
+        self.assertFalse(sandbox.expressions_equivalent("1", "9**9**9**9"))
+        self.assertFalse(sandbox.expressions_equivalent("1", "__import__('os')"))
+
+    def test_function_names_are_not_split_into_products(self):
+        self.assertEqual(ast.unparse(sandbox.parse_expression("2sin(x)cos(x)")), "2 * sin(x) * cos(x)")
+        self.assertTrue(sandbox.expressions_equivalent("sin(2x)", "2sin(x)cos(x)"))
+        self.assertTrue(sandbox.expressions_equivalent("1", "sin(x)^2 + cos(x)^2"))
+        self.assertTrue(sandbox.expressions_equivalent("abs(x)", "sqrt(x^2)"))
+        self.assertFalse(sandbox.expressions_equivalent("sin(x)", "s*i*n*x"))
+        self.assertFalse(sandbox.expressions_equivalent("x", "sin(x, x)"))
+
+    @override_settings(GRADER_POOL_SIZE=1)
+    def test_symbolic_problem_graded_in_pool_and_memoized(self):
+        self.assertTrue(grade_attempt(self.user, self.problem, "2x + 2").is_correct)
+        self.assertFalse(grade_attempt(self.user, self.problem, "2x+1").is_correct)
+        self.assertTrue(verdicts.get(self.problem.id, self.problem.canonical_answer, "2x + 2"))
+
+        with mock.patch.object(GraderPool, "run", side_effect=AssertionError("pool used")):
+            self.assertTrue(grade_attempt(self.user, self.problem, "2x + 2").is_correct)
+
+    @override_settings(GRADER_POOL_SIZE=1)
+    def test_factored_answer_reaches_sandbox_as_written(self):
+        self.problem.correct_answer = "x^2-1"
+        self.problem.save()
+        self.assertTrue(grade_attempt(self.user, self.problem, "(x+1)(x-1)").is_correct)
+        self.assertTrue(grade_attempt(self.user, self.problem, "(x-1)*(x+1)").is_correct)
+        self.assertFalse(grade_attempt(self.user, self.problem, "(x+1)(x+1)").is_correct)
+        with mock.patch.object(GraderPool, "run", return_value=True) as run:
+            grade_attempt(self.user, self.problem, "(1 +  x)(x - 1)")
+        self.assertEqual(run.call_args.args[1:3], ("x^2-1", "(1 +  x)(x - 1)"))
+
+    def test_memo_keeps_forms_the_sandbox_reads_differently_apart(self):
+        self.problem.correct_answer = "1000000x"
+        self.problem.save()
+        with mock.patch.object(GraderPool, "run", return_value=False):
+            self.assertFalse(grade_attempt(self.user, self.problem, "1,000,000").is_correct)
+        with mock.patch.object(GraderPool, "run", return_value=True) as run:
+            self.assertTrue(grade_attempt(self.user, self.problem, "1000000").is_correct)
+        run.assert_called_once()
+
+    def test_runaway_check_is_cut_off_and_pool_recovers(self):
+        pool = GraderPool(max_workers=1, timeout=0.5)
+        self.addCleanup(pool.shutdown)
+        pool.warm()
+
+        started = time.monotonic()
+        self.assertIsNone(pool.run(time.sleep, 30))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(pool.run(sandbox.warm))
+
+    def test_overrun_does_not_fail_checks_caught_in_the_recycle(self):
+        pool = GraderPool(max_workers=2, timeout=3)
+        self.addCleanup(pool.shutdown)
+        pool.warm()
+
+        results = {}
+        stuck = threading.Thread(target=lambda: results.setdefault("stuck", pool.run(time.sleep, 30)))
+        stuck.start()
+        time.sleep(2)
+        # Still running when the stuck check's recycle kills its worker; retried on the fresh pool.
+        self.assertEqual(pool.run(subprocess.call, ["sleep", "1.5"]), 0)
+        stuck.join()
+        self.assertIsNone(results["stuck"])
+
+    @override_settings(GRADER_BATCH_TIMEOUT=0)
+    def test_batch_out_of_grading_time_is_retryable_and_stores_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = [{"problem_id": self.problem.id, "answer": "2x + 2"}] * 3
+        with mock.patch.object(GraderPool, "_get_executor", side_effect=AssertionError("pool used")):
+            response = client.post(reverse("attempt-submit-batch"), data=payload, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Attempt.objects.exists())
+
+    @override_settings(GRADER_POOL_WARM=True)
+    def test_pool_warms_from_the_server_entry_point_only(self):
+        with mock.patch.object(GraderPool, "warm") as warm:
+            apps.get_app_config("main").ready()
+            call_command("check", stdout=StringIO())
+            warm.assert_not_called()
+            warm_grader_pool()
+        warm.assert_called_once()
+
+    def test_full_pool_sheds_load(self):
+        pool = GraderPool(max_workers=1, max_pending=0, timeout=5, acquire_timeout=0.05)
+        self.addCleanup(pool.shutdown)
+        pool.warm()
+
+        busy = threading.Thread(target=pool.run, args=(time.sleep, 1))
+        busy.start()
+        self.addCleanup(busy.join)
+        time.sleep(0.1)
+        with self.assertRaises(GraderBusy):
+            pool.run(sandbox.warm)
+
+
+class LessonProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="solver", password="strongpass123")
+        self.course = Course.objects.create(title="Progress", slug="progress")
+        self.module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lessons = []
+        for lesson_order in range(1, 5):
+            lesson = Lesson.objects.create(module=self.module, title=f"L{lesson_order}", order=lesson_order)
+            for problem_order in range(1, 3):
+                Problem.objects.create(lesson=lesson, order=problem_order, prompt="?", correct_answer="1")
+            self.lessons.append(lesson)
+
+    def test_first_solve_counted_once(self):
+        problem = self.lessons[0].problems.first()
+        grade_attempt(self.user, problem, "1")
+        grade_attempt(self.user, problem, "1")
+        grade_attempt(self.user, problem, "2")
+
+        progress = UserLessonProgress.objects.get(user=self.user, lesson=self.lessons[0])
+        self.assertEqual(progress.solved_count, 1)
+        self.assertFalse(progress.completed)
+
+    def test_course_progress_from_progress_table(self):
+        for problem in self.lessons[0].problems.all():
+            grade_attempt(self.user, problem, "1")
+
+        self.assertTrue(compute_lesson_completion(self.user, self.lessons[0]))
+        self.assertEqual(compute_course_progress(self.user, self.course), 25)
+        with CaptureQueriesContext(connection) as ctx:
+            lesson_ids = [lesson.id for lesson in self.lessons[:2]]
+            self.assertEqual(course_progress(self.user, self.course, lesson_ids), (25, {self.lessons[0].id}))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_adding_problem_reopens_lesson(self):
+        lesson = self.lessons[0]
+        for problem in lesson.problems.all():
+            grade_attempt(self.user, problem, "1")
+        self.assertTrue(compute_lesson_completion(self.user, lesson))
+
+        extra = Problem.objects.create(lesson=lesson, order=3, prompt="?", correct_answer="1")
+        self.assertFalse(compute_lesson_completion(self.user, lesson))
+
+        extra.delete()
+        self.assertTrue(compute_lesson_completion(self.user, lesson))
+
+    def test_moving_a_problem_refreshes_both_lessons(self):
+        source, target = self.lessons[0], self.lessons[1]
+        for problem in source.problems.all():
+            grade_attempt(self.user, problem, "1")
+        grade_attempt(self.user, target.problems.get(order=1), "1")
+        self.assertTrue(compute_lesson_completion(self.user, source))
+
+        moved = source.problems.last()
+        moved.lesson = target
+        moved.order = 3
+        moved.save()
+
+        progress = {row.lesson_id: row for row in UserLessonProgress.objects.filter(user=self.user)}
+        self.assertEqual((progress[source.id].solved_count, progress[source.id].completed), (1, True))
+        self.assertEqual((progress[target.id].solved_count, progress[target.id].completed), (2, False))
+
+        target.problems.get(order=2).delete()
+        self.assertTrue(compute_lesson_completion(self.user, target))
+
+    def test_problem_changes_refresh_course_progress(self):
+        lesson = self.lessons[0]
+        for problem in lesson.problems.all():
+            grade_attempt(self.user, problem, "1")
+        enrollment = Enrollment.objects.create(user=self.user, course=self.course, progress_percent=25)
+
+        extra = Problem.objects.create(lesson=lesson, order=3, prompt="?", correct_answer="1")
+        enrollment.refresh_from_db()
+        self.assertEqual(enrollment.progress_percent, 0)
+
+        other = Course.objects.create(title="Other", slug="other")
+        other_lesson = Lesson.objects.create(module=Module.objects.create(course=other, title="M1", order=1), title="L1")
+        Enrollment.objects.create(user=self.user, course=other, progress_percent=0)
+        grade_attempt(self.user, extra, "1")
+        extra.lesson = other_lesson
+        extra.order = 1
+        extra.save()
+        progress = dict(Enrollment.objects.filter(user=self.user).values_list("course_id", "progress_percent"))
+        self.assertEqual(progress, {self.course.id: 25, other.id: 100})
+
+        extra.delete()
+        self.assertEqual(Enrollment.objects.get(user=self.user, course=other).progress_percent, 0)
+
+    def test_cascaded_problem_deletes_skip_per_problem_work(self):
+        with mock.patch("main.signals.refresh_lesson_progress") as refresh:
+            self.lessons[0].delete()
+            self.course.delete()
+        refresh.assert_not_called()
+
+    def _move_and_check_courses(self, move, old_progress, new_progress):
+        other = Course.objects.create(title="Other", slug="other")
+        other_module = Module.objects.create(course=other, title="M1", order=1)
+        for problem in self.lessons[0].problems.all():
+            grade_attempt(self.user, problem, "1")
+        Enrollment.objects.create(user=self.user, course=self.course, progress_percent=25)
+        Enrollment.objects.create(user=self.user, course=other, progress_percent=0)
+        versions = dict(Course.objects.values_list("id", "content_version"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            move(other, other_module)
+
+        for course in (self.course, other):
+            course.refresh_from_db()
+            self.assertGreater(course.content_version, versions[course.id])
+            # Both trees are re-rendered at the new version, not left stale.
+            tree = RenderedPayload.objects.get(course=course, lesson__isnull=True)
+            self.assertEqual(tree.content_version, course.content_version)
+        progress = dict(Enrollment.objects.filter(user=self.user).values_list("course_id", "progress_percent"))
+        self.assertEqual(progress, {self.course.id: old_progress, other.id: new_progress})
+        moved = RenderedPayload.objects.get(lesson=self.lessons[0])
+        self.assertEqual(json.loads(bytes(moved.body))["course_id"], other.id)
+
+    def test_moving_a_lesson_refreshes_both_courses(self):
+        def move(other, other_module):
+            self.lessons[0].module = other_module
+            self.lessons[0].save()
+
+        self._move_and_check_courses(move, old_progress=0, new_progress=100)
+
+    def test_moving_a_module_refreshes_both_courses(self):
+        def move(other, other_module):
+            self.module.course = other
+            self.module.order = 2
+            self.module.save()
+
+        self._move_and_check_courses(move, old_progress=0, new_progress=25)
+
+    def test_submit_query_count_independent_of_course_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        problem = self.lessons[0].problems.first()
+
+        def submit_queries(answer):
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.post(reverse("attempt-submit"), data={"problem_id": problem.id, "answer": answer}, format="json")
+            self.assertEqual(response.status_code, 201)
+            return len(ctx.captured_queries)
+
+        baseline = submit_queries("2")
+        for lesson_order in range(5, 15):
+            lesson = Lesson.objects.create(module=self.module, title=f"L{lesson_order}", order=lesson_order)
+            Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="1")
+        self.assertEqual(submit_queries("2"), baseline)
+
+
+@override_settings(CATALOGUE_CHECK_INTERVAL=60)
+class CatalogueSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="reader", password="strongpass123")
+        self.course = Course.objects.create(title="Tree", slug="tree")
+        self.module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=self.module, title="L1", order=1)
+        self.problem = Problem.objects.create(lesson=self.lesson, order=1, prompt="?", correct_answer="1")
+        self.url = reverse("courses-tree", kwargs={"course_id": self.course.id})
+
+    def submit(self, answer):
+        self.client.force_authenticate(self.user)
+        return self.client.post(reverse("attempt-submit"), data={"problem_id": self.problem.id, "answer": answer}, format="json")
+
+    def test_structure_served_from_snapshot(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.json()["modules"][0]["lessons"][0]["title"], "L1")
+
+    def test_submit_reads_problem_from_snapshot(self):
+        get_catalogue()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.submit("1")
+        self.assertTrue(response.data["is_correct"])
+        selects = [query["sql"] for query in ctx.captured_queries if query["sql"].startswith("SELECT")]
+        # Completion counts the lesson's problems inside the progress write, not in a SELECT.
+        self.assertFalse(any('FROM "main_problem"' in sql for sql in selects))
+
+    def test_problem_edit_picked_up(self):
+        get_catalogue()
+        self.problem.correct_answer = "5"
+        self.problem.save()
+        self.assertTrue(self.submit("5").data["is_correct"])
+
+    @override_settings(CATALOGUE_CHECK_INTERVAL=0)
+    def test_version_bump_from_other_process_rebuilds(self):
+        get_catalogue()
+        # Queryset updates send no signals, like a change made by another worker.
+        Problem.objects.filter(pk=self.problem.pk).update(correct_answer="7", canonical_answer="7")
+        touch_course(self.course.id)
+        self.assertTrue(self.submit("7.0").data["is_correct"])
+
+    @override_settings(CATALOGUE_CHECK_INTERVAL=0)
+    def test_edit_with_an_older_timestamp_still_rebuilds(self):
+        Course.objects.create(title="Newest", slug="newest")
+        get_catalogue()
+        # Another process with a lagging clock: its edit carries an older updated_at.
+        Problem.objects.filter(pk=self.problem.pk).update(correct_answer="8", canonical_answer="8")
+        Course.objects.filter(pk=self.course.pk).update(
+            content_version=F("content_version") + 1, updated_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertTrue(self.submit("8").data["is_correct"])
+
+    def test_completion_counts_problems_live(self):
+        get_catalogue()
+        # Added by another process; this process's snapshot has not seen it yet.
+        Problem.objects.bulk_create([Problem(lesson=self.lesson, order=2, prompt="?", correct_answer="2")])
+        self.submit("1")
+        self.assertFalse(UserLessonProgress.objects.get(user=self.user, lesson=self.lesson).completed)
+
+        other = User.objects.create_user(username="batch", password="strongpass123")
+        with transaction.atomic():
+            store_attempts(other.id, [build_attempt(other, self.problem, "1")])
+        self.assertFalse(UserLessonProgress.objects.get(user=other, lesson=self.lesson).completed)
+
+    def test_course_progress_counts_lessons_live(self):
+        self.assertEqual(self.submit("1").data["course_progress"], 100)
+        # A lesson added by another process halves the progress before this snapshot notices it.
+        Lesson.objects.bulk_create([Lesson(module=self.module, title="L2", order=2)])
+        self.assertEqual(compute_course_progress(self.user, self.course.id), 50)
+
+    def test_unpublished_course_problems_are_not_graded(self):
+        get_catalogue()
+        Course.objects.filter(pk=self.course.pk).update(is_published=False)
+        touch_course(self.course.id)
+        with override_settings(CATALOGUE_CHECK_INTERVAL=0):
+            self.assertEqual(self.submit("1").status_code, 404)
+            response = self.client.post(
+                reverse("attempt-submit-batch"), data=[{"problem_id": self.problem.id, "answer": "1"}], format="json"
+            )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attempt.objects.exists())
+
+    @override_settings(CATALOGUE_CHECK_INTERVAL=0)
+    def test_stale_snapshot_served_while_another_thread_rebuilds(self):
+        stale = get_catalogue()
+        touch_course(self.course.id)
+        with catalogue._lock:  # Another thread is building the new snapshot.
+            self.assertIs(get_catalogue(), stale)
+        self.assertIsNot(get_catalogue(), stale)
+
+    def test_lesson_change_invalidates_structure(self):
+        self.client.get(self.url)
+        Lesson.objects.create(module=self.module, title="L2", order=2)
+        self.lesson.title = "Renamed"
+        self.lesson.save()
+
+        response = self.client.get(self.url)
+        lessons = response.json()["modules"][0]["lessons"]
+        self.assertEqual([lesson["title"] for lesson in lessons], ["Renamed", "L2"])
+        self.assertEqual(response.json()["course"]["lessons_count"], 2)
+
+    def test_user_progress_overlaid_on_cached_structure(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(self.url)
+        grade_attempt(self.user, self.problem, "1")
+
+        response = self.client.get(self.url)
+        self.assertTrue(response.json()["modules"][0]["lessons"][0]["lesson_completed"])
+        self.assertEqual(response.json()["course_progress"], 100)
+
+        self.client.force_authenticate(None)
+        anonymous = self.client.get(self.url)
+        self.assertFalse(anonymous.json()["modules"][0]["lessons"][0]["lesson_completed"])
+        self.assertEqual(anonymous.json()["course_progress"], 0)
+
+
+@override_settings(CATALOGUE_CHECK_INTERVAL=60)
+class BatchSubmitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="worksheet", password="strongpass123")
+        self.client.force_authenticate(self.user)
+        self.course = Course.objects.create(title="Batch", slug="batch")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        self.other_lesson = Lesson.objects.create(module=module, title="L2", order=2)
+        self.problems = [
+            Problem.objects.create(lesson=self.lesson, order=idx, prompt="?", correct_answer=str(idx))
+            for idx in range(1, 4)
+        ]
+        self.other_problem = Problem.objects.create(lesson=self.other_lesson, order=1, prompt="?", correct_answer="9")
+        Enrollment.objects.create(user=self.user, course=self.course)
+
+    def test_batch_grades_in_order_and_updates_progress_once(self):
+        payload = [
+            {"problem_id": self.problems[0].id, "answer": "1"},
+            {"problem_id": self.problems[1].id, "answer": "2"},
+            {"problem_id": self.problems[2].id, "answer": "3"},
+            {"problem_id": self.problems[2].id, "answer": "3"},
+            {"problem_id": self.other_problem.id, "answer": "0"},
+        ]
+        response = self.client.post(reverse("attempt-submit-batch"), data=payload, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item["is_correct"] for item in response.data], [True, True, True, True, False])
+        self.assertEqual(response.data[0]["lesson_progress"], 100)
+        self.assertEqual(response.data[4]["lesson_progress"], 0)
+        self.assertEqual(response.data[4]["correct_answer_if_wrong"], "9")
+        self.assertTrue(all(item["course_progress"] == 50 for item in response.data))
+        self.assertEqual(UserLessonProgress.objects.get(user=self.user, lesson=self.lesson).solved_count, 3)
+        self.assertEqual(Enrollment.objects.get(user=self.user, course=self.course).progress_percent, 50)
+
+    def test_batch_query_count_independent_of_batch_size(self):
+        def submit_queries(answers):
+            payload = [{"problem_id": problem.id, "answer": answer} for problem, answer in answers]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(reverse("attempt-submit-batch"), data=payload, format="json")
+            self.assertEqual(response.status_code, 201)
+            return len(ctx.captured_queries)
+
+        get_catalogue()
+        # Creates the progress and points rows so both measured batches update them.
+        submit_queries([(self.problems[0], "1")])
+        small = submit_queries([(self.problems[1], "2")])
+        large = submit_queries([(problem, str(problem.order)) for problem in self.problems] * 5)
+        self.assertEqual(small, large)
+
+    def test_batch_rejects_unknown_problem(self):
+        payload = [{"problem_id": self.problems[0].id, "answer": "1"}, {"problem_id": 999999, "answer": "1"}]
+        response = self.client.post(reverse("attempt-submit-batch"), data=payload, format="json")
+        self.assertEqual(response.status_code, 404)
+
+        empty = self.client.post(reverse("attempt-submit-batch"), data=[], format="json")
+        self.assertEqual(empty.status_code, 400)
+
+
+class CourseCatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shared_course_lists.forget()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="browser", password="strongpass123")
+        self.client.force_authenticate(self.user)
+        self.courses = []
+        for idx in range(3):
+            course = Course.objects.create(title=f"Course {idx}", slug=f"course-{idx}")
+            module = Module.objects.create(course=course, title="M1", order=1)
+            for lesson_order in (1, 2):
+                lesson = Lesson.objects.create(module=module, title=f"L{lesson_order}", order=lesson_order)
+                Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="1")
+            self.courses.append(course)
+
+    def test_catalogue_reports_enrollment_and_progress(self):
+        Enrollment.objects.create(user=self.user, course=self.courses[0], progress_percent=40)
+        first_lesson = Lesson.objects.filter(module__course=self.courses[1]).first()
+        grade_attempt(self.user, first_lesson.problems.first(), "1")
+
+        response = self.client.get(reverse("courses-list"))
+        rows = {row["id"]: row for row in response.data}
+        self.assertTrue(rows[self.courses[0].id]["enrolled"])
+        self.assertEqual(rows[self.courses[0].id]["progress_percent"], 40)
+        self.assertFalse(rows[self.courses[1].id]["enrolled"])
+        self.assertEqual(rows[self.courses[1].id]["progress_percent"], 50)
+        self.assertEqual(rows[self.courses[2].id]["progress_percent"], 0)
+        self.assertEqual(rows[self.courses[2].id]["lessons_count"], 2)
+
+    def test_catalogue_query_count_independent_of_course_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("courses-list"))
+        baseline = len(ctx.captured_queries)
+
+        Course.objects.create(title="Course 9", slug="course-9")
+        Enrollment.objects.create(user=self.user, course=self.courses[0])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("courses-list"))
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(ctx.captured_queries), baseline)
+
+
+    def test_sparse_fields_prune_output_and_sql(self):
+        get_catalogue()  # Shared list bodies are keyed by the catalogue version.
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("courses-list"), {"fields": "id,title"})
+        self.assertEqual([set(row) for row in response.data], [{"id", "title"}] * 3)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("COUNT", sql)
+
+        response = self.client.get(reverse("courses-list"), {"fields": "id,nope"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("courses-list"), {"expand": "title"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination_is_opt_in(self):
+        self.assertIsInstance(self.client.get(reverse("courses-list")).data, list)
+
+        ids, url, params = [], reverse("courses-list"), {"page_size": 2, "fields": "id"}
+        while url:
+            response = self.client.get(url, params)
+            ids.extend(row["id"] for row in response.data["results"])
+            url, params = response.data["next"], None
+        self.assertEqual(ids, [course.id for course in self.courses])
+
+    def test_lesson_detail_fields_and_expand(self):
+        lesson = Lesson.objects.filter(module__course=self.courses[0]).first()
+        url = reverse("lessons-detail", kwargs={"pk": lesson.id})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"fields": "id,title,problems"})
+        self.assertEqual(response.data, {"id": lesson.id, "title": lesson.title, "problems": [lesson.problems.get().id]})
+        self.assertFalse(any('"content"' in query["sql"] or '"prompt"' in query["sql"] for query in ctx.captured_queries))
+
+        response = self.client.get(url, {"fields": "course_id,problems.prompt"})
+        self.assertEqual(response.data, {"course_id": self.courses[0].id, "problems": [{"prompt": "?"}]})
+        response = self.client.get(url, {"fields": "id,problems", "expand": "problems"})
+        self.assertEqual(set(response.data["problems"][0]), {"id", "order", "prompt", "explanation", "points"})
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        # Two ``CachedFlight`` objects sharing a file-based cache stand in for two processes.
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tmp.name}
+        settings_override = override_settings(
+            CACHES={"default": settings.CACHES["default"], "flight": shared}, SINGLE_FLIGHT_CACHE="flight"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.first, self.second = CachedFlight("tests"), CachedFlight("tests", poll_interval=0.005)
+
+    def unreachable(self):
+        self.fail("computed although another process holds the result")
+
+    def test_concurrent_callers_share_one_computation(self):
+        flight, calls, release = SingleFlight(), [], threading.Event()
+        results = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "tree"
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", compute))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["tree"] * 4)
+
+    def test_stale_result_served_while_another_process_refreshes(self):
+        self.assertEqual(self.first.get("k", 1, lambda: "v1"), ("v1", 1))
+        self.first.cache.add("tests:k:lock", True)  # The other process is recomputing.
+        self.assertEqual(self.second.get("k", 2, self.unreachable), ("v1", 1))
+
+        self.first.cache.delete("tests:k:lock")
+        self.assertEqual(self.second.get("k", 2, lambda: "v2"), ("v2", 2))
+        self.assertEqual(self.first.get("k", 2, self.unreachable), ("v2", 2))
+
+    def test_cold_miss_waits_for_the_lock_holder(self):
+        cache = self.first.cache
+        cache.add("tests:k:lock", True)
+
+        def finish():
+            time.sleep(0.05)
+            cache.set("tests:k", (1, "v1"))
+            cache.delete("tests:k:lock")
+
+        holder = threading.Thread(target=finish)
+        holder.start()
+        self.assertEqual(self.second.get("k", 1, self.unreachable), ("v1", 1))
+        holder.join()
+
+    @override_settings(CATALOGUE_CHECK_INTERVAL=60)
+    def test_anonymous_course_list_is_shared_until_the_catalogue_changes(self):
+        Course.objects.create(title="Algebra", slug="algebra")
+        get_catalogue()
+        client = APIClient()
+        first = client.get(reverse("courses-list")).data
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get(reverse("courses-list")).data, first)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        Course.objects.create(title="Geometry", slug="geometry")
+        titles = [row["title"] for row in client.get(reverse("courses-list")).data]
+        self.assertEqual(titles, ["Algebra", "Geometry"])
+
+
+class SharedCourseListTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        shared_course_lists.forget()
+        self.course = Course.objects.create(title="Crowded", slug="crowded")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        Lesson.objects.create(module=module, title="L1", order=1)
+
+    def test_concurrent_signed_in_requests_share_one_aggregate(self):
+        users = [User.objects.create_user(username=f"student{idx}") for idx in range(4)]
+        Enrollment.objects.create(user=users[1], course=self.course, progress_percent=40)
+        get_catalogue()
+        calls, release = [], threading.Event()
+
+        def slow_counts(queryset):
+            calls.append(1)
+            release.wait(5)
+            return annotate_course_counts(queryset)
+
+        results = {}
+
+        def browse(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            results[user.username] = client.get(reverse("courses-list")).data
+
+        threads = [threading.Thread(target=browse, args=(user,)) for user in users]
+        with mock.patch("main.serializers.annotate_course_counts", side_effect=slow_counts):
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        rows = {name: {row["id"]: row for row in data} for name, data in results.items()}
+        self.assertEqual(rows["student1"][self.course.id]["progress_percent"], 40)
+        self.assertTrue(rows["student1"][self.course.id]["enrolled"])
+        self.assertFalse(rows["student0"][self.course.id]["enrolled"])
+        self.assertEqual(rows["student0"][self.course.id]["lessons_count"], 1)
+
+
+@override_settings(CATALOGUE_CHECK_INTERVAL=60)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="revisit", password="strongpass123")
+        self.course = Course.objects.create(title="Cached", slug="cached")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1, content="Long text")
+        self.problem = Problem.objects.create(lesson=self.lesson, order=1, prompt="?", correct_answer="1")
+        get_catalogue()
+
+    def revalidate(self, url, etag, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        return response
+
+    def test_course_and_lesson_answer_304_from_one_query_until_content_changes(self):
+        for url in (
+            reverse("courses-detail", kwargs={"course_ref": "cached"}),
+            reverse("lessons-detail", kwargs={"pk": self.lesson.id}),
+        ):
+            etag = self.client.get(url)["ETag"]
+            response = self.revalidate(url, etag, 1)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+
+        lesson_url = reverse("lessons-detail", kwargs={"pk": self.lesson.id})
+        etag = self.client.get(lesson_url)["ETag"]
+        self.assertEqual(self.revalidate(lesson_url, etag, 2, fields="id").status_code, 200)
+
+        self.problem.prompt = "Changed?"
+        self.problem.save()
+        response = self.client.get(lesson_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(lesson_url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        course_url = reverse("courses-detail", kwargs={"course_ref": self.course.id})
+        etag = self.client.get(course_url)["ETag"]
+        self.course.description = "New"
+        self.course.save()
+        self.assertEqual(self.client.get(course_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tree_etag_tracks_structure_and_own_progress(self):
+        self.client.force_authenticate(self.user)
+        url = reverse("courses-tree", kwargs={"course_id": self.course.id})
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.revalidate(url, etag, 1).status_code, 304)
+
+        grade_attempt(self.user, self.problem, "1")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["course_progress"], 100)
+
+        Lesson.objects.create(module=self.lesson.module, title="L2", order=2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_saving_a_course_never_writes_its_version_back(self):
+        course = Course.objects.get(pk=self.course.pk)
+        stale = Course.objects.get(pk=self.course.pk)
+        version = course.content_version
+
+        course.save()
+        self.assertEqual(course.content_version, version + 1)
+        course.save()
+        self.assertEqual(course.content_version, version + 2)
+
+        # Loaded before both bumps, e.g. an admin form left open.
+        stale.description = "Edited"
+        stale.save()
+        self.assertEqual(stale.content_version, version + 3)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).content_version, version + 3)
+
+
+class RenderedPayloadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.course = Course.objects.create(title="Rendered", slug="rendered")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1, content="Text " * 100)
+        self.problem = Problem.objects.create(lesson=self.lesson, order=1, prompt="?", correct_answer="1")
+
+    def test_publishing_renders_payloads_on_commit(self):
+        self.assertFalse(RenderedPayload.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.problem.prompt = "Changed?"
+            self.problem.save()
+        self.course.refresh_from_db()
+        versions = set(RenderedPayload.objects.values_list("content_version", flat=True))
+        self.assertEqual(versions, {self.course.content_version})
+        self.assertEqual(RenderedPayload.objects.count(), 2)
+
+    def test_edit_renders_only_the_changed_lesson(self):
+        other = Lesson.objects.create(module=self.lesson.module, title="L2", order=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.problem.prompt = "Changed?"
+            self.problem.save()
+        rendered = set(RenderedPayload.objects.values_list("lesson_id", flat=True))
+        self.assertEqual(rendered, {self.lesson.id, None})
+
+        # The untouched lesson renders on its first read.
+        self.assertEqual(self.client.get(reverse("lessons-detail", kwargs={"pk": other.id})).status_code, 200)
+        self.assertTrue(RenderedPayload.objects.filter(lesson=other).exists())
+
+    def test_lesson_served_from_stored_bytes_per_encoding(self):
+        url = reverse("lessons-detail", kwargs={"pk": self.lesson.id})
+        plain = self.client.get(url)
+        self.assertEqual(RenderedPayload.objects.filter(lesson=self.lesson).count(), 1)
+
+        with self.assertNumQueries(1):
+            compressed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        self.assertNotEqual(compressed["ETag"], plain["ETag"])
+        self.assertEqual(
+            self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=compressed["ETag"]).status_code, 304
+        )
+        refused = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertNotIn("Content-Encoding", refused)
+
+        Problem.objects.filter(pk=self.problem.pk).update(prompt="Bulk edit")
+        touch_course(self.course.id)
+        self.assertEqual(self.client.get(url).json()["problems"][0]["prompt"], "Bulk edit")
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_lesson_served_brotli_when_preferred(self):
+        url = reverse("lessons-detail", kwargs={"pk": self.lesson.id})
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(response.content)), plain.json())
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING="br", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_render_payloads_command(self):
+        out = StringIO()
+        call_command("render_payloads", stdout=out)
+        self.assertIn("1 courses", out.getvalue())
+        tree = RenderedPayload.objects.get(course=self.course, lesson__isnull=True)
+        self.assertEqual(json.loads(bytes(tree.body))["course"]["id"], self.course.id)
+
+        call_command("render_payloads", stdout=out)
+        self.assertIn("0 courses", out.getvalue())
+
+        # A lesson missing at the current version is filled in even though the tree is stored.
+        RenderedPayload.objects.filter(lesson=self.lesson).delete()
+        call_command("render_payloads", stdout=out)
+        self.assertIn("1 courses", out.getvalue().splitlines()[-1])
+        self.assertTrue(RenderedPayload.objects.filter(lesson=self.lesson).exists())
+
+
+class MeEnrollmentsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="dashboard", password="strongpass123")
+        self.client.force_authenticate(self.user)
+
+    def _enrolled_course(self, idx):
+        course = Course.objects.create(title=f"Course {idx}", slug=f"dash-{idx}")
+        module = Module.objects.create(course=course, title="M1", order=1)
+        lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        problem = Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="1")
+        Lesson.objects.create(module=module, title="L2", order=2)
+        Enrollment.objects.create(user=self.user, course=course)
+        return course, problem
+
+    def test_progress_refreshed_and_persisted(self):
+        course, problem = self._enrolled_course(0)
+        UserLessonProgress.objects.create(user=self.user, lesson=problem.lesson, solved_count=1, completed=True)
+
+        response = self.client.get(reverse("me-enrollments"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["progress_percent"], 50)
+        self.assertEqual(response.data[0]["course"]["progress_percent"], 50)
+        self.assertTrue(response.data[0]["course"]["enrolled"])
+        self.assertEqual(Enrollment.objects.get(user=self.user, course=course).progress_percent, 50)
+
+    def test_query_count_independent_of_enrollment_count(self):
+        self._enrolled_course(0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("me-enrollments"))
+        baseline = len(ctx.captured_queries)
+
+        for idx in range(1, 5):
+            self._enrolled_course(idx)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("me-enrollments"))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(ctx.captured_queries), baseline)
+        self.assertFalse(any(query["sql"].startswith("UPDATE") for query in ctx.captured_queries))
+
+
+    def test_sparse_fields_and_pages(self):
+        courses = [self._enrolled_course(idx)[0] for idx in range(3)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("me-enrollments"), {"fields": "id,course.title", "page_size": 2})
+        self.assertEqual([row["course"] for row in response.data["results"]], [{"title": "Course 0"}, {"title": "Course 1"}])
+        self.assertFalse(any("lessonprogress" in query["sql"] for query in ctx.captured_queries))
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([row["course"] for row in response.data["results"]], [{"title": "Course 2"}])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(reverse("me-enrollments"), {"fields": "course"})
+        self.assertEqual(response.data, [{"course": course.id} for course in courses])
+
+
+@override_settings(LEADERBOARD_SYNC_INTERVAL=60)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        reset_leaderboards()
+        self.client = APIClient()
+        self.course = Course.objects.create(title="Olympiad", slug="olympiad", is_published=True)
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        self.problems = [
+            Problem.objects.create(lesson=lesson, order=idx, prompt="?", correct_answer=str(idx), points=idx)
+            for idx in range(1, 4)
+        ]
+        self.users = [User.objects.create_user(username=f"olymp{idx}", password="strongpass123") for idx in range(4)]
+
+    def solve(self, user, *problems):
+        with self.captureOnCommitCallbacks(execute=True):
+            for problem in problems:
+                grade_attempt(user, problem, problem.correct_answer)
+
+    def test_rank_index_matches_sorted_list(self):
+        rng = random.Random(7)
+        index, reference = RankIndex(seed=1), []
+        for _ in range(2000):
+            if reference and rng.random() < 0.4:
+                key = reference.pop(rng.randrange(len(reference)))
+                index.remove(key)
+            else:
+                key = (rng.randint(0, 50), rng.random())
+                reference.append(key)
+                index.insert(key)
+        reference.sort()
+        self.assertEqual(index.slice(0, len(index)), reference)
+        for position in range(0, len(reference), 37):
+            self.assertEqual(index.rank(reference[position]), position)
+            self.assertEqual(index.slice(position, position + 3), reference[position : position + 3])
+
+    def test_points_awarded_once_per_problem(self):
+        self.solve(self.users[0], self.problems[2], self.problems[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            grade_attempts(self.users[0], [(self.problems[2], "3"), (self.problems[1], "2"), (self.problems[1], "2")])
+
+        self.assertEqual(UserCoursePoints.objects.get(user=self.users[0], course=self.course).points, 5)
+        self.assertEqual(get_leaderboards().top(self.course.id, 10)[1][0]["points"], 5)
+
+    def test_top_and_around(self):
+        self.solve(self.users[0], self.problems[0])
+        self.solve(self.users[1], self.problems[2])
+        self.solve(self.users[2], self.problems[0])
+        self.solve(self.users[3], *self.problems)
+
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get(reverse("leaderboard"), {"course": self.course.id, "limit": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["ranked_users"], 4)
+        # Equal scores rank by who reached them first.
+        self.assertEqual(
+            [(entry["rank"], entry["username"], entry["points"]) for entry in response.data["results"]],
+            [(1, "olymp3", 6), (2, "olymp1", 3), (3, "olymp0", 1)],
+        )
+
+        mine = self.client.get(reverse("leaderboard-me"), {"around": 1})
+        self.assertEqual(mine.data["rank"], 4)
+        self.assertEqual([entry["username"] for entry in mine.data["results"]], ["olymp0", "olymp2"])
+
+        self.client.force_authenticate(User.objects.create_user(username="newcomer", password="strongpass123"))
+        unranked = self.client.get(reverse("leaderboard-me"), {"course": self.course.id})
+        self.assertIsNone(unranked.data["rank"])
+        self.assertEqual(unranked.data["results"], [])
+
+        missing = self.client.get(reverse("leaderboard"), {"course": 999999})
+        self.assertEqual(missing.status_code, 404)
+
+    def test_rebuilt_from_table_and_synced_from_other_processes(self):
+        self.solve(self.users[0], self.problems[0])
+        self.assertEqual(get_leaderboards().top(None, 10)[0], 1)
+
+        # Rows written by another process only show up on the next sync.
+        UserCoursePoints.objects.create(user=self.users[1], course=self.course, points=9)
+        self.assertEqual(get_leaderboards().top(None, 10)[0], 1)
+        with override_settings(LEADERBOARD_SYNC_INTERVAL=0):
+            self.assertEqual(get_leaderboards().top(None, 10)[1][0]["user_id"], self.users[1].id)
+
+        reset_leaderboards()
+        ranked, entries = get_leaderboards().top(self.course.id, 10)
+        self.assertEqual(ranked, 2)
+        self.assertEqual([entry["points"] for entry in entries], [9, 1])
+
+    @override_settings(LEADERBOARD_SYNC_INTERVAL=0)
+    def test_delete_and_insert_between_syncs_rebuilds(self):
+        self.solve(self.users[0], self.problems[0])
+        self.assertEqual(get_leaderboards().top(None, 10)[0], 1)
+
+        # Another process deletes one row and inserts another: the row count is unchanged.
+        UserCoursePoints.objects.filter(user=self.users[0]).delete()
+        UserCoursePoints.objects.create(user=self.users[1], course=self.course, points=2)
+        ranked, entries = get_leaderboards().top(None, 10)
+        self.assertEqual((ranked, [entry["user_id"] for entry in entries]), (1, [self.users[1].id]))
+
+    @override_settings(LEADERBOARD_SYNC_INTERVAL=0, CATALOGUE_CHECK_INTERVAL=0)
+    def test_unpublished_courses_do_not_count(self):
+        draft = Course.objects.create(title="Draft", slug="draft", is_published=False)
+        UserCoursePoints.objects.create(user=self.users[0], course=draft, points=50)
+        self.solve(self.users[1], self.problems[0])
+        self.assertEqual([entry["user_id"] for entry in get_leaderboards().top(None, 10)[1]], [self.users[1].id])
+
+        draft.is_published = True
+        draft.save()
+        entries = get_leaderboards().top(None, 10)[1]
+        self.assertEqual(
+            [(entry["user_id"], entry["points"]) for entry in entries], [(self.users[0].id, 50), (self.users[1].id, 1)]
+        )
+
+    @override_settings(LEADERBOARD_SYNC_INTERVAL=0)
+    def test_readers_are_not_blocked_by_a_sync(self):
+        current = get_leaderboards()
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_sync(boards):
+            entered.set()
+            release.wait(5)
+            return boards
+
+        with mock.patch("main.leaderboard.sync_leaderboards", side_effect=slow_sync):
+            syncing = threading.Thread(target=get_leaderboards)
+            syncing.start()
+            try:
+                self.assertTrue(entered.wait(5))
+                started = time.monotonic()
+                self.assertIs(get_leaderboards(), current)
+                self.assertLess(time.monotonic() - started, 1)
+            finally:
+                release.set()
+                syncing.join()
+
+
+class AnalyticsRollupTests(TestCase):
+    def setUp(self):
+        course = Course.objects.create(title="Stats", slug="stats")
+        module = Module.objects.create(course=course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        self.p1 = Problem.objects.create(lesson=self.lesson, order=1, prompt="?", correct_answer="1")
+        self.p2 = Problem.objects.create(lesson=self.lesson, order=2, prompt="?", correct_answer="2")
+        self.u1 = User.objects.create_user(username="stat1", password="strongpass123")
+        self.u2 = User.objects.create_user(username="stat2", password="strongpass123")
+        day1 = timezone.now() - timedelta(days=2)
+        day2 = day1 + timedelta(days=1)
+        self.day1, self.day2 = timezone.localdate(day1), timezone.localdate(day2)
+
+        for user, problem, correct, created_at in [
+            (self.u1, self.p1, False, day1),
+            (self.u2, self.p1, True, day1),
+            (self.u1, self.p1, True, day1 + timedelta(minutes=1)),
+            (self.u2, self.p1, True, day2),
+            (self.u1, self.p2, True, day2),
+        ]:
+            Attempt.objects.create(user=user, problem=problem, submitted_answer="x", is_correct=correct, created_at=created_at)
+
+    def test_admin_filters_attempts_by_course(self):
+        other = Course.objects.create(title="Other", slug="other")
+        lesson = Lesson.objects.create(module=Module.objects.create(course=other, title="M", order=1), title="L", order=1)
+        problem = Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="1")
+        attempt = Attempt.objects.create(user=self.u1, problem=problem, submitted_answer="1", is_correct=True)
+
+        admin = User.objects.create_superuser(username="admin", password="strongpass123")
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin:main_attempt_changelist"), {"course": other.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.pk for row in response.context["cl"].result_list], [attempt.pk])
+
+    def snapshot(self):
+        problem_rows = ProblemDailyStats.objects.values_list(
+            "problem_id", "day", "attempts", "correct_attempts", "unique_solvers", "median_attempts_to_solve"
+        )
+        lesson_rows = LessonDailyStats.objects.values_list(
+            "lesson_id", "day", "attempts", "correct_attempts", "unique_solvers", "median_attempts_to_solve"
+        )
+        return sorted(problem_rows), sorted(lesson_rows)
+
+    def test_histogram_median(self):
+        self.assertEqual(histogram_median({1: 1, 2: 1}), 1.5)
+        self.assertEqual(histogram_median({"3": 2, "1": 1}), 3)
+        self.assertIsNone(histogram_median({}))
+
+    def test_rollup_counts_first_solves_and_completions(self):
+        self.assertEqual(rollup_attempts(), 5)
+        self.assertEqual(rollup_attempts(), 0)
+
+        problems, lessons = self.snapshot()
+        self.assertEqual(
+            problems,
+            [
+                (self.p1.id, self.day1, 3, 2, 2, 1.5),
+                (self.p1.id, self.day2, 1, 1, 0, None),
+                (self.p2.id, self.day2, 1, 1, 1, 1.0),
+            ],
+        )
+        # stat1 finished both problems on day 2 after three attempts in the lesson.
+        self.assertEqual(lessons, [(self.lesson.id, self.day1, 3, 2, 0, None), (self.lesson.id, self.day2, 2, 2, 1, 3.0)])
+
+    def test_incremental_batches_match_full_rebuild(self):
+        rollup_attempts(batch_size=2, limit=3)
+        rollup_attempts(batch_size=1)
+        incremental = self.snapshot()
+
+        call_command("rollup_analytics", "--rebuild", stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_analytics_endpoints_are_staff_only(self):
+        rollup_attempts()
+        client = APIClient()
+        url = reverse("analytics-lesson-problems", kwargs={"lesson_id": self.lesson.id})
+
+        client.force_authenticate(self.u1)
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username="teacher", password="strongpass123", is_staff=True))
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["problem_id"] for row in response.data], [self.p1.id, self.p2.id])
+        self.assertEqual(response.data[0]["solve_rate"], 0.75)
+
+        daily = client.get(
+            reverse("analytics-lesson-daily", kwargs={"lesson_id": self.lesson.id}), {"start": self.day2.isoformat()}
+        )
+        self.assertEqual([row["unique_solvers"] for row in daily.data], [1])
+        problem_daily = client.get(reverse("analytics-problem-daily", kwargs={"problem_id": self.p1.id}))
+        self.assertEqual(len(problem_daily.data), 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="exporter", password="strongpass123", is_staff=True)
+        self.student = User.objects.create_user(username="exported", password="strongpass123")
+        self.courses, problems = [], []
+        for idx in range(2):
+            course = Course.objects.create(title=f"Export {idx}", slug=f"export-{idx}")
+            module = Module.objects.create(course=course, title="M1", order=1)
+            lesson = Lesson.objects.create(module=module, title="L1", order=1)
+            problems.append(Problem.objects.create(lesson=lesson, order=1, prompt="?", correct_answer="1"))
+            self.courses.append(course)
+            Enrollment.objects.create(user=self.student, course=course)
+
+        # Shared timestamps exercise the id tie-breaker of the keyset.
+        self.now = timezone.now()
+        moments = [self.now - timedelta(days=3)] * 3 + [self.now - timedelta(days=1)] * 4
+        for idx, created_at in enumerate(moments):
+            Attempt.objects.create(
+                user=self.student if idx % 2 else self.staff,
+                problem=problems[idx % 2],
+                submitted_answer=str(idx),
+                is_correct=idx % 3 == 0,
+                created_at=created_at,
+            )
+
+    def test_keyset_pages_cover_every_row_once_in_order(self):
+        rows = list(export_rows("attempts", chunk_size=2))
+        expected = list(Attempt.objects.order_by("created_at", "id").values_list("id", flat=True))
+        self.assertEqual([row[0] for row in rows], expected)
+
+    def test_filters(self):
+        by_course = list(export_rows("attempts", course_id=self.courses[1].id, chunk_size=2))
+        self.assertEqual({row[5] for row in by_course}, {self.courses[1].id})
+        by_user = list(export_rows("attempts", user_id=self.staff.id))
+        self.assertEqual({row[2] for row in by_user}, {self.staff.id})
+        recent = list(export_rows("attempts", start=timezone.localdate(self.now - timedelta(days=1))))
+        self.assertEqual(len(recent), 4)
+        older = list(export_rows("attempts", end=timezone.localdate(self.now - timedelta(days=2))))
+        self.assertEqual(len(older), 3)
+
+    def test_staff_endpoint_streams_ndjson_and_csv(self):
+        client = APIClient()
+        url = reverse("export", kwargs={"kind": "attempts", "output_format": "ndjson"})
+        client.force_authenticate(self.student)
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.get(url, {"course": self.courses[0].id})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(set(lines[0]), set(EXPORTS["attempts"].headers))
+
+        csv_response = client.get(reverse("export", kwargs={"kind": "enrollments", "output_format": "csv"}))
+        content = b"".join(csv_response.streaming_content).decode().splitlines()
+        self.assertEqual(content[0], "id,created_at,user_id,course_id,progress_percent")
+        self.assertEqual(len(content), 3)
+
+        missing = client.get(reverse("export", kwargs={"kind": "users", "output_format": "csv"}))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_csv_neutralises_formula_answers(self):
+        Attempt.objects.filter(submitted_answer="1").update(submitted_answer='=HYPERLINK("http://evil.example","x")')
+        rows = list(csv.reader(render_csv(EXPORTS["attempts"].headers, export_rows("attempts"))))
+        answers = {row[-1] for row in rows[1:]}
+        self.assertIn('\'=HYPERLINK("http://evil.example","x")', answers)
+        self.assertIn("2", answers)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_data", "enrollments", "--format", "csv", "--user", str(self.student.id), stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+@override_settings(CATALOGUE_CHECK_INTERVAL=60)
+class MeAttemptsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="historian", password="strongpass123")
+        other = User.objects.create_user(username="bystander", password="strongpass123")
+        self.courses, self.problems = [], []
+        for idx in range(2):
+            course = Course.objects.create(title=f"History {idx}", slug=f"history-{idx}")
+            module = Module.objects.create(course=course, title="M1", order=1)
+            lesson = Lesson.objects.create(module=module, title="L1", order=1)
+            for order in (1, 2):
+                self.problems.append(Problem.objects.create(lesson=lesson, order=order, prompt="?", correct_answer="1"))
+            self.courses.append(course)
+
+        now = timezone.now()
+        for idx in range(9):
+            # Pairs of attempts share a timestamp to exercise the id tie-breaker.
+            Attempt.objects.create(
+                user=self.user,
+                problem=self.problems[idx % 3],
+                submitted_answer=str(idx),
+                created_at=now - timedelta(minutes=10 - idx // 2),
+            )
+        Attempt.objects.create(user=other, problem=self.problems[0], submitted_answer="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_catalogue()
+
+    def collect(self, params):
+        ids, url = [], reverse("me-attempts")
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.data["results"])
+            url, params = response.data["next"], None
+        return ids
+
+    def test_cursor_pages_follow_created_at_desc_then_id(self):
+        expected = list(Attempt.objects.filter(user=self.user).order_by("-created_at", "id").values_list("id", flat=True))
+        self.assertEqual(self.collect({"page_size": 2}), expected)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("me-attempts"), {"page_size": 2})
+        with self.assertNumQueries(1):
+            self.client.get(response.data["next"])
+
+    def test_filters_and_latest_mode(self):
+        first_course = self.collect({"course": self.courses[0].id})
+        problem_ids = set(Attempt.objects.filter(id__in=first_course).values_list("problem_id", flat=True))
+        self.assertEqual(problem_ids, {self.problems[0].id, self.problems[1].id})
+        only_third = self.collect({"lesson": self.problems[2].lesson_id, "problem": self.problems[2].id})
+        self.assertEqual(len(only_third), 3)
+        self.assertEqual(self.collect({"course": self.courses[0].id, "problem": self.problems[2].id}), [])
+
+        latest = self.client.get(reverse("me-attempts"), {"course": self.courses[0].id, "latest": "true"}).data["results"]
+        self.assertEqual([row["submitted_answer"] for row in latest], ["6", "7"])
+        latest = self.client.get(reverse("me-attempts"), {"lesson": self.problems[2].lesson_id, "latest": "1"}).data
+        self.assertEqual([row["submitted_answer"] for row in latest["results"]], ["8"])
+        self.assertEqual(latest["results"][0]["course"], self.courses[1].id)
+
+    def test_latest_mode_needs_a_scope(self):
+        # Unscoped, every problem on the site would be a candidate.
+        response = self.client.get(reverse("me-attempts"), {"latest": "true"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("latest", response.data)
+        self.assertEqual(len(attempt_history(self.user, problem_ids=[self.problems[3].id], latest=True)), 0)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("me-attempts"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class QueryBudgetTests(TestCase):
+    def test_endpoints_within_query_budget(self):
+        results = run_benchmarks(sizes=("small", "medium"), iterations=3)
+
+        self.assertEqual(set(results["small"]), set(QUERY_BUDGETS))
+        self.assertEqual(budget_violations(results), [])
+
+    def test_generated_dataset_is_rolled_up(self):
+        generate_dataset("small")
+
+        self.assertGreater(Attempt.objects.count(), 0)
+        self.assertEqual(LessonDailyStats.objects.aggregate(total=Sum("attempts"))["total"], Attempt.objects.count())
+
+    def test_every_route_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(route=pattern.name):
+                self.assertTrue(any(name == pattern.name or name.startswith(f"{pattern.name}-") for name in QUERY_BUDGETS))
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_apply_tuned_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], int(settings.SQLITE_OPTIONS["timeout"] * 1000))
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+        self.assertTrue(connection.settings_dict["CONN_HEALTH_CHECKS"])
+
+    def test_async_read_views_default_to_per_request_connections(self):
+        profiles = {}
+        for async_views in ("False", "True"):
+            with mock.patch.dict(os.environ, {"DJANGO_ASYNC_READ_VIEWS": async_views}):
+                os.environ.pop("DJANGO_CONN_MAX_AGE", None)
+                module = importlib.reload(importlib.import_module("config.settings"))
+                profiles[async_views] = module.CONN_MAX_AGE
+        importlib.reload(importlib.import_module("config.settings"))
+        self.assertEqual(profiles, {"False": 60, "True": 0})
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        reset_metrics()
+        cache.clear()
+        shared_course_lists.forget()
+        self.client = APIClient()
+        self.course = Course.objects.create(title="Metrics", slug="metrics")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        Lesson.objects.create(module=module, title="L1", order=1)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("courses-tree", kwargs={"course_id": self.course.id}))
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn("view;dur=", timing)
+        self.assertIn("render;dur=", timing)
+        self.assertIn("lesson_completion_map;dur=", timing)
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        self.client.get(reverse("courses-list"))
+        self.client.get(reverse("courses-list"))
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        member = User.objects.create_user(username="member", password="strongpass123")
+        member_token = RefreshToken.for_user(member).access_token
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION=f"Bearer {member_token}")
+        self.assertEqual(response.status_code, 403)
+
+        staff = User.objects.create_user(username="ops", password="strongpass123", is_staff=True)
+        staff_token = RefreshToken.for_user(staff).access_token
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION=f"Bearer {staff_token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="api/v1/courses/",method="GET",status="200"} 2', body)
+        self.assertIn('http_db_queries_bucket{route="api/v1/courses/",method="GET",le="+Inf"} 2', body)
+        self.assertIn("# TYPE http_response_bytes histogram", body)
+
+    def test_metrics_endpoint_accepts_scrape_token(self):
+        self.assertEqual(
+            self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret").status_code, 401
+        )
+        with override_settings(METRICS_TOKEN="scrape-secret"):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret")
+            self.assertEqual(response.status_code, 200)
+            wrong = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong-secret")
+            self.assertEqual(wrong.status_code, 401)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shared_course_lists.forget()
+        self.client = APIClient()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(username="async", password="strongpass123")
+        self.course = Course.objects.create(title="Async", slug="async")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1, content="Текст")
+        problem = Problem.objects.create(lesson=self.lesson, order=1, prompt="?", correct_answer="1")
+        grade_attempt(self.user, problem, "1")
+        self.auth_header = f"Bearer {RefreshToken.for_user(self.user).access_token}"
+
+    def test_views_are_natively_async(self):
+        for view in (
+            async_views.HealthView,
+            async_views.CourseListView,
+            async_views.CourseDetailView,
+            async_views.CourseTreeView,
+            async_views.LessonDetailView,
+        ):
+            self.assertTrue(view.view_is_async, view.__name__)
+
+    async def test_async_requests_report_their_queries(self):
+        middleware = RequestMetricsMiddleware(ASGIHandler()._get_response_async)
+        self.assertTrue(iscoroutinefunction(middleware.process_view))
+        self.assertTrue(iscoroutinefunction(middleware.process_template_response))
+
+        client = AsyncClient()
+        for path in (
+            reverse("courses-detail", kwargs={"course_ref": "async"}),
+            reverse("lessons-detail", kwargs={"pk": self.lesson.id}),
+        ):
+            response = await client.get(path)
+            queries = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response["Server-Timing"])
+            self.assertGreater(int(queries.group(1)), 0, path)
+
+    async def _async_json(self, view, path, authenticated=False, **kwargs):
+        headers = {"Authorization": self.auth_header} if authenticated else {}
+        response = await view.as_view()(self.factory.get(path, headers=headers), **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    def _sync_json(self, path, authenticated=False):
+        headers = {"HTTP_AUTHORIZATION": self.auth_header} if authenticated else {}
+        response = self.client.get(path, **headers)
+        return response.status_code, json.loads(response.content)
+
+    async def test_async_payloads_match_sync_views(self):
+        cases = [
+            (async_views.CourseListView, reverse("courses-list"), {}),
+            (async_views.CourseDetailView, reverse("courses-detail", kwargs={"course_ref": "async"}), {"course_ref": "async"}),
+            (async_views.CourseTreeView, reverse("courses-tree", kwargs={"course_id": self.course.id}), {"course_id": self.course.id}),
+            (async_views.LessonDetailView, reverse("lessons-detail", kwargs={"pk": self.lesson.id}), {"pk": self.lesson.id}),
+        ]
+        for view, path, kwargs in cases:
+            for authenticated in (False, True):
+                expected = await sync_to_async(self._sync_json)(path, authenticated)
+                self.assertEqual(await self._async_json(view, path, authenticated, **kwargs), expected, path)
+
+    async def test_cached_course_list_skips_the_thread_hop(self):
+        await aget_catalogue()
+        first = await self._async_json(async_views.CourseListView, reverse("courses-list"), authenticated=True)
+        with mock.patch("main.async_views.sync_to_async", side_effect=AssertionError("thread hop")):
+            again = await self._async_json(async_views.CourseListView, reverse("courses-list"), authenticated=True)
+        self.assertEqual(again, first)
+
+    async def test_async_etags_match_sync_views(self):
+        for view, path, kwargs in (
+            (async_views.CourseDetailView, reverse("courses-detail", kwargs={"course_ref": "async"}), {"course_ref": "async"}),
+            (async_views.CourseTreeView, reverse("courses-tree", kwargs={"course_id": self.course.id}), {"course_id": self.course.id}),
+            (async_views.LessonDetailView, reverse("lessons-detail", kwargs={"pk": self.lesson.id}), {"pk": self.lesson.id}),
+        ):
+            etag = (await sync_to_async(self.client.get)(path))["ETag"]
+            response = await view.as_view()(self.factory.get(path), **kwargs)
+            self.assertEqual(response["ETag"], etag, path)
+            response = await view.as_view()(self.factory.get(path, headers={"If-None-Match": etag}), **kwargs)
+            self.assertEqual(response.status_code, 304, path)
+
+    async def test_async_errors(self):
+        status, body = await self._async_json(async_views.CourseTreeView, "/", course_id=999999)
+        self.assertEqual(status, 404)
+        self.assertIn("detail", body)
+
+        request = self.factory.get("/", headers={"Authorization": "Bearer broken"})
+        response = await async_views.CourseListView.as_view()(request)
+        self.assertEqual(response.status_code, 401)
+
+
+class WriteBehindIngestionTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="quiz", password="strongpass123")
+        course = Course.objects.create(title="Quiz", slug="quiz")
+        module = Module.objects.create(course=course, title="M1", order=1)
+        lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        self.problems = [
+            Problem.objects.create(lesson=lesson, order=idx, prompt="?", correct_answer=str(idx)) for idx in (1, 2)
+        ]
+
+    def tearDown(self):
+        shutdown_attempt_writer()
+
+    @override_settings(ATTEMPT_INGESTION_MODE="write_behind", ATTEMPT_DURABILITY="commit")
+    def test_commit_durability_stores_before_returning(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for problem in self.problems:
+            response = client.post(
+                reverse("attempt-submit"), data={"problem_id": problem.id, "answer": str(problem.order)}, format="json"
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNotNone(response.data["attempt_id"])
+
+        self.assertEqual(Attempt.objects.filter(user=self.user, is_correct=True).count(), 2)
+        self.assertEqual(response.data["lesson_progress"], 100)
+
+    def test_buffered_writes_flushed_on_stop(self):
+        writer = AttemptWriter(store_attempts, durability="buffered", flush_interval=0.5)
+        for _ in range(3):
+            writer.submit([build_attempt(self.user, problem, "1") for problem in self.problems])
+        writer.stop()
+
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(UserLessonProgress.objects.get(user=self.user).solved_count, 1)
+
+    def test_poisoned_attempt_only_fails_its_user(self):
+        other = User.objects.create_user(username="neighbour", password="strongpass123")
+        doomed = Problem.objects.create(lesson=self.problems[0].lesson, order=3, prompt="?", correct_answer="3")
+        poisoned = build_attempt(other, doomed, "3")
+        doomed.delete()
+
+        writer = AttemptWriter(store_attempts, durability="buffered", flush_interval=0.5)
+        writer.submit([build_attempt(self.user, problem, "1") for problem in self.problems])
+        writer.submit([poisoned])
+        writer.submit([build_attempt(self.user, self.problems[0], "2")])
+        with self.assertLogs("main.ingestion", "ERROR"):
+            writer.stop()
+
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(Attempt.objects.filter(user=other).exists())
+        self.assertEqual(writer.failed_attempts, 1)
+
+    def test_commit_durability_fails_only_the_affected_submit(self):
+        other = User.objects.create_user(username="neighbour", password="strongpass123")
+
+        def store(user_id, attempts):
+            if user_id == other.id:
+                raise ValueError("poisoned")
+            return store_attempts(user_id, attempts)
+
+        writer = AttemptWriter(store, flush_interval=0.2)
+        self.addCleanup(writer.stop)
+        results = {}
+
+        def submit(user):
+            try:
+                writer.submit([build_attempt(user, self.problems[0], "1")])
+                results[user.username] = "stored"
+            except AttemptWriteFailed:
+                results[user.username] = "failed"
+
+        threads = [threading.Thread(target=submit, args=(user,)) for user in (self.user, other)]
+        with self.assertLogs("main.ingestion", "ERROR"):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, {"quiz": "stored", "neighbour": "failed"})
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 1)
+
+    def test_full_queue_applies_backpressure(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def blocked_store(user_id, attempts):
+            entered.set()
+            release.wait(5)
+            return store_attempts(user_id, attempts)
+
+        writer = AttemptWriter(blocked_store, queue_size=1, durability="buffered", flush_interval=0.01, enqueue_timeout=0.01)
+        try:
+            writer.submit([build_attempt(self.user, self.problems[0], "1")])
+            self.assertTrue(entered.wait(5))
+            writer.submit([build_attempt(self.user, self.problems[0], "1")])
+            with self.assertRaises(AttemptQueueFull):
+                writer.submit([build_attempt(self.user, self.problems[0], "1")])
+        finally:
+            release.set()
+            writer.stop()
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 2)
+
+    def test_commit_timeout_withdraws_queued_attempts(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def blocked_store(user_id, attempts):
+            entered.set()
+            release.wait(5)
+            return store_attempts(user_id, attempts)
+
+        writer = AttemptWriter(blocked_store, flush_interval=0.01, commit_timeout=0.2)
+        first = threading.Thread(target=writer.submit, args=([build_attempt(self.user, self.problems[0], "1")],))
+        first.start()
+        try:
+            self.assertTrue(entered.wait(5))
+            # Still queued behind the blocked batch: the client is told to retry, so it must not be stored later.
+            with self.assertRaises(AttemptWriteFailed):
+                writer.submit([build_attempt(self.user, self.problems[1], "2")])
+        finally:
+            release.set()
+            first.join()
+            writer.stop()
+        self.assertEqual(list(Attempt.objects.values_list("problem_id", flat=True)), [self.problems[0].id])
+
+    def test_commit_timeout_during_write_reports_accepted(self):
+        def slow_store(user_id, attempts):
+            time.sleep(0.3)
+            return store_attempts(user_id, attempts)
+
+        writer = AttemptWriter(slow_store, flush_interval=0.01, commit_timeout=0.1)
+        writer.submit([build_attempt(self.user, self.problems[0], "1")])
+        writer.stop()
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 1)
+
+    def test_submit_racing_stop_is_refused(self):
+        writer = AttemptWriter(store_attempts, durability="buffered", flush_interval=0.01)
+        put = writer._queue.put
+
+        def stop_then_put(item, timeout=None):
+            # The writer thread finds an empty queue and exits before the item lands.
+            writer.stop()
+            put(item, timeout=timeout)
+
+        with mock.patch.object(writer._queue, "put", side_effect=stop_then_put):
+            with self.assertRaises(AttemptWriteFailed):
+                writer.submit([build_attempt(self.user, self.problems[0], "1")])
+        self.assertFalse(Attempt.objects.exists())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing against a second SQLite file kept in step by ``sync_replicas``."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Registered only in this thread's handler, outside settings.DATABASES.
+        primary = connections["default"]
+        replica = primary.__class__({**primary.settings_dict, "NAME": f"{directory.name}/replica.sqlite3"}, "replica1")
+        connections["replica1"] = replica
+        self.addCleanup(connections.__delitem__, "replica1")
+        self.addCleanup(replica.close)
+        replicas = override_settings(DATABASE_REPLICAS=["replica1"])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        cache.clear()
+        shared_course_lists.forget()
+        self.client = APIClient()
+        self.course = Course.objects.create(title="Synced", slug="synced")
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        self.lesson = Lesson.objects.create(module=module, title="L1", order=1)
+        sync_replicas()
+
+    def test_curriculum_reads_lag_until_sync(self):
+        Course.objects.create(title="Unsynced", slug="unsynced")
+        self.lesson.title = "Renamed"
+        self.lesson.save()
+
+        # The shared list body is computed on the primary, signed in or not.
+        self.client.force_authenticate(User.objects.create_user(username="reader", password="strongpass123"))
+        titles = [course["title"] for course in self.client.get(reverse("courses-list")).data]
+        self.assertEqual(titles, ["Synced", "Unsynced"])
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse("courses-detail", kwargs={"course_ref": "unsynced"})).status_code, 404)
+        self.assertEqual(self.client.get(reverse("lessons-detail", kwargs={"pk": self.lesson.id})).json()["title"], "L1")
+
+        call_command("sync_replicas", stdout=StringIO())
+        self.assertEqual(self.client.get(reverse("courses-detail", kwargs={"course_ref": "unsynced"})).status_code, 200)
+        self.assertEqual(self.client.get(reverse("lessons-detail", kwargs={"pk": self.lesson.id})).json()["title"], "Renamed")
+
+    def test_shared_course_list_is_not_stored_from_a_lagging_replica(self):
+        self.assertEqual([course["title"] for course in self.client.get(reverse("courses-list")).data], ["Synced"])
+        self.course.title = "Edited"
+        self.course.save()
+
+        # The replica still has "Synced"; the list stored under the new version must not.
+        self.assertEqual([course["title"] for course in self.client.get(reverse("courses-list")).data], ["Edited"])
+        sync_replicas()
+        self.assertEqual([course["title"] for course in self.client.get(reverse("courses-list")).data], ["Edited"])
+
+    def test_payload_missing_on_replica_is_served_from_primary(self):
+        RenderedPayload.objects.using("replica1").all().delete()  # Rendered after the replica was copied.
+        url = reverse("lessons-detail", kwargs={"pk": self.lesson.id})
+        version = Course.objects.get(pk=self.course.pk).content_version
+        with mock.patch("main.rendering.compress", side_effect=AssertionError("re-rendered")):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            # A miss on a lagging replica finds the stored row instead of compressing again.
+            with replica_reads():
+                self.assertIsNotNone(store_payload(self.course.id, self.lesson.id, version, b"{}").pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["title"], "L1")
+        self.assertFalse([query for query in ctx.captured_queries if not query["sql"].startswith("SELECT")])
+
+    def test_writes_and_user_state_stay_on_primary(self):
+        user = User.objects.create_user(username="fresh", password="strongpass123")
+        Enrollment.objects.create(user=user, course=self.course)
+        with replica_reads():
+            lesson = Lesson.objects.get(pk=self.lesson.pk)
+            self.assertEqual(lesson._state.db, "replica1")
+            self.assertTrue(Enrollment.objects.filter(user=user).exists())
+            lesson.title = "Edited"
+            lesson.save()
+            # Pinned after the write: the scope reads its own change.
+            self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).title, "Edited")
+        self.assertEqual(Lesson.objects.using("replica1").get(pk=self.lesson.pk).title, "L1")
+
+        with replica_reads():
+            self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).title, "L1")
+            with transaction.atomic():
+                self.assertEqual(Lesson.objects.get(pk=self.lesson.pk).title, "Edited")
@@ -1,31 +1,51 @@
+from django.conf import settings
 from django.urls import path
 
+from . import async_views, views
 from .views import (
+    AttemptBatchSubmitView,
     AttemptSubmitView,
-    CourseDetailView,
-    CourseListView,
-    CourseTreeView,
     EnrollView,
-    HealthView,
-    LessonDetailView,
+    ExportView,
+    LessonDailyStatsView,
+    LessonProblemStatsView,
+    LeaderboardView,
     LoginView,
+    MeAttemptsView,
     MeView,
+    MetricsView,
     MeEnrollmentsView,
+    MyLeaderboardView,
+    ProblemDailyStatsView,
     RefreshView,
     RegisterView,
 )
 
+# Hot read endpoints can be served by native async views under ASGI.
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
-    path("health/", HealthView.as_view(), name="health"),
+    path("health/", read_views.HealthView.as_view(), name="health"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("auth/register/", RegisterView.as_view(), name="auth-register"),
     path("auth/login/", LoginView.as_view(), name="auth-login"),
     path("auth/refresh/", RefreshView.as_view(), name="auth-refresh"),
     path("auth/me/", MeView.as_view(), name="auth-me"),
-    path("courses/", CourseListView.as_view(), name="courses-list"),
-    path("courses/<str:course_ref>/", CourseDetailView.as_view(), name="courses-detail"),
+    path("courses/", read_views.CourseListView.as_view(), name="courses-list"),
+    path("courses/<str:course_ref>/", read_views.CourseDetailView.as_view(), name="courses-detail"),
     path("courses/<int:course_id>/enroll/", EnrollView.as_view(), name="courses-enroll"),
-    path("courses/<int:course_id>/tree/", CourseTreeView.as_view(), name="courses-tree"),
-    path("lessons/<int:pk>/", LessonDetailView.as_view(), name="lessons-detail"),
+    path("courses/<int:course_id>/tree/", read_views.CourseTreeView.as_view(), name="courses-tree"),
+    path("lessons/<int:pk>/", read_views.LessonDetailView.as_view(), name="lessons-detail"),
     path("attempts/submit/", AttemptSubmitView.as_view(), name="attempt-submit"),
+    path("attempts/submit-batch/", AttemptBatchSubmitView.as_view(), name="attempt-submit-batch"),
     path("me/enrollments/", MeEnrollmentsView.as_view(), name="me-enrollments"),
+    path("me/attempts/", MeAttemptsView.as_view(), name="me-attempts"),
+    path("leaderboard/", LeaderboardView.as_view(), name="leaderboard"),
+    path("leaderboard/me/", MyLeaderboardView.as_view(), name="leaderboard-me"),
+    path("analytics/problems/<int:problem_id>/daily/", ProblemDailyStatsView.as_view(), name="analytics-problem-daily"),
+    path("analytics/lessons/<int:lesson_id>/daily/", LessonDailyStatsView.as_view(), name="analytics-lesson-daily"),
+    path("exports/<str:kind>.<str:output_format>", ExportView.as_view(), name="export"),
+    path(
+        "analytics/lessons/<int:lesson_id>/problems/", LessonProblemStatsView.as_view(), name="analytics-lesson-problems"
+    ),
 ]
@@ -1,5 +1,8 @@
+import hashlib
+
 from django.contrib.auth.models import User
-from django.db.models import Count
+from django.db.models import F
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
@@ -8,20 +11,60 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from .models import Course, Enrollment, Lesson, Problem
+from .analytics import filter_days, lesson_problem_summaries
+from .authentication import MetricsTokenAuthentication, StatelessJWTAuthentication, add_user_claims, full_user
+from .catalogue import get_catalogue, overlay_course_tree
+from .conditional import course_etag, course_tree_etag, lesson_etag, not_modified, revalidating, tagged
+from .exports import CONTENT_TYPES, EXPORTS, stream_export
+from .fieldsets import field_selection
+from .leaderboard import get_leaderboards
+from .metrics import render_metrics
+from .models import Course, Enrollment, Lesson, LessonDailyStats, Problem, ProblemDailyStats
+from .pagination import KeysetPaginator
+from .permissions import CanReadMetrics
+from .rendering import (
+    accepted_encodings,
+    course_tree_payload,
+    lesson_payload,
+    negotiated_not_modified,
+    payload_response,
+    render_json,
+    store_payload,
+)
+from .replicas import ReplicaReadsMixin, primary_reads
 from .serializers import (
+    AnalyticsRangeSerializer,
+    AttemptBatchSubmitSerializer,
+    AttemptHistoryPageSerializer,
+    AttemptHistoryQuerySerializer,
     AttemptResultSerializer,
     AttemptSubmitSerializer,
     CourseDetailSerializer,
     CourseListSerializer,
-    CourseTreeSerializer,
     EnrollResponseSerializer,
     EnrollmentSerializer,
+    ExportQuerySerializer,
+    LeaderboardQuerySerializer,
+    LeaderboardSerializer,
+    LessonDailyStatsSerializer,
     LessonDetailSerializer,
+    ProblemDailyStatsSerializer,
+    ProblemSummarySerializer,
     RegisterSerializer,
     UserSerializer,
 )
-from .services import compute_course_progress, compute_lesson_completion, grade_attempt, upsert_enrollment_progress
+from .services import (
+    annotate_course_counts,
+    attempt_history,
+    course_progress,
+    course_user_states,
+    grade_attempt,
+    grade_attempts,
+    lesson_completion_map,
+    refresh_enrollments_progress,
+    upsert_enrollment_progress,
+)
+from .singleflight import CachedFlight
 
 
 class HealthView(APIView):
@@ -31,6 +74,15 @@ class HealthView(APIView):
         return Response({"status": "ok", "service": "math-edu-backend"})
 
 
+class MetricsView(APIView):
+    # Per-route traffic and latency are operational data: staff or the scrape token only.
+    authentication_classes = [MetricsTokenAuthentication, StatelessJWTAuthentication]
+    permission_classes = [CanReadMetrics]
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
@@ -40,7 +92,7 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = add_user_claims(RefreshToken.for_user(user), user, version=1)
         return Response(
             {
                 "access": str(refresh.access_token),
@@ -54,9 +106,7 @@ class RegisterView(generics.CreateAPIView):
 class LoginTokenSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user)
-        token["username"] = user.username
-        return token
+        return add_user_claims(super().get_token(user), user)
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -77,34 +127,85 @@ class MeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        return Response(UserSerializer(request.user).data)
+        return Response(UserSerializer(full_user(request.user)).data)
+
+
+COURSE_ORDERING = ("title", "id")
+ENROLLMENT_ORDERING = ("created_at", "id")
+
+shared_course_lists = CachedFlight("course-list")
+
+
+def shared_course_list(request, selection, paginator, version):
+    """The course list body for ``request`` rendered without a user, plus each row's ``(id, lessons_count)``.
+
+    The body depends only on the URL and the catalogue, so concurrent requests,
+    signed in or not, share one computation (see main.singleflight); user state
+    is added per request afterwards. It is read from the primary, like the
+    catalogue version it is stored under: a lagging replica would pin its old
+    list to the new version.
+    """
+
+    def compute():
+        serializer = CourseListSerializer(selection=selection)
+        queryset = serializer.prepare_queryset(
+            Course.objects.filter(is_published=True).order_by(*COURSE_ORDERING), None, *COURSE_ORDERING
+        )
+        paginate = paginator.requested(request)
+        with primary_reads():
+            courses, next_url = paginator.paginate(queryset, request) if paginate else (list(queryset), None)
+        data = CourseListSerializer(courses, many=True, selection=selection).data
+        body = {"next": next_url, "results": data} if paginate else data
+        return body, [(course.id, getattr(course, "lessons_count", 0)) for course in courses]
+
+    return shared_course_lists.get(course_list_key(request), version, compute)[0]
+
+
+def course_list_key(request) -> str:
+    return hashlib.blake2b(request.build_absolute_uri().encode(), digest_size=16).hexdigest()
+
+
+def add_course_user_state(body, serializer, courses, states):
+    """``body`` with the user's enrollment and progress filled into each course row."""
+    if isinstance(body, dict):
+        return {**body, "results": serializer.add_user_state(body["results"], courses, states)}
+    return serializer.add_user_state(body, courses, states)
 
 
-class CourseListView(generics.ListAPIView):
+class CourseListView(ReplicaReadsMixin, generics.ListAPIView):
     serializer_class = CourseListSerializer
     permission_classes = [permissions.AllowAny]
+    paginator = KeysetPaginator(COURSE_ORDERING)
 
-    def get_queryset(self):
-        return (
-            Course.objects.filter(is_published=True)
-            .annotate(
-                modules_count=Count("modules", distinct=True),
-                lessons_count=Count("modules__lessons", distinct=True),
-            )
-            .order_by("title")
-        )
+    def list(self, request, *args, **kwargs):
+        selection = field_selection(request, CourseListSerializer)
+        serializer = CourseListSerializer(selection=selection)
+        body, courses = shared_course_list(request, selection, self.paginator, get_catalogue().version)
+        if request.user.is_authenticated and serializer.needs_user_state() and courses:
+            # User state is read from the primary, like every other user-state read.
+            with primary_reads():
+                states = list(course_user_states(request.user, [course_id for course_id, _ in courses]))
+            body = add_course_user_state(body, serializer, courses, states)
+        return Response(body)
 
 
-class CourseDetailView(generics.RetrieveAPIView):
+class CourseDetailView(ReplicaReadsMixin, generics.RetrieveAPIView):
     serializer_class = CourseDetailSerializer
     permission_classes = [permissions.AllowAny]
 
-    def get_object(self):
+    def retrieve(self, request, *args, **kwargs):
         course_ref = self.kwargs["course_ref"]
-        queryset = Course.objects.filter(is_published=True)
-        if course_ref.isdigit():
-            return get_object_or_404(queryset, id=int(course_ref))
-        return get_object_or_404(queryset, slug=course_ref)
+        lookup = {"id": int(course_ref)} if course_ref.isdigit() else {"slug": course_ref}
+        output_format = request.accepted_renderer.format
+        if revalidating(request):
+            row = Course.objects.filter(is_published=True, **lookup).values_list("id", "content_version").first()
+            response = not_modified(request, course_etag(*row, output_format)) if row else None
+            if response is not None:
+                return response
+
+        course = get_object_or_404(annotate_course_counts(Course.objects.filter(is_published=True)), **lookup)
+        response = Response(self.get_serializer(course).data)
+        return tagged(response, course_etag(course.id, course.content_version, output_format))
 
 
 class EnrollView(APIView):
@@ -118,25 +219,79 @@ class EnrollView(APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
 
-class CourseTreeView(APIView):
+class CourseTreeView(ReplicaReadsMixin, APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, course_id):
-        course = get_object_or_404(Course.objects.prefetch_related("modules__lessons"), id=course_id, is_published=True)
-        progress = compute_course_progress(request.user, course) if request.user.is_authenticated else 0
-        payload = {
-            "course": CourseDetailSerializer(course).data,
-            "modules": CourseTreeSerializer(context={"request": request}).get_modules(course),
-            "course_progress": progress,
-        }
-        return Response(payload)
-
-
-class LessonDetailView(generics.RetrieveAPIView):
-    queryset = Lesson.objects.select_related("module", "module__course").prefetch_related("problems")
+        course = get_catalogue().published_course(course_id)
+        if course is None:
+            raise Http404("No Course matches the given query.")
+        completion = lesson_completion_map(course.id, request.user, lesson_ids=course.lesson_ids)
+        completed = [lesson for lesson, done in completion.items() if done]
+        output_format = request.accepted_renderer.format
+        # Tagged with the snapshot's version, which the body is built from.
+        etag = course_tree_etag(course.id, course.content_version, completed, output_format)
+        # Without progress the body is the same for everyone, so it can be served pre-rendered.
+        prerendered = not completed and output_format == "json"
+        encodings = accepted_encodings(request) if prerendered else ["identity"]
+        response = negotiated_not_modified(request, etag, encodings, vary=["Authorization"])
+        if response is not None:
+            return response
+
+        if prerendered:
+            return payload_response(course_tree_payload(course), encodings, etag, vary=["Authorization"])
+        return tagged(Response(overlay_course_tree(course.tree, completion)), etag, vary=["Authorization"])
+
+
+class LessonDetailView(ReplicaReadsMixin, generics.RetrieveAPIView):
     serializer_class = LessonDetailSerializer
     permission_classes = [permissions.AllowAny]
 
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs["pk"]
+        selection = field_selection(request, LessonDetailSerializer)
+        output_format = request.accepted_renderer.format
+        prerendered = selection is None and output_format == "json"
+        encodings = accepted_encodings(request) if prerendered else ["identity"]
+        if revalidating(request):
+            version = Lesson.objects.filter(pk=pk).values_list("module__course__content_version", flat=True).first()
+            if version:
+                response = negotiated_not_modified(request, lesson_etag(request, pk, version, output_format), encodings)
+                if response is not None:
+                    return response
+        if prerendered:
+            payload = lesson_payload(pk, encodings)
+            if payload is not None:
+                return payload_response(payload, encodings, lesson_etag(request, pk, payload.content_version))
+
+        serializer = LessonDetailSerializer(selection=selection)
+        queryset = serializer.prepare_queryset(Lesson.objects.all()).annotate(
+            content_version=F("module__course__content_version")
+        )
+        lesson = serializer.instance = get_object_or_404(queryset, pk=pk)
+        etag = lesson_etag(request, pk, lesson.content_version, output_format)
+        if prerendered:
+            payload = store_payload(lesson.module.course_id, pk, lesson.content_version, render_json(serializer.data))
+            return payload_response(payload, encodings, etag)
+        return tagged(Response(serializer.data), etag)
+
+
+def attempt_result(attempt, lesson_progress, course_progress):
+    return {
+        "attempt_id": attempt.id,
+        "is_correct": attempt.is_correct,
+        "awarded_points": attempt.awarded_points,
+        "lesson_progress": lesson_progress,
+        "course_progress": course_progress,
+        "correct_answer_if_wrong": None if attempt.is_correct else attempt.problem.correct_answer,
+    }
+
+
+def sync_enrollment_progress(user, course_id, progress):
+    Enrollment.objects.filter(user=user, course_id=course_id).exclude(progress_percent=progress).update(
+        progress_percent=progress
+    )
+
 
 class AttemptSubmitView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -145,40 +300,200 @@ class AttemptSubmitView(APIView):
         serializer = AttemptSubmitSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        problem = get_object_or_404(Problem.objects.select_related("lesson", "lesson__module", "lesson__module__course"), id=serializer.validated_data["problem_id"])
-        attempt = grade_attempt(request.user, problem, serializer.validated_data["answer"])
+        record = get_catalogue().published_problem(serializer.validated_data["problem_id"])
+        if record is None:
+            raise Http404("No Problem matches the given query.")
+        attempt = grade_attempt(request.user, record.as_model(), serializer.validated_data["answer"])
+
+        progress, completed = course_progress(request.user, record.course_id, [record.lesson_id])
+        sync_enrollment_progress(request.user, record.course_id, progress)
+
+        data = attempt_result(attempt, 100 if completed else 0, progress)
+        return Response(AttemptResultSerializer(data).data, status=status.HTTP_201_CREATED)
 
-        lesson = problem.lesson
-        course = lesson.module.course
 
-        lesson_progress = 100 if compute_lesson_completion(request.user, lesson) else 0
-        course_progress = compute_course_progress(request.user, course)
+class AttemptBatchSubmitView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        enrollment = Enrollment.objects.filter(user=request.user, course=course).first()
-        if enrollment:
-            enrollment.progress_percent = course_progress
-            enrollment.save(update_fields=["progress_percent"])
+    def post(self, request):
+        serializer = AttemptBatchSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        data = {
-            "attempt_id": attempt.id,
-            "is_correct": attempt.is_correct,
-            "awarded_points": attempt.awarded_points,
-            "lesson_progress": lesson_progress,
-            "course_progress": course_progress,
-            "correct_answer_if_wrong": None if attempt.is_correct else problem.correct_answer,
+        catalogue = get_catalogue()
+        records = {
+            item["problem_id"]: catalogue.published_problem(item["problem_id"]) for item in serializer.validated_data
         }
-        return Response(AttemptResultSerializer(data).data, status=status.HTTP_201_CREATED)
+        if None in records.values():
+            raise Http404("No Problem matches the given query.")
+
+        problems = {problem_id: record.as_model() for problem_id, record in records.items()}
+        attempts = grade_attempts(
+            request.user,
+            [(problems[item["problem_id"]], item["answer"]) for item in serializer.validated_data],
+        )
+
+        course_lessons = {}
+        for record in records.values():
+            course_lessons.setdefault(record.course_id, set()).add(record.lesson_id)
+        progress, completed = {}, set()
+        for course_id, lesson_ids in course_lessons.items():
+            progress[course_id], done = course_progress(request.user, course_id, lesson_ids)
+            completed |= done
+            sync_enrollment_progress(request.user, course_id, progress[course_id])
+
+        results = [
+            attempt_result(
+                attempt,
+                100 if attempt.problem.lesson_id in completed else 0,
+                progress[records[attempt.problem_id].course_id],
+            )
+            for attempt in attempts
+        ]
+        return Response(AttemptResultSerializer(results, many=True).data, status=status.HTTP_201_CREATED)
 
 
 class MeEnrollmentsView(generics.ListAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        qs = Enrollment.objects.filter(user=self.request.user).select_related("course")
-        for enrollment in qs:
-            latest = compute_course_progress(self.request.user, enrollment.course)
-            if enrollment.progress_percent != latest:
-                enrollment.progress_percent = latest
-                enrollment.save(update_fields=["progress_percent"])
-        return qs
+    paginator = KeysetPaginator(ENROLLMENT_ORDERING)
+
+    def list(self, request, *args, **kwargs):
+        selection = field_selection(request, EnrollmentSerializer)
+        serializer = EnrollmentSerializer(selection=selection)
+        queryset = serializer.prepare_queryset(
+            Enrollment.objects.filter(user=request.user).order_by(*ENROLLMENT_ORDERING), request.user, *ENROLLMENT_ORDERING
+        )
+        paginate = self.paginator.requested(request)
+        if paginate:
+            enrollments, next_url = self.paginator.paginate(queryset, request)
+        else:
+            enrollments = list(queryset)
+        if serializer.needs_progress():
+            refresh_enrollments_progress(request.user, enrollments)
+
+        data = self.get_serializer(enrollments, many=True, selection=selection).data
+        return Response({"next": next_url, "results": data} if paginate else data)
+
+
+def attempt_scope(params):
+    """Problem ids selected by the course/lesson/problem filters, or ``None`` when unfiltered."""
+    catalogue = get_catalogue()
+    scopes = []
+    if "course" in params:
+        scopes.append(set(catalogue.course_problem_ids(params["course"])))
+    if "lesson" in params:
+        scopes.append(set(catalogue.lesson_problem_ids(params["lesson"])))
+    if "problem" in params:
+        scopes.append({params["problem"]} if catalogue.problem(params["problem"]) else set())
+    return set.intersection(*scopes) if scopes else None
+
+
+class MeAttemptsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    paginator = KeysetPaginator(("-created_at", "id"))
+
+    def get(self, request):
+        serializer = AttemptHistoryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = attempt_history(request.user, attempt_scope(params), latest=params["latest"])
+        rows, next_url = self.paginator.paginate(queryset, request)
+        catalogue = get_catalogue()
+        for row in rows:
+            problem = catalogue.problem(row["problem_id"])
+            row["lesson"] = problem.lesson_id if problem else None
+            row["course"] = problem.course_id if problem else None
+        return Response(AttemptHistoryPageSerializer({"next": next_url, "results": rows}).data)
+
+
+def leaderboard_params(request):
+    serializer = LeaderboardQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    course_id = params.get("course")
+    if course_id is not None and get_catalogue().published_course(course_id) is None:
+        raise Http404("No Course matches the given query.")
+    return course_id, params
+
+
+def with_usernames(entries):
+    usernames = dict(User.objects.filter(id__in=[entry["user_id"] for entry in entries]).values_list("id", "username"))
+    return [{**entry, "username": usernames.get(entry["user_id"], "")} for entry in entries]
+
+
+class LeaderboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        course_id, params = leaderboard_params(request)
+        ranked, entries = get_leaderboards().top(course_id, params["limit"])
+        data = {"course": course_id, "ranked_users": ranked, "results": with_usernames(entries)}
+        return Response(LeaderboardSerializer(data).data)
+
+
+class MyLeaderboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        course_id, params = leaderboard_params(request)
+        ranked, rank, entries = get_leaderboards().around(course_id, request.user.id, params["around"])
+        data = {"course": course_id, "ranked_users": ranked, "rank": rank, "results": with_usernames(entries)}
+        return Response(LeaderboardSerializer(data).data)
+
+
+def analytics_range(request):
+    serializer = AnalyticsRangeSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data.get("start"), serializer.validated_data.get("end")
+
+
+class ProblemDailyStatsView(ReplicaReadsMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, problem_id):
+        get_object_or_404(Problem, id=problem_id)
+        rows = filter_days(ProblemDailyStats.objects.filter(problem_id=problem_id), *analytics_range(request))
+        return Response(ProblemDailyStatsSerializer(rows, many=True).data)
+
+
+class LessonDailyStatsView(ReplicaReadsMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, lesson_id):
+        get_object_or_404(Lesson, id=lesson_id)
+        rows = filter_days(LessonDailyStats.objects.filter(lesson_id=lesson_id), *analytics_range(request))
+        return Response(LessonDailyStatsSerializer(rows, many=True).data)
+
+
+class LessonProblemStatsView(ReplicaReadsMixin, APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, lesson_id):
+        get_object_or_404(Lesson, id=lesson_id)
+        summaries = lesson_problem_summaries(lesson_id, *analytics_range(request))
+        return Response(ProblemSummarySerializer(summaries, many=True).data)
+
+
+class ExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, kind, output_format):
+        if kind not in EXPORTS or output_format not in CONTENT_TYPES:
+            raise Http404("Unknown export.")
+        serializer = ExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        chunks = stream_export(
+            kind,
+            output_format,
+            course_id=params.get("course"),
+            user_id=params.get("user"),
+            start=params.get("start"),
+            end=params.get("end"),
+        )
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[output_format])
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{output_format}"'
+        return response